@@ -9,6 +9,8 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), ".")))
 
 from src.auth import AuthManager
+from src.notifications import DeadlineNotificationJob
+from src.reporting import ExportJobManager
 from src.ui.login_page import show_login_page
 from src.ui.main_app import show_main_app
 
@@ -24,6 +26,15 @@ st.set_page_config(
     }
 )
 
+# Фоновая задача дедлайнов - один поток на процесс сервера, а не на каждую сессию.
+# Там же, один раз при старте, закрываем выгрузки, брошенные умершими процессами сервера
+@st.cache_resource
+def start_background_jobs():
+    ExportJobManager.recover_interrupted()
+    return DeadlineNotificationJob.start()
+
+start_background_jobs()
+
 # Получаем сессию
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -1,4 +1,5 @@
 
 from .auth_manager import AuthManager
+from .user_directory import UserDirectory
 
-__all__ = ['AuthManager']
+__all__ = ['AuthManager', 'UserDirectory']
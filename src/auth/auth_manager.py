@@ -6,6 +6,7 @@ import re
 from typing import Dict, Optional, Tuple
 
 from ..database import get_db
+from .user_directory import UserDirectory
 
 
 JWT_SECRET = secrets.token_hex(32)  # Генерация рандомного токена
@@ -108,26 +109,29 @@ class AuthManager:
             if existing_user:
                 return False, "Username or email already exists", None
 
+            # Хешируем до транзакции, чтобы не держать блокировку записи во время bcrypt
             hashed_password = AuthManager.hash_password(password)
 
-
-            user_id = db.execute_insert(
-                """
-                INSERT INTO users (username, email, password_hash, first_name, last_name, role, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (username, email, hashed_password, first_name, last_name, role,
-                 datetime.datetime.now().isoformat())
-            )
-
-
-            db.execute_insert(
-                """
-                INSERT INTO user_settings (user_id, created_at)
-                VALUES (?, ?)
-                """,
-                (user_id, datetime.datetime.now().isoformat())
-            )
+            # Юзер и его настройки коммитятся одной транзакцией
+            with db.transaction():
+                user_id = db.execute_insert(
+                    """
+                    INSERT INTO users (username, email, password_hash, first_name, last_name, role, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (username, email, hashed_password, first_name, last_name, role,
+                     datetime.datetime.now().isoformat())
+                )
+
+                db.execute_insert(
+                    """
+                    INSERT INTO user_settings (user_id, created_at)
+                    VALUES (?, ?)
+                    """,
+                    (user_id, datetime.datetime.now().isoformat())
+                )
+
+            UserDirectory.refresh(db)
 
             return True, "User  registered successfully", user_id
         except Exception as e:
@@ -0,0 +1,194 @@
+"""
+Справочник юзеров для поиска собеседника в чате.
+Индекс держится в памяти процесса: отсортированный список нормализованных ключей (term, user_id),
+где term - имя, фамилия, username, email (casefold, без диакритики) и отдельные слова из них.
+Поиск по префиксу - bisect по списку, а не LOWER(...) LIKE '%x%' по всем строкам users.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..database import get_db
+
+USER_COLUMNS = "id, username, first_name, last_name, email, created_at"
+
+# Новые юзеры (id больше последнего загруженного) подгружаются не чаще раза в REFRESH_INTERVAL секунд,
+# полная перезагрузка раз в RELOAD_INTERVAL - на случай правок и удалений мимо приложения
+REFRESH_INTERVAL = 5.0
+RELOAD_INTERVAL = 600.0
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    if text.isascii():
+        return text.lower().strip()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold().strip()
+
+
+def search_terms(first_name: str, last_name: str, username: str, email: str) -> Set[str]:
+    """Ключи по нормализованным полям: поля целиком (для ввода "john.smith@...") и слова из них.
+    Домен email не дробим - иначе "co" находило бы всех с .com."""
+    terms = {value for value in (first_name, last_name, username, email) if value}
+    for value in (first_name, last_name, username, email.split("@", 1)[0]):
+        terms.update(_WORD_RE.findall(value))
+    return terms
+
+
+class _DirectoryIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: List[Tuple[str, int]] = []
+        self.by_name: List[Tuple[str, str, int]] = []
+        self.users: Dict[int, Dict] = {}
+        self.user_terms: Dict[int, Set[str]] = {}
+        self.max_user_id = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    def add(self, users: List[Dict], bulk: bool = False):
+        entries = []
+        names = []
+        for user in users:
+            first_name, last_name, username, email = (
+                normalize_search_text(user[column]) for column in ("first_name", "last_name", "username", "email")
+            )
+            terms = search_terms(first_name, last_name, username, email)
+            self.users[user["id"]] = user
+            self.user_terms[user["id"]] = terms
+            self.max_user_id = max(self.max_user_id, user["id"])
+            entries.extend((term, user["id"]) for term in terms)
+            names.append((first_name, last_name, user["id"]))
+
+        if bulk:
+            self.entries.extend(entries)
+            self.entries.sort()
+            self.by_name.extend(names)
+            self.by_name.sort()
+        else:
+            for entry in entries:
+                bisect.insort(self.entries, entry)
+            for name in names:
+                bisect.insort(self.by_name, name)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        return (bisect.bisect_left(self.entries, (prefix,)),
+                bisect.bisect_left(self.entries, (prefix + "\U0010ffff",)))
+
+    def matches(self, user_id: int, prefixes: List[str]) -> bool:
+        terms = self.user_terms[user_id]
+        return all(any(term.startswith(prefix) for term in terms) for prefix in prefixes)
+
+
+_indexes: Dict[str, _DirectoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+class UserDirectory:
+
+    @staticmethod
+    def search(query: str, exclude_user_id: Optional[int] = None, limit: int = 20) -> List[Dict]:
+        """
+        Поиск по префиксам слов запроса: "jo sm" находит John Smith. Пустой запрос - первые limit юзеров по имени.
+        Результаты упорядочены по совпавшему ключу, обход останавливается на limit.
+        """
+        index = UserDirectory._index()
+        prefixes = normalize_search_text(query).split()
+        results = []
+
+        with index.lock:
+            if not prefixes:
+                for first_name, last_name, user_id in index.by_name:
+                    if len(results) >= limit:
+                        break
+                    if user_id != exclude_user_id:
+                        results.append(dict(index.users[user_id]))
+                return results
+
+            # По индексу идем от префикса с самым узким диапазоном, остальные префиксы проверяем у кандидатов
+            ranges = {prefix: index.prefix_range(prefix) for prefix in prefixes}
+            driver = min(ranges, key=lambda prefix: ranges[prefix][1] - ranges[prefix][0])
+            others = [prefix for prefix in ranges if prefix != driver]
+            seen = set()
+            position, end = ranges[driver]
+
+            while position < end and len(results) < limit:
+                term, user_id = index.entries[position]
+                position += 1
+
+                if user_id in seen or user_id == exclude_user_id:
+                    continue
+                seen.add(user_id)
+                if index.matches(user_id, others):
+                    results.append(dict(index.users[user_id]))
+
+        return results
+
+    @staticmethod
+    def refresh(db=None):
+        """Подгружает юзеров, появившихся после последней загрузки. Вызывается после регистрации."""
+        db = db or get_db()
+        index = _indexes.get(db.db_path)
+        if index is not None:
+            UserDirectory._load_new_users(db, index)
+
+    @staticmethod
+    def reset():
+        with _indexes_lock:
+            _indexes.clear()
+
+    @staticmethod
+    def _index() -> _DirectoryIndex:
+        db = get_db()
+        now = time.monotonic()
+
+        with _indexes_lock:
+            index = _indexes.get(db.db_path)
+
+        # Пока строится новый индекс, другие потоки ищут по старому
+        if index is None or now - index.loaded_at > RELOAD_INTERVAL:
+            index = UserDirectory._load(db)
+            with _indexes_lock:
+                _indexes[db.db_path] = index
+            return index
+
+        if now - index.refreshed_at > REFRESH_INTERVAL:
+            UserDirectory._load_new_users(db, index)
+        return index
+
+    @staticmethod
+    def _load(db) -> _DirectoryIndex:
+        index = _DirectoryIndex()
+        try:
+            users = db.execute_query(f"SELECT {USER_COLUMNS} FROM users")
+            index.add([dict(user) for user in users], bulk=True)
+        except Exception as e:
+            print(f"Error loading user directory: {e}")
+        finally:
+            db.close()
+
+        index.loaded_at = index.refreshed_at = time.monotonic()
+        return index
+
+    @staticmethod
+    def _load_new_users(db, index: _DirectoryIndex):
+        try:
+            users = db.execute_query(
+                f"SELECT {USER_COLUMNS} FROM users WHERE id > ? ORDER BY id",
+                (index.max_user_id,)
+            )
+            if users:
+                with index.lock:
+                    index.add([dict(user) for user in users if user["id"] not in index.users])
+            index.refreshed_at = time.monotonic()
+        except Exception as e:
+            print(f"Error refreshing user directory: {e}")
+        finally:
+            db.close()
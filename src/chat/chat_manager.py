@@ -2,6 +2,27 @@ import datetime
 from typing import Dict, List, Optional, Tuple
 
 from ..database import get_db
+from ..database.pagination import decode_cursor, encode_cursor, keyset_condition
+from ..events import CHAT_MESSAGE, NOTIFICATION_CREATED, get_event_bus
+
+UPSERT_CONVERSATION = """
+INSERT INTO conversations (user_a, user_b, last_message_id, last_sent_at, unread_for_a, unread_for_b)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(user_a, user_b) DO UPDATE SET
+    last_message_id = excluded.last_message_id,
+    last_sent_at = excluded.last_sent_at,
+    unread_for_a = unread_for_a + excluded.unread_for_a,
+    unread_for_b = unread_for_b + excluded.unread_for_b
+"""
+
+# Переписки юзера с обеих сторон пары; unread_count - непрочитанные у самого юзера
+USER_CONVERSATIONS = """
+SELECT user_b as other_user_id, last_message_id, last_sent_at, unread_for_a as unread_count
+FROM conversations WHERE user_a = ?
+UNION ALL
+SELECT user_a as other_user_id, last_message_id, last_sent_at, unread_for_b as unread_count
+FROM conversations WHERE user_b = ?
+"""
 
 
 class ChatManager:
@@ -25,29 +46,43 @@ class ChatManager:
             return False, "Cannot send message to yourself", None
         
         try:
-            sent_at = datetime.datetime.now().isoformat()
-            message_id = db.execute_insert(
-                """
-                INSERT INTO chat_messages (sender_id, receiver_id, message, sent_at)
-                VALUES (?, ?, ?, ?)
-                """,
-                (sender_id, receiver_id, message, sent_at)
-            )
-            
-            sender_name = db.execute_query(
-                "SELECT username FROM users WHERE id = ?", 
-                (sender_id,)
-            )[0]['username']
+            # Сообщение и уведомление коммитятся одной транзакцией
+            with db.transaction():
+                sent_at = datetime.datetime.now().isoformat()
+                message_id = db.execute_insert(
+                    """
+                    INSERT INTO chat_messages (sender_id, receiver_id, message, sent_at)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (sender_id, receiver_id, message, sent_at)
+                )
+
+                user_a, user_b = sorted((sender_id, receiver_id))
+                db.execute_update(
+                    UPSERT_CONVERSATION,
+                    (user_a, user_b, message_id, sent_at, int(receiver_id == user_a), int(receiver_id == user_b))
+                )
+
+                sender_name = db.execute_query(
+                    "SELECT username FROM users WHERE id = ?", 
+                    (sender_id,)
+                )[0]['username']
+
+                db.execute_insert(
+                    """
+                    INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (receiver_id, "New Message", 
+                     f"You have a new message from {sender_name}", 
+                     "message", message_id, sent_at)
+                )
             
-            db.execute_insert(
-                """
-                INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (receiver_id, "New Message", 
-                 f"You have a new message from {sender_name}", 
-                 "message", message_id, sent_at)
-            )
+            # Публикуем только после коммита, чтобы подписчик не прочитал БД раньше записи
+            bus = get_event_bus()
+            bus.publish(CHAT_MESSAGE, (sender_id, receiver_id),
+                        {"message_id": message_id, "sender_id": sender_id, "receiver_id": receiver_id})
+            bus.publish(NOTIFICATION_CREATED, (receiver_id,), {"type": "message", "related_id": message_id})
             
             return True, "Message sent successfully", message_id
         except Exception as e:
@@ -60,36 +95,53 @@ class ChatManager:
         
         try:
             read_at = datetime.datetime.now().isoformat()
-            db.execute_update(
-                """
-                UPDATE chat_messages 
-                SET read_at = ?
-                WHERE sender_id = ? AND receiver_id = ? AND read_at IS NULL
-                """,
-                (read_at, other_user_id, user_id)
-            )
+            with db.transaction():
+                updated = db.execute_update(
+                    """
+                    UPDATE chat_messages 
+                    SET read_at = ?
+                    WHERE sender_id = ? AND receiver_id = ? AND read_at IS NULL
+                    """,
+                    (read_at, other_user_id, user_id)
+                )
+
+                if updated:
+                    unread_column = "unread_for_a" if user_id < other_user_id else "unread_for_b"
+                    db.execute_update(
+                        f"UPDATE conversations SET {unread_column} = 0 WHERE user_a = ? AND user_b = ?",
+                        tuple(sorted((user_id, other_user_id)))
+                    )
             
             return True, "Messages marked as read"
         except Exception as e:
             return False, f"Failed to mark messages as read: {str(e)}"
     
     @staticmethod
-    def get_conversation(user_id: int, other_user_id: int, limit: int = 50) -> List[Dict]:
+    def get_conversation(user_id: int, other_user_id: int, limit: int = 50,
+                         cursor: Optional[str] = None) -> List[Dict]:
+        """Последние limit сообщений в хронологическом порядке; cursor - продолжение к более старым."""
         db = get_db()
         
+        cursor_clause = ""
+        cursor_params = ()
+        if cursor:
+            condition, cursor_params = keyset_condition(("cm.sent_at", "cm.id"), decode_cursor(cursor, 2))
+            cursor_clause = f"AND {condition}"
+        
         messages = db.execute_query(
-            """
+            f"""
             SELECT cm.*, 
                   u_sender.username as sender_username,
                   u_receiver.username as receiver_username
             FROM chat_messages cm
             JOIN users u_sender ON cm.sender_id = u_sender.id
             JOIN users u_receiver ON cm.receiver_id = u_receiver.id
-            WHERE (cm.sender_id = ? AND cm.receiver_id = ?) OR (cm.sender_id = ? AND cm.receiver_id = ?)
-            ORDER BY cm.sent_at DESC
+            WHERE ((cm.sender_id = ? AND cm.receiver_id = ?) OR (cm.sender_id = ? AND cm.receiver_id = ?))
+            {cursor_clause}
+            ORDER BY cm.sent_at DESC, cm.id DESC
             LIMIT ?
             """,
-            (user_id, other_user_id, other_user_id, user_id, limit)
+            (user_id, other_user_id, other_user_id, user_id) + cursor_params + (limit,)
         )
         
         result = []
@@ -98,51 +150,75 @@ class ChatManager:
             message_dict['is_sent_by_me'] = message_dict['sender_id'] == user_id
             result.append(message_dict)
         
-        ChatManager.mark_messages_as_read(user_id, other_user_id)
+        # Старые страницы уже были прочитаны вместе с первой
+        if not cursor:
+            ChatManager.mark_messages_as_read(user_id, other_user_id)
         
         return list(reversed(result))
     
+    @staticmethod
+    def get_conversation_page(user_id: int, other_user_id: int, limit: int = 50,
+                              cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Страница сообщений (хронологически) и курсор к более старым; None - это начало переписки."""
+        messages = ChatManager.get_conversation(user_id, other_user_id, limit + 1, cursor)
+        if len(messages) <= limit:
+            return messages, None
+        page = messages[1:]
+        return page, encode_cursor(page[0]["sent_at"], page[0]["id"])
+    
+    @staticmethod
+    def get_messages_since(user_id: int, other_user_id: int, last_id: int, limit: int = 200) -> List[Dict]:
+        """
+        Сообщения переписки с id > last_id в порядке отправки - дозагрузка для уже открытого чата.
+        Без JOIN с users; входящие помечаются прочитанными только если среди новых они есть.
+        """
+        db = get_db()
+        
+        messages = db.execute_query(
+            """
+            SELECT cm.*
+            FROM chat_messages cm
+            WHERE ((cm.sender_id = ? AND cm.receiver_id = ?) OR (cm.sender_id = ? AND cm.receiver_id = ?))
+            AND cm.id > ?
+            ORDER BY cm.id
+            LIMIT ?
+            """,
+            (user_id, other_user_id, other_user_id, user_id, last_id, limit)
+        )
+        
+        result = []
+        for message in messages:
+            message_dict = dict(message)
+            message_dict['is_sent_by_me'] = message_dict['sender_id'] == user_id
+            result.append(message_dict)
+        
+        if any(not message['is_sent_by_me'] and message['read_at'] is None for message in result):
+            ChatManager.mark_messages_as_read(user_id, other_user_id)
+        
+        return result
+    
     @staticmethod
     def get_conversations_list(user_id: int) -> List[Dict]:
+        """Сайдбар чата из сводки conversations: поиск по ключу пары и join последнего сообщения по id."""
         db = get_db()
         
         conversations = db.execute_query(
-            """
+            f"""
             SELECT 
                 u.id as user_id,
                 u.username,
                 u.first_name,
                 u.last_name,
-                last_msg.message as last_message,
-                last_msg.sent_at as last_message_time,
-                last_msg.sender_id as last_message_sender_id,
-                (SELECT COUNT(*) FROM chat_messages 
-                 WHERE sender_id = u.id AND receiver_id = ? AND read_at IS NULL) as unread_count
-            FROM users u
-            JOIN (
-                SELECT 
-                    CASE 
-                        WHEN sender_id = ? THEN receiver_id 
-                        ELSE sender_id 
-                    END as other_user_id,
-                    message,
-                    sent_at,
-                    sender_id,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY 
-                            CASE 
-                                WHEN sender_id = ? THEN receiver_id 
-                                ELSE sender_id 
-                            END
-                        ORDER BY sent_at DESC
-                    ) as rn
-                FROM chat_messages
-                WHERE sender_id = ? OR receiver_id = ?
-            ) last_msg ON u.id = last_msg.other_user_id
-            WHERE last_msg.rn = 1 AND u.id != ?
-            ORDER BY last_msg.sent_at DESC
+                cm.message as last_message,
+                c.last_sent_at as last_message_time,
+                cm.sender_id as last_message_sender_id,
+                c.unread_count
+            FROM ({USER_CONVERSATIONS}) c
+            JOIN users u ON u.id = c.other_user_id
+            JOIN chat_messages cm ON cm.id = c.last_message_id
+            ORDER BY c.last_sent_at DESC
             """,
-            (user_id, user_id, user_id, user_id, user_id, user_id)
+            (user_id, user_id)
         )
         
         result = []
@@ -158,12 +234,8 @@ class ChatManager:
         db = get_db()
         
         result = db.execute_query(
-            """
-            SELECT COUNT(*) as count
-            FROM chat_messages
-            WHERE receiver_id = ? AND read_at IS NULL
-            """,
-            (user_id,)
+            f"SELECT COALESCE(SUM(unread_count), 0) as count FROM ({USER_CONVERSATIONS})",
+            (user_id, user_id)
         )
         
         return dict(result[0])['count']
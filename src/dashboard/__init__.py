@@ -0,0 +1,4 @@
+
+from .dashboard_service import DashboardService, DashboardSnapshot, TaskStatistics
+
+__all__ = ['DashboardService', 'DashboardSnapshot', 'TaskStatistics']
@@ -0,0 +1,90 @@
+import datetime
+from typing import Dict, List, Optional, TypedDict
+
+from ..database import get_db
+from ..notifications import NotificationManager
+from ..task_management import TaskManager
+from ..task_management.task_manager import TASK_PRIORITIES, TASK_STATUSES
+from ..time_tracking import TimeTracker
+
+
+class TaskStatistics(TypedDict):
+    status_counts: Dict[str, int]
+    completion_rate: float
+    upcoming_deadlines: List[Dict]
+    priority_counts: Dict[str, int]
+
+
+class DashboardSnapshot(TypedDict):
+    user_id: int
+    loaded_at: str
+    active_entry: Optional[Dict]
+    task_stats: TaskStatistics
+    time_summary: Dict
+    unread_notifications: int
+    recent_entries: List[Dict]
+    daily_totals: List[Dict]
+
+
+class DashboardService:
+
+    @staticmethod
+    def load(user_id: int, recent_limit: int = 5, daily_days: int = 7) -> DashboardSnapshot:
+        """
+        Все данные дашборда за одно получение соединения из пула: публичные методы менеджеров
+        получают это соединение и не закрывают его. Статистика тасков - два запроса, последние записи -
+        третий, часы по дням за неделю - четвертый (из дневного агрегата). Непрочитанные уведомления,
+        сводка за сегодня и активная запись - из кэшей менеджеров (при промахе - на этом же соединении).
+        """
+        db = get_db()
+
+        try:
+            task_stats = TaskManager.get_task_statistics(user_id, db=db)
+            unread_notifications = NotificationManager.get_unread_count(user_id, db=db)
+            recent_entries = TimeTracker.get_time_entries(user_id, limit=recent_limit, db=db)
+            time_summary = TimeTracker.get_time_summary(user_id, "today", db=db)
+            daily_totals = TimeTracker.get_daily_totals(user_id, daily_days, db=db)
+
+            # Сегодняшняя точка ряда - вместе с идущей активной записью, как в карточке "Today"
+            today_total = time_summary["total_duration"]
+            daily_totals[-1].update(duration_seconds=today_total, duration_hours=round(today_total / 3600, 2))
+
+            return DashboardSnapshot(
+                user_id=user_id,
+                loaded_at=datetime.datetime.now().isoformat(),
+                active_entry=time_summary["active_entry"],
+                task_stats=task_stats,
+                time_summary=time_summary,
+                unread_notifications=unread_notifications,
+                recent_entries=recent_entries,
+                daily_totals=daily_totals
+            )
+        except Exception as e:
+            print(f"Error loading dashboard: {e}")
+            return DashboardService._empty_snapshot(user_id, daily_days)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _empty_snapshot(user_id: int, daily_days: int) -> DashboardSnapshot:
+        return DashboardSnapshot(
+            user_id=user_id,
+            loaded_at=datetime.datetime.now().isoformat(),
+            active_entry=None,
+            task_stats=TaskStatistics(
+                status_counts={status: 0 for status in TASK_STATUSES},
+                completion_rate=0,
+                upcoming_deadlines=[],
+                priority_counts={priority: 0 for priority in TASK_PRIORITIES}
+            ),
+            time_summary={
+                "period": "today",
+                "total_duration": 0,
+                "total_duration_formatted": TimeTracker.format_duration(0),
+                "by_task": [],
+                "active_entry": None
+            },
+            unread_notifications=0,
+            recent_entries=[],
+            daily_totals=TimeTracker.daily_series(daily_days)
+        )
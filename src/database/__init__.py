@@ -1,4 +1,6 @@
 
-from .schema import get_db, Database
+from .schema import get_db, Database, STORAGE_PROFILES
+from .migrations import Migration, MigrationRunner, MIGRATIONS
+from .rollup import TimeRollup
 
-__all__ = ['get_db', 'Database']
+__all__ = ['get_db', 'Database', 'STORAGE_PROFILES', 'Migration', 'MigrationRunner', 'MIGRATIONS', 'TimeRollup']
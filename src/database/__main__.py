@@ -0,0 +1,47 @@
+"""
+Миграции схемы из командной строки:
+    python -m src.database --dry-run
+    python -m src.database --target 2
+    python -m src.database --rebuild-rollups
+"""
+import argparse
+import os
+
+from .migrations import MigrationRunner
+from .rollup import TimeRollup
+from .schema import DEFAULT_STORAGE_PROFILE, Database, get_db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply Time Tracker schema migrations")
+    parser.add_argument("--db", default=get_db_path(), help="Path to the SQLite database file")
+    parser.add_argument("--dry-run", action="store_true", help="Show pending migrations without applying them")
+    parser.add_argument("--target", type=int, default=None, help="Migrate up to this version")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Recompute time_rollup_daily from time_entries after migrating")
+    args = parser.parse_args()
+
+    storage_profile = os.environ.get("TIMETRACKER_DB_PROFILE", DEFAULT_STORAGE_PROFILE)
+    db = Database(args.db, storage_profile=storage_profile, auto_migrate=False)
+    runner = MigrationRunner(db)
+
+    try:
+        print(f"Current schema version: {runner.current_version()}")
+        steps = runner.migrate(target=args.target, dry_run=args.dry_run)
+        if not steps:
+            print("Schema is up to date")
+        for step in steps:
+            print(f"{'Pending' if args.dry_run else 'Applied'} {step['version']}: {step['name']}")
+            if args.dry_run:
+                for statement in step["statements"]:
+                    print(f"    {statement}")
+
+        if args.rebuild_rollups and not args.dry_run:
+            rows = TimeRollup.rebuild(db)
+            print(f"Rebuilt time_rollup_daily: {rows} rows")
+    finally:
+        db.dispose()
+
+
+if __name__ == "__main__":
+    main()
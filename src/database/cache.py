@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU кэш с временем жизни записей.
+    generation() + set(..., generation=...) не дают положить в кэш значение,
+    прочитанное до инвалидации, если запись в БД произошла во время чтения.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return default
+
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> bool:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evicted"] += 1
+            return True
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Удаляет ключи, для которых predicate(key) истинно (все ключи, если predicate не задан)."""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._data if predicate is None or predicate(key)]
+            for key in keys:
+                del self._data[key]
+            self._stats["invalidated"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, size=len(self._data), maxsize=self.maxsize)
@@ -0,0 +1,478 @@
+import datetime
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .rollup import REBUILD_ROLLUP, ROLLUP_DAY_INDEX, ROLLUP_TABLE
+from .task_search import create_task_search_index
+from .timestamps import to_epoch
+
+
+class Migration:
+    """
+    Один шаг схемы. statements - список SQL или функция, получающая Database (для миграций данных).
+    online=True: каждый оператор коммитится отдельно, чтобы долгие CREATE INDEX
+    на большой базе не держали блокировку записи на всю миграцию; функция в online-режиме
+    сама открывает короткие транзакции через db.transaction().
+    """
+
+    def __init__(self, version: int, name: str,
+                 statements: Union[Sequence[str], Callable[..., None]],
+                 online: bool = False):
+        self.version = version
+        self.name = name
+        self.statements = statements
+        self.online = online
+
+    def describe(self) -> List[str]:
+        if callable(self.statements):
+            return [f"<data migration: {self.statements.__name__}>"]
+        return [" ".join(statement.split()) for statement in self.statements]
+
+
+BASELINE_TABLES = [
+    """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            first_name TEXT,
+            last_name TEXT,
+            role TEXT NOT NULL CHECK(role IN ('employee', 'employer', 'admin')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            status TEXT NOT NULL CHECK(status IN ('not_started', 'in_progress', 'paused', 'completed', 'cancelled')),
+            priority TEXT CHECK(priority IN ('low', 'medium', 'high', 'urgent')),
+            created_by INTEGER NOT NULL,
+            assigned_to INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            deadline TIMESTAMP,
+            completed_at TIMESTAMP,
+            estimated_hours REAL,
+            FOREIGN KEY (created_by) REFERENCES users(id),
+            FOREIGN KEY (assigned_to) REFERENCES users(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS time_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP,
+            duration_seconds INTEGER,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (task_id) REFERENCES tasks(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER NOT NULL,
+            receiver_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            read_at TIMESTAMP,
+            FOREIGN KEY (sender_id) REFERENCES users(id),
+            FOREIGN KEY (receiver_id) REFERENCES users(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            task_id INTEGER,
+            title TEXT NOT NULL,
+            description TEXT,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP NOT NULL,
+            location TEXT,
+            calendar_source TEXT,
+            external_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (task_id) REFERENCES tasks(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            type TEXT NOT NULL CHECK(type IN ('task', 'deadline', 'message', 'system')),
+            related_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            read_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            entity_type TEXT NOT NULL,
+            entity_id INTEGER,
+            details TEXT,
+            ip_address TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS user_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE NOT NULL,
+            theme TEXT DEFAULT 'light',
+            language TEXT DEFAULT 'en',
+            notification_preferences TEXT,
+            calendar_sync BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """
+]
+
+BASELINE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks(assigned_to)",
+    "CREATE INDEX IF NOT EXISTS idx_time_entries_user_id ON time_entries(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_time_entries_task_id ON time_entries(task_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_messages_sender_receiver ON chat_messages(sender_id, receiver_id)",
+    "CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id)"
+]
+
+# Сводка переписок для сайдбара чата: пара (user_a < user_b), последнее сообщение и непрочитанные у каждой стороны.
+# Поддерживается ChatManager.send_message/mark_messages_as_read в тех же транзакциях, что и chat_messages.
+CONVERSATION_SUMMARY = [
+    """
+        CREATE TABLE IF NOT EXISTS conversations (
+            user_a INTEGER NOT NULL,
+            user_b INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            last_sent_at TIMESTAMP NOT NULL,
+            unread_for_a INTEGER NOT NULL DEFAULT 0,
+            unread_for_b INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_a, user_b),
+            CHECK (user_a < user_b),
+            FOREIGN KEY (user_a) REFERENCES users(id),
+            FOREIGN KEY (user_b) REFERENCES users(id)
+        ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user_b ON conversations(user_b)",
+    # Голый столбец sent_at при MAX(id) берется из той же строки - это последнее сообщение пары
+    """
+        INSERT OR REPLACE INTO conversations (user_a, user_b, last_message_id, last_sent_at, unread_for_a, unread_for_b)
+        SELECT MIN(sender_id, receiver_id), MAX(sender_id, receiver_id), MAX(id), sent_at,
+               SUM(read_at IS NULL AND receiver_id < sender_id),
+               SUM(read_at IS NULL AND receiver_id > sender_id)
+        FROM chat_messages
+        WHERE sender_id != receiver_id
+        GROUP BY MIN(sender_id, receiver_id), MAX(sender_id, receiver_id)
+    """,
+]
+
+# Фоновые выгрузки отчетов (src/reporting/export_jobs.py): статус и прогресс читает страница отчетов
+EXPORT_JOBS = [
+    """
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            export_user_id INTEGER,
+            export_format TEXT NOT NULL,
+            contents TEXT NOT NULL DEFAULT 'report',
+            start_date TIMESTAMP NOT NULL,
+            end_date TIMESTAMP NOT NULL,
+            include_details BOOLEAN NOT NULL DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            rows_written INTEGER NOT NULL DEFAULT 0,
+            total_rows INTEGER,
+            result_paths TEXT,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_export_jobs_user_created ON export_jobs(user_id, created_at)",
+    # Незавершенные задачи: счетчик активных на юзера и восстановление после рестарта сервера
+    "CREATE INDEX IF NOT EXISTS idx_export_jobs_active ON export_jobs(user_id) WHERE status IN ('queued', 'running')",
+]
+
+# Владелец незавершенной задачи: процесс сервера, который ее выполняет, и время его последнего heartbeat.
+# При старте сервера failed помечаются только задачи умерших владельцев, а не задачи соседних процессов
+EXPORT_JOB_OWNER_COLUMNS = {
+    "owner_host": "TEXT",
+    "owner_pid": "INTEGER",
+    "heartbeat_at": "TIMESTAMP",
+}
+
+
+def _add_missing_columns(db, table: str, columns: Dict[str, str]):
+    """ALTER TABLE ADD COLUMN только для колонок, которых еще нет - повторный прогон шага ничего не ломает."""
+    conn, cursor = db.connect()
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def _add_export_job_owner_columns(db):
+    _add_missing_columns(db, "export_jobs", EXPORT_JOB_OWNER_COLUMNS)
+
+
+def _to_epoch_or_null(value):
+    """to_epoch для SQL: нераспознанная строка дает NULL, как у strftime, а не обрывает миграцию."""
+    try:
+        return to_epoch(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _add_time_entry_epoch_columns(db, batch_size: int = 10000):
+    """
+    Целочисленные копии start_time/end_time для режима timestamp_mode="epoch".
+    Существующие строки заполняются пачками по id, чтобы не держать блокировку на всей таблице.
+    """
+    conn, cursor = db.connect()
+
+    # Колонки проверяются внутри транзакции записи, а не до нее
+    with db.transaction():
+        _add_missing_columns(db, "time_entries", {"start_ts": "INTEGER", "end_ts": "INTEGER"})
+
+    # Пересчет тем же to_epoch, что и при записи: strftime('%s') переводит строки со смещением в UTC
+    # и иначе округляет дробные секунды до 1970 года, и заполненные строки разошлись бы с новыми
+    conn.create_function("to_epoch", 1, _to_epoch_or_null, deterministic=True)
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM time_entries").fetchone()[0]
+    for low in range(0, max_id, batch_size):
+        with db.transaction():
+            cursor.execute(
+                """
+                UPDATE time_entries
+                SET start_ts = to_epoch(start_time),
+                    end_ts = to_epoch(end_time)
+                WHERE id > ? AND id <= ? AND start_ts IS NULL
+                """,
+                (low, low + batch_size)
+            )
+
+    with db.transaction():
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_time_entries_user_start_ts "
+            "ON time_entries(user_id, start_ts, end_ts, duration_seconds)"
+        )
+
+
+MIGRATIONS = [
+    Migration(1, "baseline_schema", BASELINE_TABLES + BASELINE_INDEXES),
+    Migration(2, "time_entry_hot_query_indexes", [
+        # Покрывающий индекс: SUM(duration_seconds) по диапазону читается без обращения к таблице
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_user_start "
+        "ON time_entries(user_id, start_time, end_time, duration_seconds)",
+        # Частичный индекс только по активным записям - у юзера их не больше одной
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_active ON time_entries(user_id) WHERE end_time IS NULL",
+        # idx_time_entries_user_id является префиксом idx_time_entries_user_start
+        "DROP INDEX IF EXISTS idx_time_entries_user_id",
+    ], online=True),
+    Migration(3, "time_entry_epoch_columns", _add_time_entry_epoch_columns, online=True),
+    Migration(4, "time_rollup_daily", [
+        ROLLUP_TABLE,
+        ROLLUP_DAY_INDEX,
+        REBUILD_ROLLUP.format(user_filter=""),
+    ]),
+    Migration(5, "keyset_pagination_indexes", [
+        # Ключи keyset-пагинации; rowid (id) хранится в каждом индексе и замыкает порядок
+        "CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at)",
+        "DROP INDEX IF EXISTS idx_notifications_user_id",
+        # idx_chat_messages_sender_receiver остается: он нужен выборке новых сообщений по id (миграция 7)
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_pair_sent ON chat_messages(sender_id, receiver_id, sent_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)",
+    ], online=True),
+    Migration(6, "task_full_text_search", create_task_search_index),
+    Migration(7, "chat_incremental_fetch_index", [
+        # "Новые с id > ?" в переписке - диапазон idx_chat_messages_sender_receiver из базовой схемы
+        # (индекс замыкается rowid); шаг только гарантирует, что индекс на месте
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_sender_receiver ON chat_messages(sender_id, receiver_id)",
+    ], online=True),
+    Migration(8, "conversation_summary", CONVERSATION_SUMMARY),
+    Migration(9, "unread_notifications_index", [
+        # Только непрочитанные: COUNT(*) для счетчика - короткий диапазон индекса без чтения таблицы
+        # (read_at в ключе делает индекс покрывающим для условия read_at IS NULL)
+        "CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, read_at) WHERE read_at IS NULL",
+    ], online=True),
+    Migration(10, "deadline_job_indexes", [
+        # Проверка "уже уведомляли о дедлайне" в задаче дедлайнов - поиск по таску, а не перебор уведомлений
+        "CREATE INDEX IF NOT EXISTS idx_notifications_deadline ON notifications(related_id, created_at) "
+        "WHERE type = 'deadline'",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline) WHERE deadline IS NOT NULL",
+    ], online=True),
+    Migration(11, "export_jobs", EXPORT_JOBS),
+    Migration(12, "export_job_owners", _add_export_job_owner_columns),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+@contextmanager
+def migration_lock(db_path: str):
+    """
+    Межпроцессная блокировка прогона миграций - файл <база>.migrate.lock рядом с базой.
+    Блокировка отдельная от блокировки записи SQLite: online-шаги по-прежнему коммитят каждый оператор
+    и не держат запись на весь шаг, но два процесса, стартующих одновременно, шаги не перемешивают.
+    """
+    if db_path == ":memory:":
+        yield
+        return
+
+    with open(f"{db_path}.migrate.lock", "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK сдается после 10 попыток, а миграция соседа может идти дольше
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class MigrationRunner:
+
+    def __init__(self, db, migrations: Optional[List[Migration]] = None):
+        self.db = db
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration.version)
+
+    def current_version(self) -> int:
+        """Версия хранится в PRAGMA user_version - чтение заголовка файла без запросов к таблицам."""
+        conn, cursor = self.db.connect()
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def is_current(self) -> bool:
+        return self.current_version() >= self.migrations[-1].version
+
+    def pending(self, target: Optional[int] = None) -> List[Migration]:
+        current = self.current_version()
+        return [
+            migration for migration in self.migrations
+            if migration.version > current and (target is None or migration.version <= target)
+        ]
+
+    def history(self) -> List[Dict]:
+        conn, cursor = self.db.connect()
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'"
+        ).fetchone()
+        if not exists:
+            return []
+        rows = conn.execute("SELECT * FROM schema_migrations ORDER BY version").fetchall()
+        return [dict(row) for row in rows]
+
+    def migrate(self, target: Optional[int] = None, dry_run: bool = False) -> List[Dict]:
+        """
+        Применяем ожидающие миграции по порядку.
+        Возвращаем список шагов (version, name, statements, duration_ms); при dry_run ничего не выполняем.
+        Прогон идет под migration_lock, а версия перечитывается перед каждым шагом: процесс, ждавший
+        блокировку, пропускает шаги, которые уже применил другой процесс.
+        """
+        if dry_run:
+            return [self._step(migration) for migration in self.pending(target)]
+
+        steps = []
+        with migration_lock(self.db.db_path):
+            for migration in self.pending(target):
+                if self.current_version() >= migration.version:
+                    continue
+                step = self._step(migration)
+                steps.append(step)
+
+                started = time.perf_counter()
+                try:
+                    self._apply(migration, started)
+                except sqlite3.Error as e:
+                    print(f"Migration {migration.version} ({migration.name}) failed: {e}")
+                    raise
+                step["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                print(f"Applied migration {migration.version}: {migration.name} ({step['duration_ms']} ms)")
+
+        return steps
+
+    @staticmethod
+    def _step(migration: Migration) -> Dict:
+        return {
+            "version": migration.version,
+            "name": migration.name,
+            "statements": migration.describe(),
+            "duration_ms": None
+        }
+
+    def _apply(self, migration: Migration, started: float):
+        conn, cursor = self.db.connect()
+
+        if migration.online:
+            if callable(migration.statements):
+                migration.statements(self.db)
+            else:
+                for statement in migration.statements:
+                    with self.db.transaction():
+                        cursor.execute(statement)
+            with self.db.transaction():
+                self._record(cursor, migration, started)
+            return
+
+        with self.db.transaction():
+            if callable(migration.statements):
+                migration.statements(self.db)
+            else:
+                for statement in migration.statements:
+                    cursor.execute(statement)
+            self._record(cursor, migration, started)
+
+    @staticmethod
+    def _record(cursor, migration: Migration, started: float):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL,
+            duration_ms REAL
+        )
+        """)
+        cursor.execute(
+            "INSERT OR REPLACE INTO schema_migrations (version, name, applied_at, duration_ms) VALUES (?, ?, ?, ?)",
+            (migration.version, migration.name, datetime.datetime.now().isoformat(),
+             round((time.perf_counter() - started) * 1000, 1))
+        )
+        cursor.execute(f"PRAGMA user_version = {int(migration.version)}")
+
@@ -0,0 +1,41 @@
+"""
+Keyset-пагинация: страница продолжается от ключа сортировки последней строки предыдущей страницы,
+а не через OFFSET, поэтому глубокие страницы стоят столько же, сколько первая.
+Курсор непрозрачен для UI - это base64 от JSON списка значений ключа.
+"""
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(*values: Any) -> str:
+    payload = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_condition(columns: Sequence[str], values: Sequence[Any], descending: bool = True) -> Tuple[str, tuple]:
+    """Условие "после курсора" через сравнение row values: (a, b) < (?, ?)."""
+    placeholders = ", ".join("?" for _ in columns)
+    operator = "<" if descending else ">"
+    return f"({', '.join(columns)}) {operator} ({placeholders})", tuple(values)
+
+
+def split_page(rows: List[Any], limit: int, cursor_of) -> Tuple[List[Any], Optional[str]]:
+    """Запрос читает limit + 1 строк: лишняя строка означает, что есть следующая страница."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, cursor_of(page[-1])
@@ -0,0 +1,181 @@
+"""
+Дневные агрегаты time_entries: time_rollup_daily(user_id, task_id, day, seconds, entries).
+
+Таблица пополняется инкрементально при закрытии записи (pause/stop/импорт),
+поэтому отчеты за длинный период читают O(дней), а не O(записей).
+День записи - дата start_time по настенным часам (смещение часового пояса отбрасывается),
+так же как в to_epoch. В SQL это substr(start_time, 1, 10): strftime переводит строки со смещением в UTC.
+"""
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .timestamps import SECONDS_PER_DAY, epoch_day, to_epoch
+
+ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS time_rollup_daily (
+    user_id INTEGER NOT NULL,
+    task_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    seconds INTEGER NOT NULL DEFAULT 0,
+    entries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, task_id, day)
+) WITHOUT ROWID
+"""
+
+ROLLUP_DAY_INDEX = "CREATE INDEX IF NOT EXISTS idx_time_rollup_daily_day ON time_rollup_daily(day)"
+
+# Дата ISO строки по настенным часам - то же правило, что и TimeRollup.day_of
+ISO_DAY_SQL = "substr({column}, 1, 10)"
+
+REBUILD_ROLLUP = """
+INSERT INTO time_rollup_daily (user_id, task_id, day, seconds, entries)
+SELECT user_id, task_id, substr(start_time, 1, 10) as day, COALESCE(SUM(duration_seconds), 0), COUNT(*)
+FROM time_entries
+WHERE end_time IS NOT NULL {user_filter}
+GROUP BY user_id, task_id, day
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO time_rollup_daily (user_id, task_id, day, seconds, entries)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(user_id, task_id, day) DO UPDATE SET
+    seconds = seconds + excluded.seconds,
+    entries = entries + excluded.entries
+"""
+
+
+class TimeRollup:
+
+    @staticmethod
+    def day_of(start_time) -> str:
+        if isinstance(start_time, str):
+            start_time = datetime.datetime.fromisoformat(start_time)
+        return start_time.date().isoformat()
+
+    @staticmethod
+    def record(db, user_id: int, task_id: int, start_time, duration_seconds: int):
+        """Добавляет закрытую запись в агрегат. Вызывается в той же транзакции, что и UPDATE записи."""
+        db.execute_update(
+            UPSERT_ROLLUP,
+            (user_id, task_id, TimeRollup.day_of(start_time), duration_seconds or 0, 1)
+        )
+
+    @staticmethod
+    def record_many(db, entries: Iterable[Tuple[int, int, str, int]]):
+        """Пачка (user_id, task_id, start_time, duration_seconds) - сначала сворачиваем в памяти."""
+        totals: Dict[Tuple[int, int, str], List[int]] = {}
+        for user_id, task_id, start_time, duration_seconds in entries:
+            key = (user_id, task_id, TimeRollup.day_of(start_time))
+            bucket = totals.setdefault(key, [0, 0])
+            bucket[0] += duration_seconds or 0
+            bucket[1] += 1
+
+        if totals:
+            db.execute_many(
+                UPSERT_ROLLUP,
+                [key + (seconds, count) for key, (seconds, count) in totals.items()]
+            )
+
+    @staticmethod
+    def rebuild(db, user_id: Optional[int] = None) -> int:
+        """Пересчет агрегата из time_entries (целиком или для одного пользователя)."""
+        user_filter = "" if user_id is None else "AND user_id = ?"
+        params = () if user_id is None else (user_id,)
+
+        with db.transaction():
+            db.execute_update(
+                f"DELETE FROM time_rollup_daily WHERE 1 = 1 {user_filter}",
+                params
+            )
+            db.execute_update(REBUILD_ROLLUP.format(user_filter=user_filter), params)
+
+        rows = db.execute_query(
+            f"SELECT COUNT(*) as count FROM time_rollup_daily WHERE 1 = 1 {user_filter}",
+            params
+        )
+        return dict(rows[0])["count"]
+
+    @staticmethod
+    def aggregate(db, start_date: str, end_date: str, user_id: Optional[int] = None,
+                  end_inclusive: bool = True) -> List[Dict]:
+        """
+        Строки (task_id, day, seconds, entries, title, priority) закрытых записей с началом в диапазоне.
+        Полные дни читаются из time_rollup_daily, неполные крайние дни - из time_entries,
+        с теми же условиями на start_time/start_ts, что и у прежних запросов отчетов.
+        """
+        epoch_mode = db.timestamp_mode == "epoch"
+        start_column = "te.start_ts" if epoch_mode else "te.start_time"
+        end_column = "te.end_ts" if epoch_mode else "te.end_time"
+
+        def bound(value):
+            return to_epoch(value) if epoch_mode else value
+
+        user_clause = "" if user_id is None else "AND te.user_id = ?"
+        user_params = () if user_id is None else (user_id,)
+
+        first_day, last_day = TimeRollup._full_days(start_date, end_date)
+
+        raw_condition = f"""
+            {start_column} >= ? AND {start_column} {'<=' if end_inclusive else '<'} ?
+            AND {end_column} IS NOT NULL {user_clause}
+        """
+        raw_params = (bound(start_date), bound(end_date)) + user_params
+
+        # Диапазон ровно из целых дней (как у периодов get_time_summary) - сырые записи не нужны
+        whole_days = (not end_inclusive and first_day < last_day
+                      and TimeRollup._is_midnight(start_date) and TimeRollup._is_midnight(end_date))
+
+        rows = []
+        if first_day < last_day:
+            rollup_query = f"""
+            SELECT te.task_id, te.day, SUM(te.seconds) as seconds, SUM(te.entries) as entries,
+                   t.title, t.priority
+            FROM time_rollup_daily te
+            LEFT JOIN tasks t ON te.task_id = t.id
+            WHERE te.day >= ? AND te.day < ? {user_clause}
+            GROUP BY te.task_id, te.day
+            """
+            rows.extend(db.execute_query(
+                rollup_query,
+                (first_day.isoformat(), last_day.isoformat()) + user_params
+            ))
+
+            # Остаются только края диапазона до первого и после последнего полного дня
+            raw_condition += f" AND ({start_column} < ? OR {start_column} >= ?)"
+            raw_params += (bound(first_day.isoformat()), bound(last_day.isoformat()))
+
+        day_expression = (f"{start_column} / {SECONDS_PER_DAY}" if epoch_mode
+                          else ISO_DAY_SQL.format(column=start_column))
+        raw_query = f"""
+        SELECT te.task_id, {day_expression} as day, SUM(te.duration_seconds) as seconds, COUNT(*) as entries,
+               t.title, t.priority
+        FROM time_entries te
+        LEFT JOIN tasks t ON te.task_id = t.id
+        WHERE {raw_condition}
+        GROUP BY te.task_id, day
+        """
+        raw_rows = [] if whole_days else db.execute_query(raw_query, raw_params)
+
+        result = [dict(row) for row in rows]
+        for row in raw_rows:
+            row = dict(row)
+            if epoch_mode:
+                row["day"] = epoch_day(row["day"])
+            row["seconds"] = row["seconds"] or 0
+            result.append(row)
+        return result
+
+    @staticmethod
+    def _is_midnight(value: str) -> bool:
+        return datetime.datetime.fromisoformat(value).time() == datetime.time.min
+
+    @staticmethod
+    def _full_days(start_date: str, end_date: str) -> Tuple[datetime.date, datetime.date]:
+        """[first_day, last_day) - дни, целиком попадающие в диапазон."""
+        start = datetime.datetime.fromisoformat(start_date)
+        end = datetime.datetime.fromisoformat(end_date)
+
+        first_day = start.date()
+        if start.time() != datetime.time.min:
+            first_day += datetime.timedelta(days=1)
+        return first_day, end.date()
@@ -1,177 +1,307 @@
 import sqlite3
 import os
 import datetime
+import time
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 import threading
+import weakref
+
+from .migrations import MigrationRunner
+from .timestamps import DEFAULT_TIMESTAMP_MODE, TIMESTAMP_MODES
+
+
+# Профили хранилища: PRAGMA, которые применяются к каждому новому соединению.
+# "legacy" - стандартное поведение sqlite3, "performance" - WAL для конкурентной записи,
+# "durable" - WAL, но с fsync на каждый коммит.
+STORAGE_PROFILES = {
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "performance": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,  # 64 MB
+        "mmap_size": 268435456,  # 256 MB
+        "temp_store": "MEMORY",
+    },
+    "durable": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,  # 16 MB
+        "temp_store": "MEMORY",
+    },
+}
+
+DEFAULT_STORAGE_PROFILE = "performance"
+
+
+def resolve_storage_profile(profile):
+    """Возвращаем словарь PRAGMA по имени профиля или проверяем переданный словарь."""
+    if isinstance(profile, dict):
+        pragmas = profile
+    elif profile in STORAGE_PROFILES:
+        pragmas = STORAGE_PROFILES[profile]
+    else:
+        raise ValueError(f"Unknown storage profile: {profile}")
+
+    for name, value in pragmas.items():
+        if not name.isidentifier():
+            raise ValueError(f"Invalid PRAGMA name: {name}")
+        if not isinstance(value, int) and not str(value).isidentifier():
+            raise ValueError(f"Invalid value for PRAGMA {name}: {value}")
+
+    return dict(pragmas)
+
+
+class _ConnectionLease:
+    __slots__ = ("__weakref__",)
 
 
 class Database:
 
-    def __init__(self, db_path="timetracker.db"):
+    def __init__(self, db_path="timetracker.db", pool_size=5, max_connections=20,
+                 idle_timeout=300.0, pool_timeout=30.0, storage_profile=DEFAULT_STORAGE_PROFILE,
+                 auto_migrate=True, timestamp_mode=DEFAULT_TIMESTAMP_MODE):
         self.db_path = db_path
         self._local = threading.local()
-        self.create_tables()
-    
+        self.storage_profile = storage_profile
+        self._pragmas = resolve_storage_profile(storage_profile)
+
+        # "epoch": диапазоны и группировки time_entries идут по целым start_ts/end_ts
+        if timestamp_mode not in TIMESTAMP_MODES:
+            raise ValueError(f"Unknown timestamp mode: {timestamp_mode}")
+        self.timestamp_mode = timestamp_mode
+
+        # Пул соединений: close() возвращает соединение в пул, а не закрывает его
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.pool_timeout = pool_timeout
+        self._pool = deque()
+        self._pool_lock = threading.Condition()
+        self._open_connections = 0
+        self._pool_stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "failed_health_checks": 0,
+            "discarded": 0
+        }
+
+        if auto_migrate:
+            self.create_tables()
+
+    def _new_connection(self):
+        try:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+            self._apply_pragmas(conn)
+            print(f"Connected to database: {self.db_path} in thread {threading.get_ident()}")
+            return conn
+        except sqlite3.Error as e:
+            print(f"Database connection error: {e}")
+            raise
+
+    def _apply_pragmas(self, conn):
+        for name, value in self._pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+    def get_pragmas(self):
+        """Текущие значения PRAGMA профиля хранилища (для проверки настроек)."""
+        conn, cursor = self.connect()
+        return {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in self._pragmas}
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _record(self, counter):
+        with self._pool_lock:
+            self._pool_stats[counter] += 1
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._pool_lock:
+            self._open_connections -= 1
+            self._pool_lock.notify()
+
+    def _checkout(self):
+        """Берем соединение из пула или открываем новое, если пул пуст."""
+        deadline = time.monotonic() + self.pool_timeout
+
+        while True:
+            with self._pool_lock:
+                if self._pool:
+                    conn, last_used = self._pool.pop()
+                elif self._open_connections < self.max_connections:
+                    self._open_connections += 1
+                    self._pool_stats["misses"] += 1
+                    conn = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise sqlite3.OperationalError(
+                            f"Connection pool exhausted ({self.max_connections} connections in use)"
+                        )
+                    self._pool_lock.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    return self._new_connection()
+                except sqlite3.Error:
+                    with self._pool_lock:
+                        self._open_connections -= 1
+                        self._pool_lock.notify()
+                    raise
+
+            if time.monotonic() - last_used > self.idle_timeout:
+                self._record("expired")
+                self._discard(conn)
+                continue
+
+            if not self._is_healthy(conn):
+                self._record("failed_health_checks")
+                self._discard(conn)
+                continue
+
+            with self._pool_lock:
+                self._pool_stats["hits"] += 1
+            return conn
+
+    def _checkin(self, conn):
+        """Возвращаем соединение в пул; лишние соединения сверх pool_size закрываем."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._record("discarded")
+            self._discard(conn)
+            return
+
+        with self._pool_lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append((conn, time.monotonic()))
+                self._pool_lock.notify()
+                return
+            self._pool_stats["discarded"] += 1
+
+        self._discard(conn)
+
     def connect(self):
         if not hasattr(self._local, 'conn') or self._local.conn is None:
-            try:
-                conn = sqlite3.connect(self.db_path)
-                conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-                self._local.conn = conn
-                self._local.cursor = conn.cursor()
-                print(f"Connected to database: {self.db_path} in thread {threading.get_ident()}")
-            except sqlite3.Error as e:
-                print(f"Database connection error: {e}")
-                raise
+            conn = self._checkout()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            # Если поток завершится без close(), соединение вернется в пул вместе с thread-local данными
+            self._local.lease = _ConnectionLease()
+            self._local.release = weakref.finalize(self._local.lease, self._checkin, conn)
         return self._local.conn, self._local.cursor
     
     def close(self):
+        # Внутри transaction() соединение остается у потока до конца транзакции
+        if self.in_transaction():
+            return
         if hasattr(self._local, 'conn') and self._local.conn:
-            self._local.conn.close()
+            conn = self._local.conn
+            self._local.release.detach()
             self._local.conn = None
             self._local.cursor = None
-            print(f"Database connection closed for thread {threading.get_ident()}")
+            self._local.lease = None
+            self._local.release = None
+            self._checkin(conn)
+
+    def dispose(self):
+        """Закрываем все свободные соединения пула (например, при остановке приложения)."""
+        self.close()
+        with self._pool_lock:
+            idle = list(self._pool)
+            self._pool.clear()
+        for conn, _ in idle:
+            self._discard(conn)
+        print(f"Connection pool disposed for database: {self.db_path}")
+
+    def pool_stats(self):
+        with self._pool_lock:
+            stats = dict(self._pool_stats)
+            stats["idle"] = len(self._pool)
+            stats["open"] = self._open_connections
+            stats["in_use"] = self._open_connections - len(self._pool)
+        checkouts = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / checkouts * 100, 1) if checkouts else 0.0
+        return stats
     
     def commit(self):
+        if self.in_transaction():
+            return
         if hasattr(self._local, 'conn') and self._local.conn:
             self._local.conn.commit()
+
+    def in_transaction(self):
+        return getattr(self._local, 'tx_depth', 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Единица работы: все execute_insert/execute_update внутри блока коммитятся один раз.
+        Вложенные вызовы создают SAVEPOINT и откатываются независимо от внешней транзакции.
+        """
+        conn, cursor = self.connect()
+        depth = getattr(self._local, 'tx_depth', 0)
+
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute(f"SAVEPOINT sp_{depth}")
+
+        self._local.tx_depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.rollback()
+            else:
+                conn.execute(f"ROLLBACK TO SAVEPOINT sp_{depth}")
+                conn.execute(f"RELEASE SAVEPOINT sp_{depth}")
+            raise
+        else:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.commit()
+            else:
+                conn.execute(f"RELEASE SAVEPOINT sp_{depth}")
     
     def create_tables(self):
-        conn, cursor = self.connect()
+        """Приводим схему к последней версии; если версия актуальна, DDL не выполняется."""
+        runner = MigrationRunner(self)
         try:
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                role TEXT NOT NULL CHECK(role IN ('employee', 'employer', 'admin')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                status TEXT NOT NULL CHECK(status IN ('not_started', 'in_progress', 'paused', 'completed', 'cancelled')),
-                priority TEXT CHECK(priority IN ('low', 'medium', 'high', 'urgent')),
-                created_by INTEGER NOT NULL,
-                assigned_to INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                deadline TIMESTAMP,
-                completed_at TIMESTAMP,
-                estimated_hours REAL,
-                FOREIGN KEY (created_by) REFERENCES users(id),
-                FOREIGN KEY (assigned_to) REFERENCES users(id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS time_entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                task_id INTEGER NOT NULL,
-                start_time TIMESTAMP NOT NULL,
-                end_time TIMESTAMP,
-                duration_seconds INTEGER,
-                comment TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (task_id) REFERENCES tasks(id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender_id INTEGER NOT NULL,
-                receiver_id INTEGER NOT NULL,
-                message TEXT NOT NULL,
-                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                read_at TIMESTAMP,
-                FOREIGN KEY (sender_id) REFERENCES users(id),
-                FOREIGN KEY (receiver_id) REFERENCES users(id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS calendar_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                task_id INTEGER,
-                title TEXT NOT NULL,
-                description TEXT,
-                start_time TIMESTAMP NOT NULL,
-                end_time TIMESTAMP NOT NULL,
-                location TEXT,
-                calendar_source TEXT,
-                external_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (task_id) REFERENCES tasks(id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                type TEXT NOT NULL CHECK(type IN ('task', 'deadline', 'message', 'system')),
-                related_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                read_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                action TEXT NOT NULL,
-                entity_type TEXT NOT NULL,
-                entity_id INTEGER,
-                details TEXT,
-                ip_address TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER UNIQUE NOT NULL,
-                theme TEXT DEFAULT 'light',
-                language TEXT DEFAULT 'en',
-                notification_preferences TEXT,
-                calendar_sync BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-            """)
-            
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks(assigned_to)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_time_entries_user_id ON time_entries(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_time_entries_task_id ON time_entries(task_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_sender_receiver ON chat_messages(sender_id, receiver_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id)')
-            
-            conn.commit()
+            if runner.is_current():
+                return
+            runner.migrate()
             print("Database tables created successfully")
         except sqlite3.Error as e:
             print(f"Error creating tables: {e}")
             raise
-    
+
+    def migrate(self, target=None, dry_run=False):
+        return MigrationRunner(self).migrate(target=target, dry_run=dry_run)
+
+    def schema_version(self):
+        return MigrationRunner(self).current_version()
+
     def execute_query(self, query, params=()):
         conn, cursor = self.connect()
         try:
@@ -183,37 +313,88 @@ class Database:
             print(f"Params: {params}")
             raise
     
+    def stream_query(self, query, params=(), batch_size=1000, tuples=False):
+        """
+        Результат запроса пачками по batch_size строк. Курсор открыт на отдельном соединении из пула,
+        а не на соединении потока: записи и close() этого же потока во время чтения не задевают
+        открытый курсор. Соединение возвращается в пул, когда генератор исчерпан или закрыт.
+        tuples=True - строки обычными кортежами, без sqlite3.Row (для построчной обработки больших выборок).
+        """
+        conn = self._checkout()
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            if tuples:
+                cursor.row_factory = None
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.Error as e:
+            print(f"Query execution error: {e}")
+            print(f"Query: {query}")
+            print(f"Params: {params}")
+            raise
+        finally:
+            if cursor is not None:
+                cursor.close()
+            self._checkin(conn)
+
     def execute_insert(self, query, params=()):
         conn, cursor = self.connect()
         try:
             cursor.execute(query, params)
-            conn.commit()
+            if not self.in_transaction():
+                conn.commit()
             return cursor.lastrowid
         except sqlite3.Error as e:
             print(f"Insert error: {e}")
-            conn.rollback()
+            if not self.in_transaction():
+                conn.rollback()
             raise
     
     def execute_update(self, query, params=()):
         conn, cursor = self.connect()
         try:
             cursor.execute(query, params)
-            conn.commit()
+            if not self.in_transaction():
+                conn.commit()
             return cursor.rowcount
         except sqlite3.Error as e:
             print(f"Update error: {e}")
-            conn.rollback()
+            if not self.in_transaction():
+                conn.rollback()
+            raise
+
+    def execute_many(self, query, seq_params):
+        conn, cursor = self.connect()
+        try:
+            cursor.executemany(query, seq_params)
+            if not self.in_transaction():
+                conn.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Bulk execution error: {e}")
+            if not self.in_transaction():
+                conn.rollback()
             raise
 
 
 _db_instance = None
 
+def get_db_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 
+                        "timetracker.db")
+
+
 def get_db():
     global _db_instance
     if _db_instance is None:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 
-                              "timetracker.db")
-        _db_instance = Database(db_path)
+        storage_profile = os.environ.get("TIMETRACKER_DB_PROFILE", DEFAULT_STORAGE_PROFILE)
+        timestamp_mode = os.environ.get("TIMETRACKER_TIMESTAMP_MODE", DEFAULT_TIMESTAMP_MODE)
+        _db_instance = Database(get_db_path(), storage_profile=storage_profile, timestamp_mode=timestamp_mode)
     return _db_instance
 
 
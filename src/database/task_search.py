@@ -0,0 +1,91 @@
+"""
+Полнотекстовый поиск по таскам: FTS5 таблица tasks_fts поверх tasks(title, description).
+Индекс синхронизируется триггерами, поэтому любые INSERT/UPDATE/DELETE по tasks
+(TaskManager, импорт, ручные правки) попадают в поиск без участия менеджеров.
+"""
+import re
+from typing import Dict, List
+
+TASK_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    title, description,
+    content='tasks', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+TASK_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    # Только при изменении индексируемых колонок - смена статуса не трогает индекс
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+REBUILD_TASK_SEARCH = "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"
+
+# Заголовок весит больше описания. Ранг целый (миллионные доли bm25): ключ курсора сравнивается точно,
+# а не по значению float, пересчитанному на следующей странице
+TASK_SEARCH_RANK = "CAST(bm25(tasks_fts, 10.0, 1.0) * 1000000 AS INTEGER)"
+
+# Ранжируются только запросы из нескольких слов и только столько новейших совпадений (с фильтрами):
+# одно слово при наборе совпадает с большой долей тасков, а bm25 по всем совпадениям - секунды на 1M тасков
+TASK_SEARCH_RANK_CANDIDATES = 1000
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_available: Dict[str, bool] = {}
+
+
+def fts5_supported(conn) -> bool:
+    options = {row[0] for row in conn.execute("PRAGMA compile_options").fetchall()}
+    return "ENABLE_FTS5" in options
+
+
+def create_task_search_index(db):
+    """Миграция: таблица, триггеры и первичное заполнение. Без FTS5 поиск остается на LIKE."""
+    conn, cursor = db.connect()
+    if not fts5_supported(conn):
+        print("SQLite is built without FTS5, task search falls back to LIKE")
+        return
+
+    cursor.execute(TASK_SEARCH_TABLE)
+    for trigger in TASK_SEARCH_TRIGGERS:
+        cursor.execute(trigger)
+    cursor.execute(REBUILD_TASK_SEARCH)
+
+
+def task_search_available(db) -> bool:
+    if db.db_path not in _available:
+        rows = db.execute_query("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'")
+        _available[db.db_path] = bool(rows)
+    return _available[db.db_path]
+
+
+def ranked_search(search: str) -> bool:
+    """Одно слово ищется без ранжирования - новые таски сначала, как и без поиска."""
+    return len(_TOKEN_RE.findall(search)) > 1
+
+
+def match_query(search: str) -> str:
+    """
+    Строка из поля поиска -> выражение MATCH: каждое слово в кавычках с '*' для поиска по префиксу
+    (search-as-you-type), слова объединяются через AND. Спецсимволы FTS5 из ввода не интерпретируются.
+    """
+    tokens: List[str] = _TOKEN_RE.findall(search)
+    return " ".join(f'"{token}"*' for token in tokens)
@@ -0,0 +1,40 @@
+import datetime
+from typing import Optional, Union
+
+# Эпоха "по настенным часам": секунды от 1970-01-01 без учета часового пояса,
+# так же как strftime('%s', ...) и datetime(..., 'unixepoch') в SQLite для наивных ISO строк.
+# Смещение у aware-времени отбрасывается. Это единственное правило: заполнение start_ts/end_ts
+# в миграции тоже идет через to_epoch
+EPOCH = datetime.datetime(1970, 1, 1)
+
+TIMESTAMP_MODES = ("iso", "epoch")
+DEFAULT_TIMESTAMP_MODE = "iso"
+
+SECONDS_PER_DAY = 86400
+
+
+def to_epoch(value: Union[str, datetime.datetime, datetime.date, int, None]) -> Optional[int]:
+    """ISO строка / datetime / date -> целые секунды эпохи."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time.min)
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return int((value - EPOCH).total_seconds())
+
+
+def from_epoch(value: Optional[int]) -> Optional[str]:
+    """Целые секунды эпохи -> ISO строка, в том виде, в котором ее ждут UI и отчеты."""
+    if value is None:
+        return None
+    return (EPOCH + datetime.timedelta(seconds=value)).isoformat()
+
+
+def epoch_day(value: int) -> str:
+    """Номер дня (секунды // 86400) -> дата YYYY-MM-DD."""
+    return (EPOCH + datetime.timedelta(days=value)).date().isoformat()
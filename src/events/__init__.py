@@ -0,0 +1,6 @@
+
+from .event_bus import (EventBus, get_event_bus, CHAT_MESSAGE, TASK_CREATED, NOTIFICATION_CREATED, NOTIFICATION_UPDATED,
+                        TIME_ENTRY_CHANGED)
+
+__all__ = ['EventBus', 'get_event_bus', 'CHAT_MESSAGE', 'TASK_CREATED', 'NOTIFICATION_CREATED', 'NOTIFICATION_UPDATED',
+           'TIME_ENTRY_CHANGED']
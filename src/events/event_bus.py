@@ -0,0 +1,114 @@
+"""
+Внутрипроцессная шина событий: менеджеры публикуют события после коммита, страницы Streamlit
+сверяют номер версии своего юзера в памяти и перезапускаются только когда что-то изменилось.
+Шина живет в процессе сервера - записи из других процессов (CLI, импорт) через нее не приходят.
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CHAT_MESSAGE = "chat.message"
+TASK_CREATED = "task.created"
+NOTIFICATION_CREATED = "notification.created"
+NOTIFICATION_UPDATED = "notification.updated"
+TIME_ENTRY_CHANGED = "time.entry"
+
+
+class EventBus:
+    """
+    У каждого юзера монотонный номер версии и короткая история последних событий.
+    Потребитель хранит последнюю виденную версию и спрашивает events_since - без запросов к БД;
+    wait() блокирует поток до нового события, subscribe() вызывает callback в потоке публикации.
+    """
+
+    def __init__(self, history: int = 100):
+        self.history = history
+        self._condition = threading.Condition()
+        self._versions: Dict[int, int] = {}
+        # (user_id, topic) -> версия последнего события темы; не вытесняется вместе с историей
+        self._topic_versions: Dict[Tuple[int, str], int] = {}
+        self._events: Dict[int, deque] = {}
+        self._subscribers: Dict[int, List[Callable[[Dict], None]]] = {}
+
+    def publish(self, topic: str, user_ids: Iterable[int], payload: Optional[Dict] = None) -> int:
+        """Событие для каждого из user_ids (None и повторы пропускаются). Возвращает число адресатов."""
+        recipients = {user_id for user_id in user_ids if user_id is not None}
+        callbacks = []
+
+        with self._condition:
+            for user_id in recipients:
+                version = self._versions.get(user_id, 0) + 1
+                self._versions[user_id] = version
+                self._topic_versions[(user_id, topic)] = version
+                event = {
+                    "version": version,
+                    "topic": topic,
+                    "user_id": user_id,
+                    "payload": payload or {},
+                    "published_at": time.time()
+                }
+                self._events.setdefault(user_id, deque(maxlen=self.history)).append(event)
+                callbacks.extend((callback, event) for callback in self._subscribers.get(user_id, ()))
+            self._condition.notify_all()
+
+        for callback, event in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Event subscriber error ({topic}): {e}")
+
+        return len(recipients)
+
+    def version(self, user_id: int, topics: Optional[Iterable[str]] = None) -> int:
+        """Текущая версия юзера, а с topics - версия последнего события одной из тем (0, если их не было)."""
+        with self._condition:
+            if topics is None:
+                return self._versions.get(user_id, 0)
+            return max((self._topic_versions.get((user_id, topic), 0) for topic in topics), default=0)
+
+    def events_since(self, user_id: int, version: int) -> Tuple[int, List[Dict]]:
+        """
+        Текущая версия и события после version. Если потребитель отстал больше чем на history событий,
+        старые уже вытеснены - список неполный, но версия все равно показывает, что изменения были.
+        """
+        with self._condition:
+            current = self._versions.get(user_id, 0)
+            if current <= version:
+                return current, []
+            events = [event for event in self._events.get(user_id, ()) if event["version"] > version]
+            return current, events
+
+    def wait(self, user_id: int, version: int, timeout: Optional[float] = None) -> int:
+        """Ждет версию больше version (или timeout) и возвращает текущую версию."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._versions.get(user_id, 0) > version, timeout)
+            return self._versions.get(user_id, 0)
+
+    def subscribe(self, user_id: int, callback: Callable[[Dict], None]) -> Callable[[], None]:
+        """Возвращает функцию отписки."""
+        with self._condition:
+            self._subscribers.setdefault(user_id, []).append(callback)
+
+        def unsubscribe():
+            with self._condition:
+                callbacks = self._subscribers.get(user_id, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+                if not callbacks:
+                    self._subscribers.pop(user_id, None)
+
+        return unsubscribe
+
+
+_bus_instance = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    global _bus_instance
+    if _bus_instance is None:
+        with _bus_lock:
+            if _bus_instance is None:
+                _bus_instance = EventBus()
+    return _bus_instance
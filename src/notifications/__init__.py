@@ -1,4 +1,5 @@
 
 from .notification_manager import NotificationManager
+from .deadline_job import DeadlineNotificationJob
 
-__all__ = ['NotificationManager']
+__all__ = ['NotificationManager', 'DeadlineNotificationJob']
@@ -0,0 +1,36 @@
+"""
+Задача уведомлений о дедлайнах из командной строки (например, из cron):
+    python -m src.notifications --deadlines
+"""
+import argparse
+import os
+
+from ..database import Database
+from ..database.schema import DEFAULT_STORAGE_PROFILE, get_db_path
+from .deadline_job import DeadlineNotificationJob
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Time Tracker notification jobs")
+    parser.add_argument("--db", default=get_db_path(), help="Path to the SQLite database file")
+    parser.add_argument("--deadlines", action="store_true", help="Create notifications for deadlines in the next 24 hours")
+    parser.add_argument("--batch-size", type=int, default=500, help="Tasks per transaction")
+    args = parser.parse_args()
+
+    if not args.deadlines:
+        parser.print_help()
+        return
+
+    storage_profile = os.environ.get("TIMETRACKER_DB_PROFILE", DEFAULT_STORAGE_PROFILE)
+    db = Database(args.db, storage_profile=storage_profile)
+
+    try:
+        stats = DeadlineNotificationJob.run(batch_size=args.batch_size, db=db)
+        print(f"Deadline notifications: {stats['inserted']} created for {stats['users_notified']} users "
+              f"in {stats['batches']} batches ({stats['elapsed_ms']:.1f} ms)")
+    finally:
+        db.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Фоновая задача уведомлений о дедлайнах в ближайшие сутки.
+Отбор тасков и вставка уведомлений - один INSERT ... SELECT на пачку задач по id, каждая пачка в своей
+транзакции: проверка "уже уведомляли за 24 часа" и вставка видят одно и то же состояние таблицы.
+"""
+import datetime
+import threading
+import time
+from typing import Dict, Optional
+
+from ..database import get_db
+from ..events import NOTIFICATION_CREATED, get_event_bus
+
+# Условия отбора общие для выбора границы пачки и для вставки
+DEADLINE_CANDIDATES = """
+FROM tasks t
+JOIN users u ON t.assigned_to = u.id
+WHERE t.deadline IS NOT NULL
+AND t.deadline > :now
+AND t.deadline < :until
+AND t.status NOT IN ('completed', 'cancelled')
+AND NOT EXISTS (
+    SELECT 1 FROM notifications n
+    WHERE n.related_id = t.id
+    AND n.type = 'deadline'
+    AND n.created_at > :since
+)
+"""
+
+# Тексты совпадают с прежней построчной версией: часы до дедлайна усекаются до целого
+INSERT_DEADLINE_NOTIFICATIONS = f"""
+INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
+SELECT t.assigned_to,
+       CASE
+           WHEN (julianday(t.deadline) - julianday(:now)) * 24 <= 2 THEN '⚠️ URGENT: Task Deadline in Less Than 2 Hours'
+           WHEN (julianday(t.deadline) - julianday(:now)) * 24 <= 8 THEN '⚠️ Task Deadline Today'
+           ELSE 'Upcoming Task Deadline'
+       END,
+       CASE
+           WHEN (julianday(t.deadline) - julianday(:now)) * 24 <= 2
+               THEN 'Task ''' || t.title || ''' is due in less than 2 hours!'
+           ELSE 'Task ''' || t.title || ''' is due in '
+                || CAST((julianday(t.deadline) - julianday(:now)) * 24 AS INTEGER) || ' hours!'
+       END,
+       'deadline', t.id, :now
+{DEADLINE_CANDIDATES}
+AND t.id > :after_id AND t.id <= :last_id
+"""
+
+SELECT_DEADLINE_BATCH = f"""
+SELECT t.id, t.assigned_to
+{DEADLINE_CANDIDATES}
+AND t.id > :after_id
+ORDER BY t.id
+LIMIT :batch_size
+"""
+
+
+class DeadlineNotificationJob:
+
+    @staticmethod
+    def run(now: Optional[datetime.datetime] = None, batch_size: int = 500, db=None) -> Dict:
+        """
+        Один проход. Возвращает статистику: сколько пачек, сколько уведомлений вставлено,
+        скольким юзерам и за сколько миллисекунд.
+        """
+        db = db or get_db()
+        now = now or datetime.datetime.now()
+        params = {
+            "now": now.isoformat(),
+            "until": (now + datetime.timedelta(days=1)).isoformat(),
+            "since": (now - datetime.timedelta(hours=24)).isoformat(),
+            "batch_size": batch_size,
+            "after_id": 0
+        }
+
+        stats = {"batches": 0, "inserted": 0, "users_notified": 0, "elapsed_ms": 0.0}
+        notified_users = set()
+        started = time.perf_counter()
+
+        try:
+            while True:
+                with db.transaction():
+                    batch = db.execute_query(SELECT_DEADLINE_BATCH, params)
+                    if not batch:
+                        break
+
+                    last_id = batch[-1]["id"]
+                    inserted = db.execute_update(INSERT_DEADLINE_NOTIFICATIONS, dict(params, last_id=last_id))
+
+                stats["batches"] += 1
+                stats["inserted"] += inserted
+                notified_users.update(row["assigned_to"] for row in batch)
+                params["after_id"] = last_id
+
+                if len(batch) < batch_size:
+                    break
+        finally:
+            db.close()
+
+        if notified_users:
+            get_event_bus().publish(NOTIFICATION_CREATED, notified_users, {"type": "deadline"})
+
+        stats["users_notified"] = len(notified_users)
+        stats["elapsed_ms"] = (time.perf_counter() - started) * 1000
+        return stats
+
+    @staticmethod
+    def start(interval: float = 900.0, batch_size: int = 500) -> threading.Event:
+        """
+        Запускает проход раз в interval секунд в фоновом потоке. Возвращает Event - set() останавливает поток.
+        """
+        stop = threading.Event()
+
+        def loop():
+            while not stop.is_set():
+                try:
+                    stats = DeadlineNotificationJob.run(batch_size=batch_size)
+                    if stats["inserted"]:
+                        print(f"Deadline notifications: {stats['inserted']} created for {stats['users_notified']} users "
+                              f"in {stats['batches']} batches ({stats['elapsed_ms']:.1f} ms)")
+                except Exception as e:
+                    print(f"Deadline notification job failed: {e}")
+                stop.wait(interval)
+
+        threading.Thread(target=loop, name="deadline-notifications", daemon=True).start()
+        return stop
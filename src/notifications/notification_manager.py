@@ -3,10 +3,19 @@ import datetime
 from typing import Dict, List, Optional, Tuple
 
 from ..database import get_db
+from ..database.cache import TTLCache
+from ..database.pagination import decode_cursor, encode_cursor, keyset_condition, split_page
+from ..events import NOTIFICATION_CREATED, NOTIFICATION_UPDATED, get_event_bus
+from .deadline_job import DeadlineNotificationJob
 
 
 class NotificationManager:
 
+    # Счетчики непрочитанных. Ключ включает версию юзера в шине событий: любое создание/прочтение/удаление
+    # уведомления публикует событие, и следующий вызов читает уже новый ключ. TTL ограничивает устаревание
+    # при записях мимо менеджеров (другой процесс).
+    _unread_cache = TTLCache(maxsize=4096, ttl=60)
+
     @staticmethod
     def create_notification(user_id: int, title: str, message: str,
                            notification_type: str, related_id: Optional[int] = None) -> Tuple[bool, str, Optional[int]]:
@@ -32,6 +41,9 @@ class NotificationManager:
                 (user_id, title, message, notification_type, related_id, created_at)
             )
 
+            get_event_bus().publish(NOTIFICATION_CREATED, (user_id,),
+                                    {"type": notification_type, "related_id": related_id})
+
             return True, "Notification created successfully", notification_id
         except Exception as e:
             return False, f"Failed to create notification: {str(e)}", None
@@ -51,11 +63,14 @@ class NotificationManager:
 
         try:
             read_at = datetime.datetime.now().isoformat()
-            db.execute_update(
-                "UPDATE notifications SET read_at = ? WHERE id = ?",
+            updated = db.execute_update(
+                "UPDATE notifications SET read_at = ? WHERE id = ? AND read_at IS NULL",
                 (read_at, notification_id)
             )
 
+            if updated:
+                get_event_bus().publish(NOTIFICATION_UPDATED, (user_id,), {"notification_id": notification_id})
+
             return True, "Notification marked as read"
         except Exception as e:
             return False, f"Failed to mark notification as read: {str(e)}"
@@ -67,11 +82,14 @@ class NotificationManager:
 
         try:
             read_at = datetime.datetime.now().isoformat()
-            db.execute_update(
+            updated = db.execute_update(
                 "UPDATE notifications SET read_at = ? WHERE user_id = ? AND read_at IS NULL",
                 (read_at, user_id)
             )
 
+            if updated:
+                get_event_bus().publish(NOTIFICATION_UPDATED, (user_id,), {"read": updated})
+
             return True, "All notifications marked as read"
         except Exception as e:
             return False, f"Failed to mark notifications as read: {str(e)}"
@@ -95,12 +113,15 @@ class NotificationManager:
                 (notification_id,)
             )
 
+            get_event_bus().publish(NOTIFICATION_UPDATED, (user_id,), {"notification_id": notification_id})
+
             return True, "Notification deleted successfully"
         except Exception as e:
             return False, f"Failed to delete notification: {str(e)}"
 
     @staticmethod
-    def get_notifications(user_id: int, unread_only: bool = False, limit: int = 50) -> List[Dict]:
+    def get_notifications(user_id: int, unread_only: bool = False, limit: int = 50,
+                          cursor: Optional[str] = None) -> List[Dict]:
         db = get_db()
 
         query = """
@@ -114,7 +135,12 @@ class NotificationManager:
         if unread_only:
             query += " AND read_at IS NULL"
 
-        query += " ORDER BY created_at DESC LIMIT ?"
+        if cursor:
+            condition, condition_params = keyset_condition(("created_at", "id"), decode_cursor(cursor, 2))
+            query += f" AND {condition}"
+            params.extend(condition_params)
+
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
         params.append(limit)
 
         notifications = db.execute_query(query, tuple(params))
@@ -126,73 +152,43 @@ class NotificationManager:
         return result
 
     @staticmethod
-    def get_unread_count(user_id: int) -> int:
-        db = get_db()
+    def get_notifications_page(user_id: int, unread_only: bool = False, limit: int = 20,
+                               cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        notifications = NotificationManager.get_notifications(user_id, unread_only, limit + 1, cursor)
+        return split_page(notifications, limit, lambda item: encode_cursor(item["created_at"], item["id"]))
 
-        result = db.execute_query(
-            """
-            SELECT COUNT(*) as count
-            FROM notifications
-            WHERE user_id = ? AND read_at IS NULL
-            """,
-            (user_id,)
-        )
+    @staticmethod
+    def get_unread_count(user_id: int, db=None) -> int:
+        """
+        Счетчик непрочитанных из кэша. Версия берется до чтения: запись во время чтения сменит ключ.
+        db - уже полученное соединение для промаха кэша (вызывающий закрывает его сам).
+        """
+        owns_connection = db is None
+        db = db or get_db()
 
-        return dict(result[0])['count']
+        try:
+            cache_key = (db.db_path, user_id, get_event_bus().version(user_id))
+
+            count = NotificationManager._unread_cache.get(cache_key)
+            if count is None:
+                # Частичный индекс idx_notifications_unread хранит только непрочитанные - счет без чтения таблицы
+                result = db.execute_query(
+                    """
+                    SELECT COUNT(*) as count
+                    FROM notifications
+                    WHERE user_id = ? AND read_at IS NULL
+                    """,
+                    (user_id,)
+                )
+                count = dict(result[0])['count']
+                NotificationManager._unread_cache.set(cache_key, count)
+
+            return count
+        finally:
+            if owns_connection:
+                db.close()
 
     @staticmethod
     def create_deadline_notifications() -> int:
-
-        db = get_db()
-
-        now = datetime.datetime.now()
-        tomorrow = (now + datetime.timedelta(days=1)).isoformat()
-
-        tasks = db.execute_query(
-            """
-            SELECT t.id, t.title, t.deadline, t.assigned_to, u.username
-            FROM tasks t
-            JOIN users u ON t.assigned_to = u.id
-            WHERE t.deadline IS NOT NULL
-            AND t.deadline > ?
-            AND t.deadline < ?
-            AND t.status NOT IN ('completed', 'cancelled')
-            AND NOT EXISTS (
-                SELECT 1 FROM notifications n
-                WHERE n.related_id = t.id
-                AND n.type = 'deadline'
-                AND n.created_at > ?
-            )
-            """,
-            (now.isoformat(), tomorrow, (now - datetime.timedelta(hours=24)).isoformat())
-        )
-
-        notification_count = 0
-
-        for task in tasks:
-            task_data = dict(task)
-            deadline = datetime.datetime.fromisoformat(task_data['deadline'])
-            hours_remaining = (deadline - now).total_seconds() / 3600
-
-            if hours_remaining <= 2:
-                title = "⚠️ URGENT: Task Deadline in Less Than 2 Hours"
-                message = f"Task '{task_data['title']}' is due in less than 2 hours!"
-            elif hours_remaining <= 8:
-                title = "⚠️ Task Deadline Today"
-                message = f"Task '{task_data['title']}' is due in {int(hours_remaining)} hours!"
-            else:
-                title = "Upcoming Task Deadline"
-                message = f"Task '{task_data['title']}' is due in {int(hours_remaining)} hours!"
-
-            success, _, _ = NotificationManager.create_notification(
-                user_id=task_data['assigned_to'],
-                title=title,
-                message=message,
-                notification_type='deadline',
-                related_id=task_data['id']
-            )
-
-            if success:
-                notification_count += 1
-
-        return notification_count
+        """Проход задачи дедлайнов (см. DeadlineNotificationJob); возвращает число созданных уведомлений."""
+        return DeadlineNotificationJob.run()["inserted"]
@@ -1,4 +1,6 @@
 
 from .reporting_manager import ReportingManager
+from .table_export import EXPORT_FORMATS, TableExporter
+from .export_jobs import ExportJobManager
 
-__all__ = ['ReportingManager']
+__all__ = ['ReportingManager', 'TableExporter', 'EXPORT_FORMATS', 'ExportJobManager']
@@ -0,0 +1,386 @@
+"""
+Фоновые выгрузки отчетов. Страница ставит задачу в очередь и опрашивает ее строку в export_jobs,
+сама выгрузка идет в пуле потоков процесса сервера и не держит поток прогона Streamlit.
+Одновременно выполняется не больше MAX_CONCURRENT_EXPORTS задач, остальные ждут в очереди пула.
+Задача принадлежит поставившему ее процессу (owner_host, owner_pid), который продлевает heartbeat_at,
+пока задача в очереди или выполняется.
+"""
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ..database.schema import get_db
+from .reporting_manager import ReportingManager
+from .table_export import EXPORT_FORMATS, TableExporter
+
+MAX_CONCURRENT_EXPORTS = 2
+MAX_ACTIVE_JOBS_PER_USER = 3
+
+# Прогресс пишется в БД не чаще раза в PROGRESS_INTERVAL секунд
+PROGRESS_INTERVAL = 0.5
+
+# Владелец продлевает heartbeat_at своих задач раз в HEARTBEAT_INTERVAL секунд; задача, чей heartbeat
+# старше JOB_LEASE секунд, брошена, даже если процесс с тем же pid существует
+HEARTBEAT_INTERVAL = 30.0
+JOB_LEASE = 300.0
+
+# Формат задачи -> расширение итогового файла
+JOB_FORMATS = dict(EXPORT_FORMATS, xlsx=".xlsx", pdf=".pdf")
+JOB_CONTENTS = ("report", "entries")
+ACTIVE_STATUSES = ("queued", "running")
+
+JOB_COLUMNS = """
+id, user_id, export_user_id, export_format, contents, start_date, end_date, include_details,
+status, progress, rows_written, total_rows, result_paths, error, created_at, started_at, finished_at
+"""
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# id задачи -> Event отмены, только для незавершенных задач, поставленных этим процессом
+_cancel_events: Dict[int, threading.Event] = {}
+_owner_host = socket.gethostname()
+
+
+class ExportJobManager:
+
+    @staticmethod
+    def submit(user_id: int, export_format: str, start_date: str, end_date: str,
+               export_user_id: Optional[int] = None, contents: str = "report",
+               include_details: bool = True, export_dir: Optional[str] = None) -> Tuple[bool, str, Optional[int]]:
+        """
+        Ставит выгрузку в очередь. export_user_id - чей отчет (None - все юзеры), user_id - кто запросил.
+        Возвращаем кортеж (success, message, job_id).
+        """
+        if export_format not in JOB_FORMATS:
+            return False, f"Unsupported export format: {export_format}", None
+        if contents not in JOB_CONTENTS:
+            return False, f"Unsupported export contents: {contents}", None
+        if contents == "entries" and export_format not in EXPORT_FORMATS:
+            return False, "Raw time entries can only be exported as CSV or Parquet", None
+
+        executor = ExportJobManager._get_executor()
+        db = get_db()
+
+        try:
+            with db.transaction():
+                active = db.execute_query(
+                    "SELECT COUNT(*) as count FROM export_jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                    (user_id,)
+                )[0]["count"]
+                if active >= MAX_ACTIVE_JOBS_PER_USER:
+                    return False, f"You already have {active} exports in progress", None
+
+                now = datetime.datetime.now().isoformat()
+                job_id = db.execute_insert(
+                    """
+                    INSERT INTO export_jobs (user_id, export_user_id, export_format, contents, start_date, end_date,
+                                             include_details, created_at, owner_host, owner_pid, heartbeat_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (user_id, export_user_id, export_format, contents, start_date, end_date,
+                     include_details, now, _owner_host, os.getpid(), now)
+                )
+        except Exception as e:
+            print(f"Error submitting export job: {e}")
+            return False, "Failed to queue export", None
+        finally:
+            db.close()
+
+        _cancel_events[job_id] = threading.Event()
+        executor.submit(ExportJobManager._run, job_id, export_dir or os.path.join(os.getcwd(), "exports"))
+        return True, "Export queued", job_id
+
+    @staticmethod
+    def cancel(job_id: int, user_id: int) -> Tuple[bool, str]:
+        """
+        Отмена задачи юзера. Задача в очереди не запустится, выполняющаяся прервется на следующей пачке строк.
+        """
+        db = get_db()
+        try:
+            updated = db.execute_update(
+                """
+                UPDATE export_jobs SET status = 'cancelled', finished_at = ?
+                WHERE id = ? AND user_id = ? AND status IN ('queued', 'running')
+                """,
+                (datetime.datetime.now().isoformat(), job_id, user_id)
+            )
+        except Exception as e:
+            print(f"Error cancelling export job: {e}")
+            return False, "Failed to cancel export"
+        finally:
+            db.close()
+
+        if not updated:
+            return False, "Export is already finished"
+
+        event = _cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        return True, "Export cancelled"
+
+    @staticmethod
+    def get_job(job_id: int, db=None) -> Optional[Dict]:
+        # Соединение закрываем, только если открыли его здесь: выполняющаяся задача читает свою строку через свое
+        owns_connection = db is None
+        db = db or get_db()
+        try:
+            rows = db.execute_query(f"SELECT {JOB_COLUMNS} FROM export_jobs WHERE id = ?", (job_id,))
+            return ExportJobManager._job_dict(rows[0]) if rows else None
+        finally:
+            if owns_connection:
+                db.close()
+
+    @staticmethod
+    def get_user_jobs(user_id: int, limit: int = 10) -> List[Dict]:
+        db = get_db()
+        try:
+            rows = db.execute_query(
+                f"SELECT {JOB_COLUMNS} FROM export_jobs WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (user_id, limit)
+            )
+            return [ExportJobManager._job_dict(row) for row in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def wait(job_id: int, timeout: Optional[float] = None, interval: float = 0.1) -> Optional[Dict]:
+        """Ждет завершения задачи (для CLI и тестов). Возвращает задачу в последнем увиденном состоянии."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = ExportJobManager.get_job(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                return job
+            time.sleep(interval)
+
+    @staticmethod
+    def recover_interrupted() -> int:
+        """
+        Задачи queued/running умерших процессов сервера уже никто не выполнит - помечаем их failed.
+        Задачи живых процессов (в том числе соседних на этом же хосте) не трогаем.
+        Вызывается один раз при старте сервера. Возвращает число помеченных задач.
+        """
+        db = get_db()
+        try:
+            rows = db.execute_query(
+                "SELECT id, owner_host, owner_pid, heartbeat_at FROM export_jobs WHERE status IN ('queued', 'running')"
+            )
+            lease_start = (datetime.datetime.now() - datetime.timedelta(seconds=JOB_LEASE)).isoformat()
+            job_ids = [row["id"] for row in rows if not ExportJobManager._owner_alive(row, lease_start)]
+            if not job_ids:
+                return 0
+            return db.execute_update(
+                f"""
+                UPDATE export_jobs SET status = 'failed', error = 'Interrupted by server restart', finished_at = ?
+                WHERE id IN ({", ".join("?" * len(job_ids))}) AND status IN ('queued', 'running')
+                """,
+                (datetime.datetime.now().isoformat(), *job_ids)
+            )
+        except Exception as e:
+            print(f"Error recovering export jobs: {e}")
+            return 0
+        finally:
+            db.close()
+
+    @staticmethod
+    def _owner_alive(job, lease_start: str) -> bool:
+        """
+        Владелец жив, если heartbeat не старше JOB_LEASE и, для задач этого хоста, его процесс существует.
+        Задачи без heartbeat (поставленные до появления владельцев) считаются брошенными.
+        """
+        if job["heartbeat_at"] is None or job["heartbeat_at"] < lease_start:
+            return False
+        if job["owner_host"] != _owner_host:
+            return True
+        if job["owner_pid"] == os.getpid():
+            # Прежний процесс с тем же pid (например, pid 1 в контейнере после рестарта)
+            return job["id"] in _cancel_events
+        # На Windows os.kill с сигналом 0 завершает процесс, там полагаемся только на heartbeat
+        if os.name == "nt":
+            return True
+        try:
+            os.kill(job["owner_pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Процесс есть, но принадлежит другому пользователю
+            return True
+        return True
+
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        global _executor
+        if _executor is None:
+            with _executor_lock:
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_EXPORTS, thread_name_prefix="export-job")
+                    threading.Thread(
+                        target=ExportJobManager._heartbeat_loop, name="export-job-heartbeat", daemon=True
+                    ).start()
+        return _executor
+
+    @staticmethod
+    def _heartbeat_loop():
+        """Продлевает heartbeat_at незавершенных задач этого процесса, в том числе ждущих в очереди пула."""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            job_ids = list(_cancel_events)
+            if not job_ids:
+                continue
+            db = get_db()
+            try:
+                db.execute_update(
+                    f"""
+                    UPDATE export_jobs SET heartbeat_at = ?
+                    WHERE id IN ({", ".join("?" * len(job_ids))}) AND status IN ('queued', 'running')
+                    """,
+                    (datetime.datetime.now().isoformat(), *job_ids)
+                )
+            except Exception as e:
+                print(f"Error updating export job heartbeat: {e}")
+            finally:
+                db.close()
+
+    @staticmethod
+    def _run(job_id: int, export_dir: str):
+        cancel_event = _cancel_events.get(job_id) or threading.Event()
+        db = get_db()
+
+        try:
+            now = datetime.datetime.now().isoformat()
+            started = db.execute_update(
+                "UPDATE export_jobs SET status = 'running', started_at = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, now, job_id)
+            )
+            job = ExportJobManager.get_job(job_id, db=db)
+            if not started or job is None:
+                return
+
+            total_rows = ExportJobManager._count_rows(job)
+            db.execute_update("UPDATE export_jobs SET total_rows = ? WHERE id = ?", (total_rows, job_id))
+            last_update = [0.0]
+
+            def on_progress(rows: int):
+                if cancel_event.is_set():
+                    raise ExportCancelled(f"Export job {job_id} cancelled")
+                now = time.monotonic()
+                if now - last_update[0] >= PROGRESS_INTERVAL:
+                    last_update[0] = now
+                    ExportJobManager._set_progress(db, job_id, rows, total_rows)
+
+            os.makedirs(export_dir, exist_ok=True)
+            paths, rows_written = ExportJobManager._export(job, export_dir, on_progress)
+
+            if cancel_event.is_set():
+                raise ExportCancelled(f"Export job {job_id} cancelled")
+            if not paths:
+                raise RuntimeError("Export failed")
+
+            completed = db.execute_update(
+                """
+                UPDATE export_jobs
+                SET status = 'completed', progress = 1, rows_written = ?, result_paths = ?, finished_at = ?
+                WHERE id = ? AND status = 'running'
+                """,
+                (rows_written, json.dumps(paths), datetime.datetime.now().isoformat(), job_id)
+            )
+            # Отменена между концом выгрузки и этой записью
+            if not completed:
+                ExportJobManager._remove_files(export_dir, job_id)
+        except Exception as e:
+            # Выгрузки сами ловят исключения и возвращают неудачу, так что недописанные файлы ищем по префиксу задачи
+            ExportJobManager._remove_files(export_dir, job_id)
+            if not cancel_event.is_set():
+                print(f"Export job {job_id} failed: {e}")
+                db.execute_update(
+                    "UPDATE export_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                    (str(e), datetime.datetime.now().isoformat(), job_id)
+                )
+        finally:
+            _cancel_events.pop(job_id, None)
+            db.close()
+
+    @staticmethod
+    def _export(job: Dict, export_dir: str, on_progress) -> Tuple[Dict[str, str], int]:
+        """
+        Файлы задачи называются job<id>_..., чтобы параллельные выгрузки одного периода не перезаписали друг друга.
+        Возвращает ({раздел: путь}, число записанных записей); пустой словарь - ошибка.
+        """
+        user_part = job["export_user_id"] if job["export_user_id"] else "all_users"
+        period_part = f"{job['start_date'][:10].replace('-', '')}_{job['end_date'][:10].replace('-', '')}"
+        base = os.path.join(export_dir, f"job{job['id']}_{user_part}_{period_part}")
+        export_format = job["export_format"]
+        extension = JOB_FORMATS[export_format]
+
+        if job["contents"] == "entries":
+            path = f"{base}_time_entries{extension}"
+            exported = TableExporter.export_time_entries(
+                path, export_format, job["export_user_id"], job["start_date"], job["end_date"], progress=on_progress
+            )
+            return ({"time_entries": path} if exported >= 0 else {}), exported
+
+        if export_format in EXPORT_FORMATS:
+            return TableExporter.export_report(
+                job["export_user_id"], job["start_date"], job["end_date"], f"{base}_time_report",
+                export_format, job["include_details"], progress=on_progress
+            )
+
+        path = f"{base}_time_report{extension}"
+        if export_format == "xlsx":
+            exported = ReportingManager.export_report_streaming(
+                job["export_user_id"], job["start_date"], job["end_date"], path,
+                job["include_details"], progress=on_progress
+            )
+        else:
+            exported = ReportingManager.export_report_pdf_streaming(
+                job["export_user_id"], job["start_date"], job["end_date"], path,
+                job["include_details"], progress=on_progress
+            )
+        return ({"report": path} if exported >= 0 else {}), exported
+
+    @staticmethod
+    def _count_rows(job: Dict) -> int:
+        """Число записей за период из дневного агрегата - O(дней), для процента выполнения."""
+        if job["contents"] == "report" and not job["include_details"]:
+            return 0
+        report_data = ReportingManager.generate_time_report(
+            job["export_user_id"], job["start_date"], job["end_date"], include_details=False
+        )
+        return report_data.get('summary', {}).get('total_entries', 0)
+
+    @staticmethod
+    def _set_progress(db, job_id: int, rows: int, total_rows: int):
+        try:
+            db.execute_update(
+                "UPDATE export_jobs SET rows_written = ?, progress = ? WHERE id = ? AND status = 'running'",
+                (rows, min(rows / total_rows, 0.99) if total_rows else 0, job_id)
+            )
+        except Exception as e:
+            print(f"Error updating export job progress: {e}")
+
+    @staticmethod
+    def _remove_files(export_dir: str, job_id: int):
+        prefix = f"job{job_id}_"
+        if os.path.isdir(export_dir):
+            for name in os.listdir(export_dir):
+                if name.startswith(prefix):
+                    os.unlink(os.path.join(export_dir, name))
+
+    @staticmethod
+    def _job_dict(row) -> Dict:
+        job = dict(row)
+        job["include_details"] = bool(job["include_details"])
+        job["result_paths"] = json.loads(job["result_paths"]) if job["result_paths"] else {}
+        return job
@@ -0,0 +1,271 @@
+"""
+PDF-отчет на fpdf2 с Unicode TTF-шрифтом (кириллица, диакритика и т.п. - core-шрифты fpdf их не выводят).
+Разбор TTF (метрики всех глифов) стоит ~40 мс на начертание и делается один раз на процесс: документ
+получает копию разобранного шрифта со своим подмножеством и свежим объектом fontTools (при выводе
+fpdf2 урезает его до подмножества на месте). Шрифт встраивается подмножеством использованных символов.
+Таблицы рисуются строками фиксированной высоты, при переносе на новую страницу шапка таблицы повторяется.
+"""
+import copy
+import importlib.util
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fontTools import ttLib
+from fpdf import FPDF, XPos, YPos
+from fpdf.fonts import SubsetMap, TTFFont
+
+FONT_FAMILY = "ReportSans"
+CORE_FONT_FAMILY = "Helvetica"
+
+# Где искать DejaVu Sans: TIMETRACKER_PDF_FONT (путь к обычному начертанию), системные шрифты,
+# копия из matplotlib (есть в requirements)
+FONT_FILE = "DejaVuSans.ttf"
+BOLD_FONT_FILE = "DejaVuSans-Bold.ttf"
+SYSTEM_FONT_DIRS = [
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "/usr/local/share/fonts",
+]
+
+# Разобранные шрифты на процесс: (путь, начертание) -> TTFFont первого документа, источник метрик для копий
+_PARSED_FONTS: Dict[Tuple[str, str], TTFFont] = {}
+
+ROW_HEIGHT = 6
+HEADER_ROW_HEIGHT = 7
+PAGE_MARGIN = 10
+
+# Колонки таблиц: (заголовок, ширина мм, выравнивание)
+TASK_TABLE = [("Task", 100, "L"), ("Hours", 30, "R"), ("Percentage", 30, "R"), ("Entries", 30, "R")]
+DAY_TABLE = [("Date", 60, "L"), ("Hours", 30, "R")]
+ENTRY_TABLE = [("Task", 50, "L"), ("Start Time", 30, "L"), ("End Time", 30, "L"), ("Duration", 22, "R"),
+               ("Comment", 58, "L")]
+
+
+def find_unicode_fonts() -> Tuple[Optional[str], Optional[str]]:
+    """Пути к обычному и жирному начертанию; (None, None), если Unicode-шрифт не найден."""
+    regular = os.environ.get("TIMETRACKER_PDF_FONT")
+    if regular and os.path.exists(regular):
+        bold = os.path.join(os.path.dirname(regular), BOLD_FONT_FILE)
+        return regular, bold if os.path.exists(bold) else None
+
+    font_dirs = list(SYSTEM_FONT_DIRS)
+    matplotlib = importlib.util.find_spec("matplotlib")
+    if matplotlib and matplotlib.submodule_search_locations:
+        font_dirs.append(os.path.join(matplotlib.submodule_search_locations[0], "mpl-data", "fonts", "ttf"))
+
+    for font_dir in font_dirs:
+        regular = os.path.join(font_dir, FONT_FILE)
+        if os.path.exists(regular):
+            bold = os.path.join(font_dir, BOLD_FONT_FILE)
+            return regular, bold if os.path.exists(bold) else None
+    return None, None
+
+
+class ReportPDF(FPDF):
+    """
+    Документ отчета. table_columns - колонки текущей таблицы: header() повторяет ее шапку
+    на каждой новой странице, пока таблица не закончится.
+    """
+
+    def __init__(self, report_title: str):
+        super().__init__(orientation="P", unit="mm", format="A4")
+        self.report_title = report_title
+        self.table_columns: Optional[List[Tuple[str, int, str]]] = None
+        self.alias_nb_pages()
+        self.set_margins(PAGE_MARGIN, PAGE_MARGIN)
+        self.set_auto_page_break(True, PAGE_MARGIN + 5)
+        self.font_name = self._add_unicode_fonts()
+        self._ellipsis = "…" if self.font_name == FONT_FAMILY else "..."
+
+    def _add_unicode_fonts(self) -> str:
+        regular, bold = find_unicode_fonts()
+        if regular is None:
+            return CORE_FONT_FAMILY
+
+        self._add_parsed_font("", regular)
+        self._add_parsed_font("B", bold or regular)
+        return FONT_FAMILY
+
+    def _add_parsed_font(self, style: str, path: str):
+        """add_font с разбором TTF один раз на процесс; первый документ разбирает шрифт обычным add_font."""
+        fontkey = f"{FONT_FAMILY.lower()}{style}"
+        parsed = _PARSED_FONTS.get((path, style))
+        if parsed is None:
+            self.add_font(FONT_FAMILY, style, path)
+            # Цветные шрифты привязаны к документу - их не кешируем
+            if self.fonts[fontkey].color_font is None:
+                _PARSED_FONTS.setdefault((path, style), self.fonts[fontkey])
+            return
+
+        # cmap, glyph_ids и дескриптор после разбора только читаются - общие; остальное свое у документа
+        font = copy.copy(parsed)
+        font.i = len(self.fonts) + 1
+        font.ttfont = ttLib.TTFont(path, recalcTimestamp=False, lazy=True)
+        font.cw = parsed.cw.copy()
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font.subset = SubsetMap(font)
+        self.fonts[fontkey] = font
+
+    def plain(self, value) -> str:
+        """None -> пустая строка; для core-шрифта символы вне latin-1 заменяются, а не роняют вывод."""
+        if value is None:
+            return ""
+        value = str(value)
+        if self.font_name == CORE_FONT_FAMILY:
+            return value.encode("latin-1", "replace").decode("latin-1")
+        return value
+
+    def text_width(self, value: str) -> float:
+        """
+        get_string_width без разбора bidi и markdown, который fpdf2 делает на каждый вызов:
+        в таблицах нет шейпинга, растяжения и межбуквенного интервала, ширину дают метрики шрифта.
+        """
+        return self.current_font.get_text_width(value, self.font_size_pt, None)[1] / self.k
+
+    def fit(self, value, width: float) -> Tuple[str, float]:
+        """Обрезает текст под ширину ячейки с многоточием. Возвращает текст и его ширину."""
+        value = self.plain(value)
+        available = width - 2 * self.c_margin
+        value_width = self.text_width(value)
+        if value_width <= available:
+            return value, value_width
+        # Сначала режем пропорционально ширине, потом добираем по символу
+        ellipsis_width = self.text_width(self._ellipsis)
+        target = available - ellipsis_width
+        value = value[:int(len(value) * target / value_width)]
+        value_width = self.text_width(value)
+        while value and value_width > target:
+            value = value[:-1]
+            value_width = self.text_width(value)
+        return value + self._ellipsis, value_width + ellipsis_width
+
+    def header(self):
+        self.set_font(self.font_name, "B", 9)
+        self.set_text_color(120, 120, 120)
+        self.cell(0, 5, self.plain(self.report_title), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.set_text_color(0, 0, 0)
+        self.ln(2)
+        if self.table_columns:
+            self.table_header()
+
+    def footer(self):
+        self.set_y(-PAGE_MARGIN - 2)
+        self.set_font(self.font_name, "", 8)
+        self.set_text_color(120, 120, 120)
+        self.cell(0, 5, f"Page {self.page_no()}/{{nb}}", align="C")
+        self.set_text_color(0, 0, 0)
+
+    def section(self, title: str):
+        self.table_columns = None
+        # Заголовок раздела не остается последней строкой страницы без таблицы под ним
+        if self.get_y() + 10 + HEADER_ROW_HEIGHT + ROW_HEIGHT > self.page_break_trigger:
+            self.add_page()
+        self.set_font(self.font_name, "B", 13)
+        self.cell(0, 9, self.plain(title), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def line_text(self, value: str, size: int = 10, style: str = ""):
+        self.set_font(self.font_name, style, size)
+        self.cell(0, 6, self.plain(value), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def table_header(self):
+        self.set_font(self.font_name, "B", 8)
+        self.set_fill_color(230, 230, 230)
+        for title, width, align in self.table_columns:
+            self.cell(width, HEADER_ROW_HEIGHT, title, border=1, align=align, fill=True)
+        self.ln()
+        self.set_font(self.font_name, "", 8)
+
+    def table(self, columns: List[Tuple[str, int, str]], rows: Iterable[Tuple],
+              progress: Optional[Callable[[int], None]] = None, progress_every: int = 1000) -> int:
+        """
+        Строки таблицы - кортежи значений в порядке columns. Перед строкой, которая не помещается,
+        начинается новая страница, шапку повторяет header(). Возвращает число строк.
+        """
+        self.table_columns = columns
+        self.table_header()
+        count = 0
+        for row in rows:
+            self.table_row(columns, row)
+            count += 1
+            if progress and count % progress_every == 0:
+                progress(count)
+        self.table_columns = None
+        self.ln(4)
+        return count
+
+    def table_row(self, columns: List[Tuple[str, int, str]], row: Tuple):
+        """
+        Строка из рамок и текста: rect и text fpdf2 в разы дешевле cell, который на каждую ячейку
+        разбирает стили и переносы. Перенос страницы - до строки, как auto page break у cell.
+        """
+        if self.will_page_break(ROW_HEIGHT):
+            self.add_page()
+        x, y = self.l_margin, self.get_y()
+        baseline = y + 0.5 * ROW_HEIGHT + 0.3 * self.font_size
+        for (title, width, align), value in zip(columns, row):
+            value, value_width = self.fit(value, width)
+            self.rect(x, y, width, ROW_HEIGHT)
+            if value:
+                offset = width - self.c_margin - value_width if align == "R" else self.c_margin
+                self.text(x + offset, baseline, value)
+            x += width
+        self.set_y(y + ROW_HEIGHT)
+
+
+def render_report(report_data: Dict, entries: Iterable[Dict], output_path: str,
+                  progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Пишет PDF-отчет: сводка, время по задачам и по дням, детальные записи из entries
+    (словари с ключами detailed_entries; можно передать генератор). Возвращает число записанных записей.
+    """
+    user_name = f"{report_data['user']['first_name']} {report_data['user']['last_name']}"
+    period = f"{report_data['period']['start_date'][:10]} to {report_data['period']['end_date'][:10]}"
+
+    pdf = ReportPDF(f"Time Tracking Report - {user_name}, {period}")
+    pdf.add_page()
+
+    pdf.set_font(pdf.font_name, "B", 16)
+    pdf.cell(0, 10, "Time Tracking Report", align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.line_text(f"User: {user_name}", 11, "B")
+    pdf.line_text(f"Period: {period}", 11, "B")
+    pdf.ln(3)
+
+    pdf.section("Summary")
+    pdf.line_text(f"Total Time: {report_data['summary']['total_duration_formatted']}")
+    pdf.line_text(f"Total Entries: {report_data['summary']['total_entries']}")
+    pdf.line_text(f"Total Tasks: {report_data['summary']['total_tasks']}")
+    pdf.ln(3)
+
+    pdf.section("Time by Task")
+    pdf.table(TASK_TABLE, (
+        (task['task_title'], f"{task['duration_hours']}", f"{task['percentage']}%", f"{task['entry_count']}")
+        for task in report_data['time_by_task']
+    ))
+
+    pdf.section("Time by Day")
+    pdf.table(DAY_TABLE, ((day['date'], f"{day['duration_hours']}") for day in report_data['time_by_day']))
+
+    entry_rows = (
+        (entry['task_title'], _short_time(entry['start_time']), _short_time(entry['end_time']),
+         entry['duration_formatted'], entry['comment'])
+        for entry in entries
+    )
+    first_row = next(entry_rows, None)
+    rows = 0
+    if first_row is not None:
+        pdf.section("Detailed Entries")
+        rows = pdf.table(ENTRY_TABLE, _chain_first(first_row, entry_rows), progress)
+
+    pdf.output(output_path)
+    return rows
+
+
+def _short_time(value: Optional[str]) -> str:
+    """'2025-01-01T09:30:15.123456' -> '2025-01-01 09:30'."""
+    return value[:16].replace("T", " ") if value else ""
+
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
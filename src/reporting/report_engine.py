@@ -0,0 +1,133 @@
+"""
+Однопроходный расчет отчета по времени. Сводка, время по задачам и по дням и детальные записи
+получаются из одного упорядоченного курсора по диапазону time_entries: каждая запись читается один раз,
+итоги копятся в словарях по ходу чтения. Так итоги и детали всегда посчитаны по одному и тому же
+набору строк, а не по дневному агрегату и отдельному запросу деталей.
+"""
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+from ..database.timestamps import to_epoch
+
+# Название задачи - тем же проходом; NULL, если задачи уже нет
+REPORT_ENTRIES_QUERY = """
+SELECT te.id, te.start_time, te.end_time, te.duration_seconds, te.comment, te.task_id, t.title
+FROM time_entries te
+LEFT JOIN tasks t ON te.task_id = t.id
+WHERE te.{start_column} >= ? AND te.{start_column} <= ? AND te.{end_column} IS NOT NULL {user_filter_clause}
+ORDER BY te.{start_column} DESC
+"""
+
+
+class ReportTotals:
+    """
+    Промежуточные итоги отчета: число записей, секунды, задачи {task_id: {'title', 'seconds', 'entries'}}
+    (только задачи с названием) и секунды по дням {YYYY-MM-DD: seconds}. task_ids - все задачи диапазона.
+    """
+
+    def __init__(self):
+        self.entries = 0
+        self.seconds = 0
+        self.task_ids = set()
+        self.tasks: Dict[int, Dict] = {}
+        self.days: Dict[str, int] = {}
+
+    @staticmethod
+    def from_rollup(rollup_rows: List[Dict]) -> 'ReportTotals':
+        """Итоги из строк TimeRollup.aggregate - O(дней), когда детальные записи не нужны."""
+        totals = ReportTotals()
+        for row in rollup_rows:
+            totals.entries += row['entries']
+            totals.seconds += row['seconds']
+            totals.task_ids.add(row['task_id'])
+            totals.days[row['day']] = totals.days.get(row['day'], 0) + row['seconds']
+            if row['title'] is None:
+                continue
+            task = totals.tasks.setdefault(row['task_id'], {'title': row['title'], 'seconds': 0, 'entries': 0})
+            task['seconds'] += row['seconds']
+            task['entries'] += row['entries']
+        return totals
+
+
+class ReportEngine:
+
+    @staticmethod
+    def scan(db, user_id: Optional[int], start_date: str, end_date: str,
+             batch_size: int = 10000) -> Tuple[ReportTotals, List[Dict]]:
+        """
+        Один проход по закрытым записям диапазона (новые первыми). Возвращает итоги и детальные записи
+        с ключами DETAILED_ENTRY_COLUMNS. День записи - дата start_time, как в time_rollup_daily.
+        """
+        if db.timestamp_mode == "epoch":
+            start_column, end_column, range_params = "start_ts", "end_ts", (to_epoch(start_date), to_epoch(end_date))
+        else:
+            start_column, end_column, range_params = "start_time", "end_time", (start_date, end_date)
+
+        query = REPORT_ENTRIES_QUERY.format(
+            start_column=start_column,
+            end_column=end_column,
+            user_filter_clause="" if user_id is None else "AND te.user_id = ?"
+        )
+        params = range_params + ((user_id,) if user_id is not None else ())
+
+        totals = ReportTotals()
+        days = totals.days
+        # task_id -> [секунды, записи, название]; название None - задачи нет, запись идет только в итоги
+        # (как в дневном агрегате), но не в детали (как JOIN в прежнем запросе деталей)
+        task_sums: Dict[int, list] = {}
+        total_seconds = 0
+        # Записи идут по убыванию start_time, так что записи одного дня подряд - сумма дня копится в переменной
+        current_day, day_seconds = None, 0
+        detailed_entries = []
+        # Длительности повторяются, строка "1h 2m 3s" форматируется один раз на значение
+        formatted = {}
+
+        with closing(db.stream_query(query, params, batch_size, tuples=True)) as batches:
+            for rows in batches:
+                for entry_id, start_time, end_time, entry_seconds, comment, task_id, title in rows:
+                    entry_seconds = entry_seconds or 0
+                    total_seconds += entry_seconds
+
+                    day = start_time[:10]
+                    if day != current_day:
+                        if current_day is not None:
+                            days[current_day] = days.get(current_day, 0) + day_seconds
+                        current_day, day_seconds = day, 0
+                    day_seconds += entry_seconds
+
+                    task = task_sums.get(task_id)
+                    if task is None:
+                        task = task_sums[task_id] = [0, 0, title]
+                    task[0] += entry_seconds
+                    task[1] += 1
+                    if task[2] is None:
+                        continue
+
+                    duration_formatted = formatted.get(entry_seconds)
+                    if duration_formatted is None:
+                        hours, remainder = divmod(entry_seconds, 3600)
+                        minutes, seconds = divmod(remainder, 60)
+                        duration_formatted = formatted[entry_seconds] = \
+                            f"{int(hours)}h {int(minutes)}m {int(seconds)}s"
+
+                    detailed_entries.append({
+                        'id': entry_id,
+                        'start_time': start_time,
+                        'end_time': end_time,
+                        'duration_seconds': entry_seconds,
+                        'duration_formatted': duration_formatted,
+                        'comment': comment,
+                        'task_id': task_id,
+                        'task_title': task[2]
+                    })
+
+        if current_day is not None:
+            days[current_day] = days.get(current_day, 0) + day_seconds
+
+        totals.seconds = total_seconds
+        for task_id, (task_seconds, task_entries, title) in task_sums.items():
+            totals.entries += task_entries
+            totals.task_ids.add(task_id)
+            if title is not None:
+                totals.tasks[task_id] = {'title': title, 'seconds': task_seconds, 'entries': task_entries}
+        return totals, detailed_entries
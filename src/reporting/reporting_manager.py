@@ -1,14 +1,54 @@
 import datetime
 import os
-from typing import Dict, List, Optional, Tuple
+from contextlib import closing
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import pandas as pd
-from fpdf import FPDF
+from openpyxl import Workbook
 
+from ..database.rollup import ISO_DAY_SQL, TimeRollup
 from ..database.schema import get_db
+from ..database.timestamps import SECONDS_PER_DAY, epoch_day, to_epoch
+from .pdf_report import render_report
+from .report_engine import ReportEngine, ReportTotals
+
+# Колонки листов Excel-отчета (порядок ключей словарей generate_time_report)
+SUMMARY_COLUMNS = ['User', 'Period Start', 'Period End', 'Total Hours', 'Total Entries', 'Total Tasks']
+TASK_COLUMNS = ['task_id', 'task_title', 'duration_seconds', 'duration_formatted', 'duration_hours',
+                'entry_count', 'percentage']
+DAY_COLUMNS = ['date', 'duration_seconds', 'duration_hours']
+DETAILED_ENTRY_COLUMNS = ['id', 'start_time', 'end_time', 'duration_seconds', 'duration_formatted', 'comment',
+                          'task_id', 'task_title']
+
+# Как часто потоковые выгрузки сообщают о прогрессе (в строках)
+PROGRESS_EVERY = 1000
 
 
 class ReportingManager:
 
+    @staticmethod
+    def _time_range(db, start_date: str, end_date: str) -> Tuple[str, str, tuple]:
+        """Колонки и параметры диапазона time_entries для текущего режима хранения времени."""
+        if db.timestamp_mode == "epoch":
+            return "start_ts", "end_ts", (to_epoch(start_date), to_epoch(end_date))
+        return "start_time", "end_time", (start_date, end_date)
+
+    @staticmethod
+    def _time_group(db, group_by: str, column: str):
+        """SQL группировки по времени и функция, приводящая группу к подписи как у strftime."""
+        if db.timestamp_mode == "epoch":
+            if group_by == "%H":
+                return f"({column} % {SECONDS_PER_DAY}) / 3600", lambda value: f"{value:02d}"
+            if group_by == "%Y-%m-%d":
+                return f"{column} / {SECONDS_PER_DAY}", epoch_day
+            return f"strftime('{group_by}', {column}, 'unixepoch')", lambda value: value
+        # Строки ISO режутся по позициям: strftime перевел бы время со смещением в UTC, а день
+        # записи в агрегате и в отчетах берется по настенным часам
+        if group_by == "%H":
+            return f"substr({column}, 12, 2)", lambda value: value
+        if group_by == "%Y-%m-%d":
+            return ISO_DAY_SQL.format(column=column), lambda value: value
+        return f"strftime('{group_by}', {column})", lambda value: value
+
     @staticmethod
     def get_productivity_analytics(user_id: Optional[int] = None, period: str = 'week') -> Dict:
 
@@ -46,25 +86,40 @@ class ReportingManager:
         user_filter_clause = "" if user_id is None else "AND user_id = ?"
         user_param_tuple = (user_id,) if user_id is not None else ()
 
-        time_query = f"""
-        SELECT 
-            strftime('{group_by}', start_time) as date_group,
-            SUM(duration_seconds) as total_duration
-        FROM time_entries
-        WHERE start_time >= ? AND start_time <= ? AND end_time IS NOT NULL {user_filter_clause}
-        GROUP BY date_group
-        ORDER BY date_group
-        """
-
-        time_results = db.execute_query(time_query, (start_date, end_date) + user_param_tuple)
+        rollup_rows = TimeRollup.aggregate(db, start_date, end_date, user_id)
 
         time_by_date = []
-        for result in time_results:
-            result_dict = dict(result)
+        if group_by == "%H":
+            # Почасовая разбивка внутри одного дня - дневной агрегат тут не помогает
+            start_column, end_column, range_params = ReportingManager._time_range(db, start_date, end_date)
+            group_expression, group_label = ReportingManager._time_group(db, group_by, start_column)
+
+            time_query = f"""
+            SELECT 
+                {group_expression} as date_group,
+                SUM(duration_seconds) as total_duration
+            FROM time_entries
+            WHERE {start_column} >= ? AND {start_column} <= ? AND {end_column} IS NOT NULL {user_filter_clause}
+            GROUP BY date_group
+            ORDER BY date_group
+            """
+
+            time_totals = {
+                group_label(dict(result)['date_group']): dict(result)['total_duration']
+                for result in db.execute_query(time_query, range_params + user_param_tuple)
+            }
+        else:
+            label_length = 7 if group_by == "%Y-%m" else 10
+            time_totals = {}
+            for row in rollup_rows:
+                label = row['day'][:label_length]
+                time_totals[label] = time_totals.get(label, 0) + row['seconds']
+
+        for date in sorted(time_totals):
             time_by_date.append({
-                'date': result_dict['date_group'],
-                'duration_seconds': result_dict['total_duration'],
-                'duration_hours': round(result_dict['total_duration'] / 3600, 2)
+                'date': date,
+                'duration_seconds': time_totals[date],
+                'duration_hours': round(time_totals[date] / 3600, 2)
             })
 
         assigned_to_filter_clause = "" if user_id is None else "AND assigned_to = ?"
@@ -90,29 +145,18 @@ class ReportingManager:
                 'completed_count': result_dict['completed_count']
             })
 
-        category_query = f"""
-        SELECT 
-            t.priority,
-            SUM(te.duration_seconds) as total_duration
-        FROM time_entries te
-        JOIN tasks t ON te.task_id = t.id
-        WHERE te.start_time >= ? AND te.start_time <= ? AND te.end_time IS NOT NULL {user_filter_clause}
-        GROUP BY t.priority
-        ORDER BY total_duration DESC
-        """
-
-        category_results = db.execute_query(category_query, (start_date, end_date) + user_param_tuple)
+        category_totals = {}
+        for row in rollup_rows:
+            if row['priority']:
+                category_totals[row['priority']] = category_totals.get(row['priority'], 0) + row['seconds']
 
         time_by_category = []
-        for result in category_results:
-            result_dict = dict(result)
-            if result_dict['priority']:
-                time_by_category.append({
-                    'category': result_dict['priority'],
-                    'duration_seconds': result_dict['total_duration'],
-                    'duration_hours': round(result_dict['total_duration'] / 3600, 2)
-                })
-
+        for priority, total_duration in sorted(category_totals.items(), key=lambda item: -item[1]):
+            time_by_category.append({
+                'category': priority,
+                'duration_seconds': total_duration,
+                'duration_hours': round(total_duration / 3600, 2)
+            })
 
         completed_tasks = sum(task['completed_count'] for task in tasks_by_date)
         hours_worked = sum(time['duration_hours'] for time in time_by_date)
@@ -174,20 +218,19 @@ class ReportingManager:
         if end_date is None:
             end_date = datetime.datetime.now().isoformat()
 
-        user_filter_clause = "" if user_id is None else "AND user_id = ?"
-        user_param_tuple = (user_id,) if user_id is not None else ()
-
-        summary_query = f"""
-        SELECT 
-            COUNT(DISTINCT te.id) as total_entries,
-            SUM(te.duration_seconds) as total_duration,
-            COUNT(DISTINCT te.task_id) as total_tasks
-        FROM time_entries te
-        WHERE te.start_time >= ? AND te.start_time <= ? AND te.end_time IS NOT NULL {user_filter_clause}
-        """
-
-        summary_result = db.execute_query(summary_query, (start_date, end_date) + user_param_tuple)
-        summary = dict(summary_result[0])
+        if include_details:
+            # Детальные записи все равно читаются целиком - итоги считаются в том же проходе
+            totals, detailed_entries = ReportEngine.scan(db, user_id, start_date, end_date)
+        else:
+            # Без деталей сводка, задачи и дни - из дневного агрегата за O(дней)
+            totals = ReportTotals.from_rollup(TimeRollup.aggregate(db, start_date, end_date, user_id))
+            detailed_entries = []
+
+        summary = {
+            'total_entries': totals.entries,
+            'total_duration': totals.seconds if totals.entries else None,
+            'total_tasks': len(totals.task_ids)
+        }
 
         total_seconds = summary['total_duration'] or 0
         hours, remainder = divmod(total_seconds, 3600)
@@ -195,97 +238,30 @@ class ReportingManager:
         summary['total_duration_formatted'] = f"{int(hours)}h {int(minutes)}m {int(seconds)}s"
         summary['total_hours'] = round(total_seconds / 3600, 2)
 
-        task_query = f"""
-        SELECT 
-            t.id,
-            t.title,
-            SUM(te.duration_seconds) as task_duration,
-            COUNT(te.id) as entry_count
-        FROM time_entries te
-        JOIN tasks t ON te.task_id = t.id
-        WHERE te.start_time >= ? AND te.start_time <= ? AND te.end_time IS NOT NULL {user_filter_clause}
-        GROUP BY t.id
-        ORDER BY task_duration DESC
-        """
-
-        task_results = db.execute_query(task_query, (start_date, end_date) + user_param_tuple)
-
         time_by_task = []
-        for result in task_results:
-            task_dict = dict(result)
-            task_seconds = task_dict['task_duration']
+        for task_id, task in sorted(totals.tasks.items(), key=lambda item: -item[1]['seconds']):
+            task_seconds = task['seconds']
             hours, remainder = divmod(task_seconds, 3600)
             minutes, seconds = divmod(remainder, 60)
 
             time_by_task.append({
-                'task_id': task_dict['id'],
-                'task_title': task_dict['title'],
+                'task_id': task_id,
+                'task_title': task['title'],
                 'duration_seconds': task_seconds,
                 'duration_formatted': f"{int(hours)}h {int(minutes)}m {int(seconds)}s",
                 'duration_hours': round(task_seconds / 3600, 2),
-                'entry_count': task_dict['entry_count'],
+                'entry_count': task['entries'],
                 'percentage': round((task_seconds / total_seconds * 100) if total_seconds > 0 else 0, 1)
             })
 
-        day_query = f"""
-        SELECT 
-            strftime('%Y-%m-%d', start_time) as day,
-            SUM(duration_seconds) as day_duration
-        FROM time_entries
-        WHERE start_time >= ? AND start_time <= ? AND end_time IS NOT NULL {user_filter_clause}
-        GROUP BY day
-        ORDER BY day
-        """
-
-        day_results = db.execute_query(day_query, (start_date, end_date) + user_param_tuple)
-
         time_by_day = []
-        for result in day_results:
-            day_dict = dict(result)
-            day_seconds = day_dict['day_duration']
-
+        for day in sorted(totals.days):
             time_by_day.append({
-                'date': day_dict['day'],
-                'duration_seconds': day_seconds,
-                'duration_hours': round(day_seconds / 3600, 2)
+                'date': day,
+                'duration_seconds': totals.days[day],
+                'duration_hours': round(totals.days[day] / 3600, 2)
             })
 
-        detailed_entries = []
-        if include_details:
-            entries_query = f"""
-            SELECT 
-                te.id,
-                te.start_time,
-                te.end_time,
-                te.duration_seconds,
-                te.comment,
-                t.id as task_id,
-                t.title as task_title
-            FROM time_entries te
-            JOIN tasks t ON te.task_id = t.id
-            WHERE te.start_time >= ? AND te.start_time <= ? AND te.end_time IS NOT NULL {user_filter_clause}
-            ORDER BY te.start_time DESC
-            """
-
-            entries_results = db.execute_query(entries_query, (start_date, end_date) + user_param_tuple)
-
-            for result in entries_results:
-                entry_dict = dict(result)
-                entry_seconds = entry_dict['duration_seconds']
-                hours, remainder = divmod(entry_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-
-                detailed_entries.append({
-                    'id': entry_dict['id'],
-                    'start_time': entry_dict['start_time'],
-                    'end_time': entry_dict['end_time'],
-                    'duration_seconds': entry_seconds,
-                    'duration_formatted': f"{int(hours)}h {int(minutes)}m {int(seconds)}s",
-                    'comment': entry_dict['comment'],
-                    'task_id': entry_dict['task_id'],
-                    'task_title': entry_dict['task_title']
-                })
-
         return {
             'user': user_info,
             'period': {
@@ -298,18 +274,126 @@ class ReportingManager:
             'detailed_entries': detailed_entries
         }
 
+    @staticmethod
+    def _detailed_entries_query(db, user_id: Optional[int], start_date: str, end_date: str) -> Tuple[str, tuple]:
+        user_filter_clause = "" if user_id is None else "AND te.user_id = ?"
+        user_param_tuple = (user_id,) if user_id is not None else ()
+        start_column, end_column, range_params = ReportingManager._time_range(db, start_date, end_date)
+
+        query = f"""
+        SELECT 
+            te.id,
+            te.start_time,
+            te.end_time,
+            te.duration_seconds,
+            te.comment,
+            t.id as task_id,
+            t.title as task_title
+        FROM time_entries te
+        JOIN tasks t ON te.task_id = t.id
+        WHERE te.{start_column} >= ? AND te.{start_column} <= ? AND te.{end_column} IS NOT NULL {user_filter_clause}
+        ORDER BY te.{start_column} DESC
+        """
+        return query, range_params + user_param_tuple
+
+    @staticmethod
+    def iter_detailed_entries(db, user_id: Optional[int], start_date: str, end_date: str,
+                              batch_size: int = 1000) -> Iterator[tuple]:
+        """
+        Детальные записи отчета кортежами в порядке колонок DETAILED_ENTRY_COLUMNS.
+        Читаются пачками по batch_size через db.stream_query - в памяти одновременно не больше одной пачки.
+        """
+        query, params = ReportingManager._detailed_entries_query(db, user_id, start_date, end_date)
+
+        with closing(db.stream_query(query, params, batch_size)) as batches:
+            for rows in batches:
+                for entry_id, start_time, end_time, entry_seconds, comment, task_id, task_title in rows:
+                    hours, remainder = divmod(entry_seconds, 3600)
+                    minutes, seconds = divmod(remainder, 60)
+                    yield (entry_id, start_time, end_time, entry_seconds,
+                           f"{int(hours)}h {int(minutes)}m {int(seconds)}s", comment, task_id, task_title)
+
+    @staticmethod
+    def export_report_streaming(user_id: Optional[int], start_date: str, end_date: str, output_path: str,
+                                include_details: bool = True,
+                                progress: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Excel-отчет с теми же листами, что и export_report_to_csv, но без детальных записей в памяти:
+        сводка, задачи и дни берутся из generate_time_report без деталей (O(дней)), а детальные записи
+        пишутся построчно из курсора БД в write-only книгу openpyxl, которая сразу сбрасывает строки на диск.
+        Пик памяти не зависит от числа записей. Возвращает число записанных детальных записей, -1 при ошибке.
+        progress(rows) вызывается каждые PROGRESS_EVERY записанных записей; исключение из него прерывает выгрузку.
+        """
+        report_data = ReportingManager.generate_time_report(user_id, start_date, end_date, include_details=False)
+        if 'error' in report_data:
+            print(f"Error exporting report: {report_data['error']}")
+            return -1
+
+        workbook = Workbook(write_only=True)
+        saved = False
+        rows = 0
+        try:
+            summary_sheet = workbook.create_sheet('Summary')
+            summary_sheet.append(SUMMARY_COLUMNS)
+            summary_sheet.append(ReportingManager._summary_row(report_data))
+
+            task_sheet = workbook.create_sheet('Time by Task')
+            task_sheet.append(TASK_COLUMNS)
+            for task in report_data['time_by_task']:
+                task_sheet.append([task[column] for column in TASK_COLUMNS])
+
+            day_sheet = workbook.create_sheet('Time by Day')
+            day_sheet.append(DAY_COLUMNS)
+            for day in report_data['time_by_day']:
+                day_sheet.append([day[column] for column in DAY_COLUMNS])
+
+            if include_details:
+                entries_sheet = None
+                with closing(ReportingManager.iter_detailed_entries(get_db(), user_id, start_date, end_date)) as entries:
+                    for entry in entries:
+                        # Лист создается только если есть записи - как в export_report_to_csv
+                        if entries_sheet is None:
+                            entries_sheet = workbook.create_sheet('Detailed Entries')
+                            entries_sheet.append(DETAILED_ENTRY_COLUMNS)
+                        entries_sheet.append(entry)
+                        rows += 1
+                        if progress and rows % PROGRESS_EVERY == 0:
+                            progress(rows)
+
+            workbook.save(output_path)
+            saved = True
+            return rows
+        except Exception as e:
+            print(f"Error exporting report to Excel: {e}")
+            return -1
+        finally:
+            if not saved:
+                # Листы write-only книги пишутся во временные файлы, которые удаляет только save():
+                # прерванная выгрузка (ошибка, отмена из progress) дописывает книгу и удаляет недописанный файл
+                try:
+                    workbook.save(output_path)
+                except Exception as e:
+                    print(f"Error closing Excel report: {e}")
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            workbook.close()
+
+    @staticmethod
+    def _summary_row(report_data: Dict) -> List:
+        return [
+            f"{report_data['user']['first_name']} {report_data['user']['last_name']}",
+            report_data['period']['start_date'],
+            report_data['period']['end_date'],
+            report_data['summary']['total_hours'],
+            report_data['summary']['total_entries'],
+            report_data['summary']['total_tasks']
+        ]
+
     @staticmethod
     def export_report_to_csv(report_data: Dict, output_path: str) -> bool:
         """Export a time tracking report to CSV format."""
         try:
-            summary_df = pd.DataFrame([{
-                'User': f"{report_data['user']['first_name']} {report_data['user']['last_name']}",
-                'Period Start': report_data['period']['start_date'],
-                'Period End': report_data['period']['end_date'],
-                'Total Hours': report_data['summary']['total_hours'],
-                'Total Entries': report_data['summary']['total_entries'],
-                'Total Tasks': report_data['summary']['total_tasks']
-            }])
+            summary_df = pd.DataFrame([ReportingManager._summary_row(report_data)], columns=SUMMARY_COLUMNS)
 
             task_df = pd.DataFrame(report_data['time_by_task'])
 
@@ -331,92 +415,33 @@ class ReportingManager:
 
     @staticmethod
     def export_report_to_pdf(report_data: Dict, output_path: str) -> bool:
-        """
-
-        НЕ РАБОЧЕЕ
-        """
+        """PDF-отчет по уже собранному report_data (с detailed_entries, если они есть)."""
         try:
-            pdf = FPDF()
-            pdf.add_page()
-
-            pdf.set_font("Arial", "B", 16)
-
-            pdf.cell(0, 10, "Time Tracking Report", 0, 1, "C")
-            pdf.ln(5)
-
-            pdf.set_font("Arial", "B", 12)
-            user_name = f"{report_data['user']['first_name']} {report_data['user']['last_name']}"
-            pdf.cell(0, 10, f"User: {user_name}", 0, 1)
-            pdf.cell(0, 10, f"Period: {report_data['period']['start_date']} to {report_data['period']['end_date']}", 0,
-                     1)
-            pdf.ln(5)
-
-
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(0, 10, "Summary", 0, 1)
-            pdf.set_font("Arial", "", 12)
-            pdf.cell(0, 10, f"Total Time: {report_data['summary']['total_duration_formatted']}", 0, 1)
-            pdf.cell(0, 10, f"Total Entries: {report_data['summary']['total_entries']}", 0, 1)
-            pdf.cell(0, 10, f"Total Tasks: {report_data['summary']['total_tasks']}", 0, 1)
-            pdf.ln(5)
-
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(0, 10, "Time by Task", 0, 1)
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(100, 10, "Task", 1)
-            pdf.cell(30, 10, "Hours", 1)
-            pdf.cell(30, 10, "Percentage", 1)
-            pdf.cell(30, 10, "Entries", 1)
-            pdf.ln()
-
-            pdf.set_font("Arial", "", 10)
-            for task in report_data['time_by_task']:
-                pdf.cell(100, 10, task['task_title'][:40], 1)
-                pdf.cell(30, 10, f"{task['duration_hours']}", 1)
-                pdf.cell(30, 10, f"{task['percentage']}%", 1)
-                pdf.cell(30, 10, f"{task['entry_count']}", 1)
-                pdf.ln()
-
-            pdf.ln(5)
-
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(0, 10, "Time by Day", 0, 1)
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(60, 10, "Date", 1)
-            pdf.cell(30, 10, "Hours", 1)
-            pdf.ln()
-
-            pdf.set_font("Arial", "", 10)
-            for day in report_data['time_by_day']:
-                pdf.cell(60, 10, day['date'], 1)
-                pdf.cell(30, 10, f"{day['duration_hours']}", 1)
-                pdf.ln()
-
-            pdf.ln(5)
-
-            if report_data['detailed_entries']:
-                pdf.set_font("Arial", "B", 14)
-                pdf.cell(0, 10, "Detailed Entries", 0, 1)
-                pdf.set_font("Arial", "B", 8)
-                pdf.cell(50, 10, "Task", 1)
-                pdf.cell(30, 10, "Start Time", 1)
-                pdf.cell(30, 10, "End Time", 1)
-                pdf.cell(20, 10, "Duration", 1)
-                pdf.cell(60, 10, "Comment", 1)
-                pdf.ln()
-
-                pdf.set_font("Arial", "", 8)
-                for entry in report_data['detailed_entries']:
-                    pdf.cell(50, 10, entry['task_title'][:25], 1)
-                    pdf.cell(30, 10, entry['start_time'], 1)
-                    pdf.cell(30, 10, entry['end_time'], 1)
-                    pdf.cell(20, 10, entry['duration_formatted'], 1)
-                    pdf.cell(60, 10, entry['comment'][:30], 1)
-                    pdf.ln()
-
-            pdf.output(output_path)
+            render_report(report_data, report_data['detailed_entries'], output_path)
             return True
         except Exception as e:
             print(f"Error exporting report to PDF: {e}")
             return False
 
+    @staticmethod
+    def export_report_pdf_streaming(user_id: Optional[int], start_date: str, end_date: str, output_path: str,
+                                    include_details: bool = True,
+                                    progress: Optional[Callable[[int], None]] = None) -> int:
+        """
+        PDF-отчет без детальных записей в памяти: они рендерятся по мере чтения из курсора.
+        Возвращает и progress - как в export_report_streaming.
+        """
+        report_data = ReportingManager.generate_time_report(user_id, start_date, end_date, include_details=False)
+        if 'error' in report_data:
+            print(f"Error exporting report: {report_data['error']}")
+            return -1
+
+        try:
+            if not include_details:
+                return render_report(report_data, (), output_path)
+            with closing(ReportingManager.iter_detailed_entries(get_db(), user_id, start_date, end_date)) as entries:
+                return render_report(report_data, (dict(zip(DETAILED_ENTRY_COLUMNS, entry)) for entry in entries),
+                                     output_path, progress)
+        except Exception as e:
+            print(f"Error exporting report to PDF: {e}")
+            return -1
@@ -0,0 +1,219 @@
+"""
+Выгрузка отчетов и сырых time_entries в CSV (опционально gzip) и Parquet через pyarrow.
+Строки читаются курсором пачками и сразу раскладываются по колонкам в RecordBatch,
+длительность форматируется векторно (pyarrow.compute) - словарей на строку нет,
+в памяти одновременно не больше одной пачки.
+"""
+from contextlib import closing
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from ..database.schema import get_db
+from .reporting_manager import ReportingManager
+
+# Формат -> расширение файла
+EXPORT_FORMATS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "parquet": ".parquet"
+}
+
+SUMMARY_SCHEMA = pa.schema([
+    ("user", pa.string()),
+    ("period_start", pa.string()),
+    ("period_end", pa.string()),
+    ("total_seconds", pa.int64()),
+    ("total_hours", pa.float64()),
+    ("total_entries", pa.int64()),
+    ("total_tasks", pa.int64())
+])
+
+TASK_SCHEMA = pa.schema([
+    ("task_id", pa.int64()),
+    ("task_title", pa.string()),
+    ("duration_seconds", pa.int64()),
+    ("duration_formatted", pa.string()),
+    ("duration_hours", pa.float64()),
+    ("entry_count", pa.int64()),
+    ("percentage", pa.float64())
+])
+
+DAY_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("duration_seconds", pa.int64()),
+    ("duration_hours", pa.float64())
+])
+
+# Колонки как у detailed_entries в generate_time_report; duration_formatted вычисляется из duration_seconds
+DETAILED_ENTRY_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("start_time", pa.string()),
+    ("end_time", pa.string()),
+    ("duration_seconds", pa.int64()),
+    ("duration_formatted", pa.string()),
+    ("comment", pa.string()),
+    ("task_id", pa.int64()),
+    ("task_title", pa.string())
+])
+
+TIME_ENTRY_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("task_id", pa.int64()),
+    ("start_time", pa.string()),
+    ("end_time", pa.string()),
+    ("duration_seconds", pa.int64()),
+    ("comment", pa.string()),
+    ("created_at", pa.string())
+])
+
+TIME_ENTRIES_QUERY = """
+SELECT id, user_id, task_id, start_time, end_time, duration_seconds, comment, created_at
+FROM time_entries
+WHERE {start_column} >= ? AND {start_column} <= ? AND {end_column} IS NOT NULL {user_filter_clause}
+ORDER BY {start_column}
+"""
+
+
+def format_durations(seconds: pa.Array) -> pa.Array:
+    """'1h 2m 5s' для колонки секунд - то же, что f"{h}h {m}m {s}s" построчно."""
+    hours = pc.divide(seconds, 3600)
+    minutes = pc.divide(pc.subtract(seconds, pc.multiply(hours, 3600)), 60)
+    rest = pc.subtract(seconds, pc.add(pc.multiply(hours, 3600), pc.multiply(minutes, 60)))
+    parts = [pc.cast(part, pa.string()) for part in (hours, minutes, rest)]
+    return pc.binary_join_element_wise(parts[0], "h ", parts[1], "m ", parts[2], "s", "")
+
+
+class TableExporter:
+
+    @staticmethod
+    def export_report(user_id: Optional[int], start_date: str, end_date: str, output_prefix: str,
+                      export_format: str = "csv", include_details: bool = True,
+                      progress: Optional[Callable[[int], None]] = None) -> Tuple[Dict[str, str], int]:
+        """
+        Отчет generate_time_report файлами по разделам: {output_prefix}_summary, _by_task, _by_day
+        и _entries (если include_details). Возвращает ({раздел: путь}, число детальных записей);
+        пустой словарь - ошибка. progress(rows) вызывается после каждой пачки детальных записей;
+        исключение из него прерывает выгрузку.
+        """
+        if export_format not in EXPORT_FORMATS:
+            print(f"Unsupported export format: {export_format}")
+            return {}, -1
+
+        report_data = ReportingManager.generate_time_report(user_id, start_date, end_date, include_details=False)
+        if 'error' in report_data:
+            print(f"Error exporting report: {report_data['error']}")
+            return {}, -1
+
+        extension = EXPORT_FORMATS[export_format]
+        paths = {section: f"{output_prefix}_{section}{extension}" for section in ("summary", "by_task", "by_day")}
+
+        try:
+            summary_table = pa.table({
+                "user": [f"{report_data['user']['first_name']} {report_data['user']['last_name']}"],
+                "period_start": [report_data['period']['start_date']],
+                "period_end": [report_data['period']['end_date']],
+                "total_seconds": [report_data['summary']['total_duration'] or 0],
+                "total_hours": [report_data['summary']['total_hours']],
+                "total_entries": [report_data['summary']['total_entries']],
+                "total_tasks": [report_data['summary']['total_tasks']]
+            }, schema=SUMMARY_SCHEMA)
+            TableExporter._write_batches(paths["summary"], export_format, SUMMARY_SCHEMA, summary_table.to_batches())
+
+            for section, schema, rows in (("by_task", TASK_SCHEMA, report_data['time_by_task']),
+                                          ("by_day", DAY_SCHEMA, report_data['time_by_day'])):
+                table = pa.table({name: [row[name] for row in rows] for name in schema.names}, schema=schema)
+                TableExporter._write_batches(paths[section], export_format, schema, table.to_batches())
+
+            rows = 0
+            if include_details:
+                paths["entries"] = f"{output_prefix}_entries{extension}"
+                db = get_db()
+                query, params = ReportingManager._detailed_entries_query(db, user_id, start_date, end_date)
+                with closing(TableExporter._iter_record_batches(db, query, params, DETAILED_ENTRY_SCHEMA)) as batches:
+                    rows = TableExporter._write_batches(
+                        paths["entries"], export_format, DETAILED_ENTRY_SCHEMA, batches, progress
+                    )
+
+            return paths, rows
+        except Exception as e:
+            print(f"Error exporting report to {export_format}: {e}")
+            return {}, -1
+
+    @staticmethod
+    def export_time_entries(output_path: str, export_format: str = "csv", user_id: Optional[int] = None,
+                            start_date: Optional[str] = None, end_date: Optional[str] = None,
+                            batch_size: int = 10000, progress: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Сырые завершенные записи time_entries одной таблицей (все пользователи, если user_id не задан).
+        Возвращает число выгруженных строк, -1 при ошибке. progress - как в export_report.
+        """
+        if export_format not in EXPORT_FORMATS:
+            print(f"Unsupported export format: {export_format}")
+            return -1
+
+        db = get_db()
+        start_column, end_column, range_params = ReportingManager._time_range(
+            db, start_date or "1970-01-01T00:00:00", end_date or "9999-12-31T23:59:59"
+        )
+        query = TIME_ENTRIES_QUERY.format(
+            start_column=start_column,
+            end_column=end_column,
+            user_filter_clause="" if user_id is None else "AND user_id = ?"
+        )
+        params = range_params + ((user_id,) if user_id is not None else ())
+
+        try:
+            with closing(TableExporter._iter_record_batches(db, query, params, TIME_ENTRY_SCHEMA, batch_size)) as batches:
+                return TableExporter._write_batches(output_path, export_format, TIME_ENTRY_SCHEMA, batches, progress)
+        except Exception as e:
+            print(f"Error exporting time entries to {export_format}: {e}")
+            return -1
+
+    @staticmethod
+    def _iter_record_batches(db, query: str, params: tuple, schema: pa.Schema,
+                             batch_size: int = 10000) -> Iterator[pa.RecordBatch]:
+        """
+        Результат запроса пачками RecordBatch. Колонки запроса идут в порядке schema;
+        колонка duration_formatted, если есть в schema, в запросе отсутствует и вычисляется.
+        """
+        formatted_index = schema.get_field_index("duration_formatted")
+        query_fields = [field for field in schema if field.name != "duration_formatted"]
+
+        with closing(db.stream_query(query, params, batch_size)) as row_batches:
+            for rows in row_batches:
+                columns: List[pa.Array] = [
+                    pa.array(values, type=field.type) for field, values in zip(query_fields, zip(*rows))
+                ]
+                if formatted_index >= 0:
+                    seconds = columns[schema.get_field_index("duration_seconds")]
+                    columns.insert(formatted_index, format_durations(seconds))
+                yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+    @staticmethod
+    def _write_batches(output_path: str, export_format: str, schema: pa.Schema,
+                       batches: Iterable[pa.RecordBatch], progress: Optional[Callable[[int], None]] = None) -> int:
+        """Пишет пачки в файл формата export_format, возвращает число строк."""
+        if export_format == "parquet":
+            writer = pq.ParquetWriter(output_path, schema, compression="zstd")
+            sink = None
+        else:
+            sink = pa.CompressedOutputStream(output_path, "gzip") if export_format == "csv.gz" else pa.OSFile(output_path, "wb")
+            writer = pa_csv.CSVWriter(sink, schema)
+
+        rows = 0
+        try:
+            for batch in batches:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                if progress:
+                    progress(rows)
+        finally:
+            writer.close()
+            if sink is not None:
+                sink.close()
+        return rows
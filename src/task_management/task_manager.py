@@ -2,6 +2,13 @@ import datetime
 from typing import Dict, List, Optional, Tuple
 
 from ..database.schema import get_db
+from ..database.pagination import decode_cursor, encode_cursor, keyset_condition, split_page
+from ..database.task_search import (TASK_SEARCH_RANK, TASK_SEARCH_RANK_CANDIDATES, match_query, ranked_search,
+                                    task_search_available)
+from ..events import NOTIFICATION_CREATED, TASK_CREATED, get_event_bus
+
+TASK_STATUSES = ("not_started", "in_progress", "paused", "completed", "cancelled")
+TASK_PRIORITIES = ("low", "medium", "high", "urgent")
 
 
 class TaskManager:
@@ -39,29 +46,36 @@ class TaskManager:
                 if not assigned_user:
                     return False, "Assigned user not found", None
 
-            # Вставляем новый таск
-            task_id = db.execute_insert(
-                """
-                INSERT INTO tasks (title, description, status, priority, created_by, assigned_to, 
-                                  created_at, deadline, estimated_hours)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (title, description, status, priority, created_by, assigned_to,
-                 datetime.datetime.now().isoformat(), deadline, estimated_hours)
-            )
-
-            #  Создаем уведомление для назначенного пользователя, если это применимо
-            if assigned_to and assigned_to != created_by:
-                db.execute_insert(
+            # Таск и уведомление коммитятся одной транзакцией
+            with db.transaction():
+                # Вставляем новый таск
+                task_id = db.execute_insert(
                     """
-                    INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    INSERT INTO tasks (title, description, status, priority, created_by, assigned_to, 
+                                      created_at, deadline, estimated_hours)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
-                    (assigned_to, "New Task Assigned",
-                     f"You have been assigned a new task: {title}",
-                     "task", task_id, datetime.datetime.now().isoformat())
+                    (title, description, status, priority, created_by, assigned_to,
+                     datetime.datetime.now().isoformat(), deadline, estimated_hours)
                 )
 
+                #  Создаем уведомление для назначенного пользователя, если это применимо
+                if assigned_to and assigned_to != created_by:
+                    db.execute_insert(
+                        """
+                        INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        (assigned_to, "New Task Assigned",
+                         f"You have been assigned a new task: {title}",
+                         "task", task_id, datetime.datetime.now().isoformat())
+                    )
+
+            bus = get_event_bus()
+            bus.publish(TASK_CREATED, (created_by, assigned_to), {"task_id": task_id, "created_by": created_by})
+            if assigned_to and assigned_to != created_by:
+                bus.publish(NOTIFICATION_CREATED, (assigned_to,), {"type": "task", "related_id": task_id})
+
             return True, "Task created successfully", task_id
         except Exception as e:
             return False, f"Task creation failed: {str(e)}", None
@@ -98,59 +112,67 @@ class TaskManager:
             if "priority" in updates and updates["priority"] not in ["low", "medium", "high", "urgent"]:
                 return False, "Invalid task priority"
 
-            # Создаем запрос на обновку
-            update_fields = []
-            params = []
+            notified_user = None
 
-            for field, value in updates.items():
-                if field in ["title", "description", "status", "priority", "deadline", "estimated_hours"]:
-                    update_fields.append(f"{field} = ?")
-                    params.append(value)
+            # Уведомление и обновка таска коммитятся одной транзакцией
+            with db.transaction():
+                # Создаем запрос на обновку
+                update_fields = []
+                params = []
 
-            if "assigned_to" in updates:
-                if updates["assigned_to"]:
-                    assigned_user = db.execute_query(
-                        "SELECT id FROM users WHERE id = ?",
-                        (updates["assigned_to"],)
-                    )
+                for field, value in updates.items():
+                    if field in ["title", "description", "status", "priority", "deadline", "estimated_hours"]:
+                        update_fields.append(f"{field} = ?")
+                        params.append(value)
 
-                    if not assigned_user:
-                        return False, "Assigned user not found"
+                if "assigned_to" in updates:
+                    if updates["assigned_to"]:
+                        assigned_user = db.execute_query(
+                            "SELECT id FROM users WHERE id = ?",
+                            (updates["assigned_to"],)
+                        )
 
-                    update_fields.append("assigned_to = ?")
-                    params.append(updates["assigned_to"])
+                        if not assigned_user:
+                            return False, "Assigned user not found"
 
+                        update_fields.append("assigned_to = ?")
+                        params.append(updates["assigned_to"])
 
-                    if updates["assigned_to"] != task_data["assigned_to"] and updates["assigned_to"] != user_id:
-                        task_title = db.execute_query(
-                            "SELECT title FROM tasks WHERE id = ?",
-                            (task_id,)
-                        )[0]["title"]
 
-                        db.execute_insert(
-                            """
-                            INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                            """,
-                            (updates["assigned_to"], "Task Assigned",
-                             f"You have been assigned to task: {task_title}",
-                             "task", task_id, datetime.datetime.now().isoformat())
-                        )
+                        if updates["assigned_to"] != task_data["assigned_to"] and updates["assigned_to"] != user_id:
+                            task_title = db.execute_query(
+                                "SELECT title FROM tasks WHERE id = ?",
+                                (task_id,)
+                            )[0]["title"]
 
-            if "status" in updates and updates["status"] == "completed":
-                update_fields.append("completed_at = ?")
-                params.append(datetime.datetime.now().isoformat())
+                            db.execute_insert(
+                                """
+                                INSERT INTO notifications (user_id, title, message, type, related_id, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                                """,
+                                (updates["assigned_to"], "Task Assigned",
+                                 f"You have been assigned to task: {task_title}",
+                                 "task", task_id, datetime.datetime.now().isoformat())
+                            )
+                            notified_user = updates["assigned_to"]
 
-            if not update_fields:
-                return False, "No valid fields to update"
+                if "status" in updates and updates["status"] == "completed":
+                    update_fields.append("completed_at = ?")
+                    params.append(datetime.datetime.now().isoformat())
 
-            # Делаем апдейт
-            params.append(task_id)
+                if not update_fields:
+                    return False, "No valid fields to update"
 
-            db.execute_update(
-                f"UPDATE tasks SET {", ".join(update_fields)} WHERE id = ?",
-                tuple(params)
-            )
+                # Делаем апдейт
+                params.append(task_id)
+
+                db.execute_update(
+                    f"UPDATE tasks SET {", ".join(update_fields)} WHERE id = ?",
+                    tuple(params)
+                )
+
+            if notified_user:
+                get_event_bus().publish(NOTIFICATION_CREATED, (notified_user,), {"type": "task", "related_id": task_id})
 
             return True, "Task updated successfully"
         except Exception as e:
@@ -236,37 +258,87 @@ class TaskManager:
     @staticmethod
     def get_tasks(user_id: Optional[int] = None, status: Optional[str] = None,
                   priority: Optional[str] = None, role: str = "all", search: Optional[str] = None,
-                  limit: Optional[int] = None) -> List[Dict]:
-        """Получаем таски"""
+                  limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict]:
+        """
+        Получаем таски, новые сначала; cursor - продолжение после последнего таска предыдущей страницы.
+        С search (и FTS5 индексом) - полнотекстовый поиск по префиксам слов: одно слово - новые совпадения
+        сначала, несколько слов - лучшие из TASK_SEARCH_RANK_CANDIDATES новейших совпадений сначала.
+        """
         db = get_db()
 
         try:
-            query = """
-            SELECT t.*, 
-                   u_creator.username AS creator_username,
-                   u_assignee.username AS assignee_username
-            FROM tasks t
-            LEFT JOIN users u_creator ON t.created_by = u_creator.id
-            LEFT JOIN users u_assignee ON t.assigned_to = u_assignee.id
-            """
+            match = match_query(search) if search and task_search_available(db) else None
+
+            conditions = []
             params = []
 
+            if match:
+                conditions.append("tasks_fts MATCH ?")
+                params.append(match)
+
             if user_id is not None:
-                query += " WHERE t.created_by = ? OR t.assigned_to = ?"
+                conditions.append("(t.created_by = ? OR t.assigned_to = ?)")
                 params.extend([user_id, user_id])
 
             if status:
-                query += " AND t.status = ?"
+                conditions.append("t.status = ?")
                 params.append(status)
 
             if priority:
-                query += " AND t.priority = ?"
+                conditions.append("t.priority = ?")
                 params.append(priority)
 
-            if search:
-                query += " AND (t.title LIKE ? OR t.description LIKE ?)"
+            if search and not match:
+                conditions.append("(t.title LIKE ? OR t.description LIKE ?)")
                 params.extend([f"%{search}%", f"%{search}%"])
 
+            if match and ranked_search(search):
+                # Кандидаты - новейшие совпадения с фильтрами, bm25 считается только для них;
+                # ключ курсора - (search_rank, id) по целому рангу
+                where = " AND ".join(conditions)
+                source = f"""
+                (SELECT t.*, {TASK_SEARCH_RANK} AS search_rank
+                 FROM tasks_fts
+                 JOIN tasks t ON t.id = tasks_fts.rowid
+                 WHERE {where}
+                 ORDER BY tasks_fts.rowid DESC LIMIT {TASK_SEARCH_RANK_CANDIDATES}) t
+                """
+                rank_column = ""
+                conditions = []
+                sort_columns, descending = ("t.search_rank", "t.id"), False
+            elif match:
+                # Без ранжирования FTS5 отдает совпадения по убыванию rowid и останавливается на LIMIT;
+                # search_rank None - ключ курсора только id
+                source = "tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid"
+                rank_column = ", NULL AS search_rank"
+                sort_columns, descending = ("tasks_fts.rowid",), True
+            else:
+                source = "tasks t"
+                rank_column = ""
+                sort_columns, descending = ("t.created_at", "t.id"), True
+
+            query = f"""
+            SELECT t.*, 
+                   u_creator.username AS creator_username,
+                   u_assignee.username AS assignee_username{rank_column}
+            FROM {source}
+            LEFT JOIN users u_creator ON t.created_by = u_creator.id
+            LEFT JOIN users u_assignee ON t.assigned_to = u_assignee.id
+            """
+
+            if cursor:
+                condition, condition_params = keyset_condition(
+                    sort_columns, decode_cursor(cursor, len(sort_columns)), descending
+                )
+                conditions.append(condition)
+                params.extend(condition_params)
+
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+
+            direction = "DESC" if descending else "ASC"
+            query += " ORDER BY " + ", ".join(f"{column} {direction}" for column in sort_columns)
+
             if limit is not None:
                 query += " LIMIT ?"
                 params.append(limit)
@@ -280,40 +352,54 @@ class TaskManager:
             db.close()
 
     @staticmethod
-    def get_task_statistics(user_id: Optional[int] = None) -> Dict:
+    def get_tasks_page(user_id: Optional[int] = None, status: Optional[str] = None,
+                       priority: Optional[str] = None, role: str = "all", search: Optional[str] = None,
+                       limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Страница тасков и курсор следующей страницы (None - дальше пусто)"""
+        tasks = TaskManager.get_tasks(user_id, status, priority, role, search, limit + 1, cursor)
+
+        def cursor_of(task):
+            if "search_rank" in task:
+                if task["search_rank"] is None:
+                    return encode_cursor(task["id"])
+                return encode_cursor(task["search_rank"], task["id"])
+            return encode_cursor(task["created_at"], task["id"])
+
+        return split_page(tasks, limit, cursor_of)
+
+    @staticmethod
+    def get_task_statistics(user_id: Optional[int] = None, db=None) -> Dict:
         """
         Получаем статистику по таскам для пользователя или всех пользователей, если user_id равен None.
         Возвращает словарь с количеством тасков, степенью их выполнения и предстоящими сроками.
+        Счетчики по статусам и приоритетам - один проход по таскам, дедлайны - второй запрос.
+        db - уже полученное соединение (вызывающий закрывает его сам).
         """
-        db = get_db()
+        owns_connection = db is None
+        db = db or get_db()
 
         try:
-            user_filter = "WHERE created_by = ? OR assigned_to = ?" if user_id is not None else ""
+            # Скобки обязательны: к фильтру дописываются условия на дедлайн через AND
+            user_filter = "WHERE (created_by = ? OR assigned_to = ?)" if user_id is not None else ""
             user_param = (user_id, user_id) if user_id is not None else ()
 
-            # Получаем таски по статусу
-            status_counts = db.execute_query(
+            status_columns = ", ".join(
+                f"COALESCE(SUM(status = '{status}'), 0) as status_{status}" for status in TASK_STATUSES
+            )
+            priority_columns = ", ".join(
+                f"COALESCE(SUM(priority = '{priority}'), 0) as priority_{priority}" for priority in TASK_PRIORITIES
+            )
+            counts = dict(db.execute_query(
                 f"""
-                SELECT status, COUNT(*) as count
+                SELECT {status_columns}, {priority_columns}
                 FROM tasks
                 {user_filter}
-                GROUP BY status
                 """,
                 user_param
-            )
-
-            # Стутусы словарик
-            status_counts_dict = {
-                "not_started": 0,
-                "in_progress": 0,
-                "paused": 0,
-                "completed": 0,
-                "cancelled": 0
-            }
-
+            )[0])
 
-            for row in status_counts:
-                status_counts_dict[row["status"]] = row["count"]
+            status_counts_dict = {status: counts[f"status_{status}"] for status in TASK_STATUSES}
+            priority_counts_dict = {priority: counts[f"priority_{priority}"] for priority in TASK_PRIORITIES}
 
             # Считаем продуктивность
             total_tasks = sum(status_counts_dict.values())
@@ -331,28 +417,6 @@ class TaskManager:
                 user_param + (datetime.datetime.now().isoformat(),)
             )
 
-            # Приотирет
-            priority_counts = db.execute_query(
-                f"""
-                SELECT priority, COUNT(*) as count
-                FROM tasks
-                {user_filter}
-                GROUP BY priority
-                """,
-                user_param
-            )
-
-
-            priority_counts_dict = {
-                "low": 0,
-                "medium": 0,
-                "high": 0,
-                "urgent": 0
-            }
-
-            for row in priority_counts:
-                priority_counts_dict[row["priority"]] = row["count"]
-
             return {
                 "status_counts": status_counts_dict,
                 "completion_rate": completion_rate,
@@ -368,5 +432,6 @@ class TaskManager:
                 "priority_counts": {}
             }
         finally:
-            db.close()
+            if owns_connection:
+                db.close()
 
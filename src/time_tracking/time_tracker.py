@@ -1,11 +1,24 @@
+import csv
 import datetime
-from typing import Dict, List, Optional, Tuple
+import itertools
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ..database import get_db
+from ..database.cache import TTLCache
+from ..database.pagination import decode_cursor, encode_cursor, keyset_condition, split_page
+from ..database.rollup import TimeRollup
+from ..database.timestamps import to_epoch
+from ..events import TIME_ENTRY_CHANGED, get_event_bus
 
 
 class TimeTracker:
 
+    # Сводки get_time_summary: (db_path, user_id, period, day) -> итоги закрытых записей
+    _summary_cache = TTLCache(maxsize=1024, ttl=300)
+
     @staticmethod
     def start_time_entry(user_id: int, task_id: int, comment: Optional[str] = None) -> Tuple[bool, str, Optional[int]]:
 
@@ -24,29 +37,32 @@ class TimeTracker:
             if task_status in ["completed", "cancelled"]:
                 return False, f"Cannot track time for a {task_status} task", None
 
-            active_entries = db.execute_query(
-                "SELECT id, task_id FROM time_entries WHERE user_id = ? AND end_time IS NULL",
-                (user_id,)
-            )
-
-            if active_entries:
-                active_entry = dict(active_entries[0])
-                return False, f"You already have an active time entry for task #{active_entry['task_id']}", None
-
-            if task_status != "in_progress":
-                db.execute_update(
-                    "UPDATE tasks SET status = 'in_progress' WHERE id = ?",
-                    (task_id,)
+            # Проверка активной записи, смена статуса и вставка - одной транзакцией
+            with db.transaction():
+                active_entries = db.execute_query(
+                    "SELECT id, task_id FROM time_entries WHERE user_id = ? AND end_time IS NULL",
+                    (user_id,)
                 )
 
-            start_time = datetime.datetime.now().isoformat()
-            time_entry_id = db.execute_insert(
-                """
-                INSERT INTO time_entries (user_id, task_id, start_time, comment, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (user_id, task_id, start_time, comment, start_time)
-            )
+                if active_entries:
+                    active_entry = dict(active_entries[0])
+                    return False, f"You already have an active time entry for task #{active_entry['task_id']}", None
+
+                if task_status != "in_progress":
+                    db.execute_update(
+                        "UPDATE tasks SET status = 'in_progress' WHERE id = ?",
+                        (task_id,)
+                    )
+
+                start_time = datetime.datetime.now().isoformat()
+                time_entry_id = db.execute_insert(
+                    """
+                    INSERT INTO time_entries (user_id, task_id, start_time, start_ts, comment, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (user_id, task_id, start_time, to_epoch(start_time), comment, start_time)
+                )
+            TimeTracker._entries_changed(user_id)
 
             return True, "Time tracking started", time_entry_id
         except Exception as e:
@@ -79,20 +95,23 @@ class TimeTracker:
             end_time = datetime.datetime.now()
             duration_seconds = int((end_time - start_time).total_seconds())
 
-            end_time_str = end_time.isoformat()
-            db.execute_update(
-                """
-                UPDATE time_entries 
-                SET end_time = ?, duration_seconds = ?
-                WHERE id = ?
-                """,
-                (end_time_str, duration_seconds, active_entry["id"])
-            )
+            with db.transaction():
+                end_time_str = end_time.isoformat()
+                db.execute_update(
+                    """
+                    UPDATE time_entries 
+                    SET end_time = ?, end_ts = ?, duration_seconds = ?
+                    WHERE id = ?
+                    """,
+                    (end_time_str, to_epoch(end_time), duration_seconds, active_entry["id"])
+                )
+                TimeRollup.record(db, user_id, active_entry["task_id"], start_time, duration_seconds)
 
-            db.execute_update(
-                "UPDATE tasks SET status = 'paused' WHERE id = ?",
-                (active_entry["task_id"],)
-            )
+                db.execute_update(
+                    "UPDATE tasks SET status = 'paused' WHERE id = ?",
+                    (active_entry["task_id"],)
+                )
+            TimeTracker._entries_changed(user_id)
 
             time_entry_data = {
                 "id": active_entry["id"],
@@ -138,14 +157,17 @@ class TimeTracker:
             entry_comment = comment if comment else active_entry["comment"]
 
             end_time_str = end_time.isoformat()
-            db.execute_update(
-                """
-                UPDATE time_entries 
-                SET end_time = ?, duration_seconds = ?, comment = ?
-                WHERE id = ?
-                """,
-                (end_time_str, duration_seconds, entry_comment, active_entry["id"])
-            )
+            with db.transaction():
+                db.execute_update(
+                    """
+                    UPDATE time_entries 
+                    SET end_time = ?, end_ts = ?, duration_seconds = ?, comment = ?
+                    WHERE id = ?
+                    """,
+                    (end_time_str, to_epoch(end_time), duration_seconds, entry_comment, active_entry["id"])
+                )
+                TimeRollup.record(db, user_id, active_entry["task_id"], start_time, duration_seconds)
+            TimeTracker._entries_changed(user_id)
 
             time_entry_data = {
                 "id": active_entry["id"],
@@ -206,8 +228,10 @@ class TimeTracker:
     @staticmethod
     def get_time_entries(user_id: int, task_id: Optional[int] = None,
                          start_date: Optional[str] = None, end_date: Optional[str] = None,
-                         limit: int = 100) -> List[Dict]:
-        db = get_db()
+                         limit: int = 100, cursor: Optional[str] = None, db=None) -> List[Dict]:
+        """Записи юзера, новые первыми. db - уже полученное соединение (вызывающий закрывает его сам)."""
+        owns_connection = db is None
+        db = db or get_db()
 
         try:
             query = """
@@ -223,118 +247,87 @@ class TimeTracker:
                 query += " AND te.task_id = ?"
                 params.append(task_id)
 
+            # В режиме epoch сравнения и сортировка идут по целому start_ts
+            start_column = "te.start_time"
+            if db.timestamp_mode == "epoch":
+                start_column = "te.start_ts"
+                start_date, end_date = to_epoch(start_date), to_epoch(end_date)
+
             if start_date:
-                query += " AND te.start_time >= ?"
+                query += f" AND {start_column} >= ?"
                 params.append(start_date)
 
             if end_date:
-                query += " AND te.start_time <= ?"
+                query += f" AND {start_column} <= ?"
                 params.append(end_date)
 
-            query += " ORDER BY te.start_time DESC LIMIT ?"
+            if cursor:
+                cursor_start, cursor_id = decode_cursor(cursor, 2)
+                if db.timestamp_mode == "epoch":
+                    cursor_start = to_epoch(cursor_start)
+                condition, condition_params = keyset_condition((start_column, "te.id"), (cursor_start, cursor_id))
+                query += f" AND {condition}"
+                params.extend(condition_params)
+
+            query += f" ORDER BY {start_column} DESC, te.id DESC LIMIT ?"
             params.append(limit)
 
             entries = db.execute_query(query, tuple(params))
 
-            result = []
-            for entry in entries:
-                entry_dict = dict(entry)
-
-                if entry_dict["duration_seconds"]:
-                    entry_dict["duration_formatted"] = TimeTracker.format_duration(entry_dict["duration_seconds"])
-                else:
-                    if not entry_dict["end_time"]:
-                        start_time = datetime.datetime.fromisoformat(entry_dict["start_time"])
-                        current_time = datetime.datetime.now()
-                        duration_seconds = int((current_time - start_time).total_seconds())
-                        entry_dict["duration_seconds"] = duration_seconds
-                        entry_dict["duration_formatted"] = TimeTracker.format_duration(duration_seconds)
-
-                result.append(entry_dict)
-
-            return result
+            return [TimeTracker._entry_with_duration(dict(entry)) for entry in entries]
         except Exception as e:
             print(f"Error getting time entries: {e}")
             return []
         finally:
-            db.close()
+            if owns_connection:
+                db.close()
 
     @staticmethod
-    def get_time_summary(user_id: int, period: str = "today") -> Dict:
-
-        db = get_db()
+    def get_time_entries_page(user_id: int, task_id: Optional[int] = None,
+                              start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Страница записей (новые сначала) и курсор следующей страницы; None - страниц больше нет."""
+        entries = TimeTracker.get_time_entries(user_id, task_id, start_date, end_date, limit + 1, cursor)
+        return split_page(entries, limit, lambda entry: encode_cursor(entry["start_time"], entry["id"]))
 
-        try:
-            today = datetime.date.today()
-
-            if period == "today":
-                start_date = today.isoformat()
-                end_date = (today + datetime.timedelta(days=1)).isoformat()
-            elif period == "yesterday":
-                start_date = (today - datetime.timedelta(days=1)).isoformat()
-                end_date = today.isoformat()
-            elif period == "this_week":
-                start_date = (today - datetime.timedelta(days=today.weekday())).isoformat()
-                end_date = (today + datetime.timedelta(days=1)).isoformat()
-            elif period == "last_week":
-                start_date = (today - datetime.timedelta(days=today.weekday() + 7)).isoformat()
-                end_date = (today - datetime.timedelta(days=today.weekday())).isoformat()
-            elif period == "this_month":
-                start_date = today.replace(day=1).isoformat()
-                next_month = today.month + 1 if today.month < 12 else 1
-                next_month_year = today.year if today.month < 12 else today.year + 1
-                end_date = today.replace(year=next_month_year, month=next_month, day=1).isoformat()
-            elif period == "last_month":
-                this_month_start = today.replace(day=1)
-                last_month = this_month_start.month - 1 if this_month_start.month > 1 else 12
-                last_month_year = this_month_start.year if this_month_start.month > 1 else this_month_start.year - 1
-                start_date = this_month_start.replace(year=last_month_year, month=last_month).isoformat()
-                end_date = this_month_start.isoformat()
-            else:
-                start_date = today.isoformat()
-                end_date = (today + datetime.timedelta(days=1)).isoformat()
-
-            total_query = """
-            SELECT SUM(duration_seconds) as total_duration
-            FROM time_entries
-            WHERE user_id = ? AND start_time >= ? AND start_time < ?
-            AND end_time IS NOT NULL
-            """
-
-            total_result = db.execute_query(total_query, (user_id, start_date, end_date))
-            total_duration = dict(total_result[0])["total_duration"] or 0
-
-            by_task_query = """
-            SELECT t.id, t.title, SUM(te.duration_seconds) as task_duration
-            FROM time_entries te
-            JOIN tasks t ON te.task_id = t.id
-            WHERE te.user_id = ? AND te.start_time >= ? AND te.start_time < ?
-            AND te.end_time IS NOT NULL
-            GROUP BY t.id
-            ORDER BY task_duration DESC
-            """
+    @staticmethod
+    def _entry_with_duration(entry_dict: Dict) -> Dict:
+        if entry_dict["duration_seconds"]:
+            entry_dict["duration_formatted"] = TimeTracker.format_duration(entry_dict["duration_seconds"])
+        else:
+            if not entry_dict["end_time"]:
+                start_time = datetime.datetime.fromisoformat(entry_dict["start_time"])
+                current_time = datetime.datetime.now()
+                duration_seconds = int((current_time - start_time).total_seconds())
+                entry_dict["duration_seconds"] = duration_seconds
+                entry_dict["duration_formatted"] = TimeTracker.format_duration(duration_seconds)
+
+        return entry_dict
 
-            by_task_results = db.execute_query(by_task_query, (user_id, start_date, end_date))
+    @staticmethod
+    def get_time_summary(user_id: int, period: str = "today", db=None) -> Dict:
+        """
+        Сводка за период. Закрытые записи и снимок активной записи берутся из кэша
+        (ключ - пользователь, период и текущий день), живая длительность активной записи
+        досчитывается поверх без запросов к БД. Кэш сбрасывается при start/pause/stop и импорте.
+        db - уже полученное соединение для промаха кэша (вызывающий закрывает его сам).
+        """
+        today = datetime.date.today()
+        start_date, end_date = TimeTracker._period_range(period, today)
+
+        owns_connection = db is None
+        db = db or get_db()
 
-            by_task = []
-            for result in by_task_results:
-                task_dict = dict(result)
-                task_dict["duration_formatted"] = TimeTracker.format_duration(task_dict["task_duration"])
-                task_dict["percentage"] = round(
-                    (task_dict["task_duration"] / total_duration * 100) if total_duration > 0 else 0, 1)
-                by_task.append(task_dict)
+        try:
+            cache_key = (db.db_path, user_id, period, today.isoformat())
 
-            active_entry = TimeTracker.get_active_time_entry(user_id)
+            cached = TimeTracker._summary_cache.get(cache_key)
+            if cached is None:
+                generation = TimeTracker._summary_cache.generation()
+                cached = TimeTracker._load_time_summary(db, user_id, start_date, end_date)
+                TimeTracker._summary_cache.set(cache_key, cached, generation)
 
-            return {
-                "period": period,
-                "start_date": start_date,
-                "end_date": end_date,
-                "total_duration": total_duration,
-                "total_duration_formatted": TimeTracker.format_duration(total_duration),
-                "by_task": by_task,
-                "active_entry": active_entry
-            }
+            return TimeTracker._compose_time_summary(period, cached)
         except Exception as e:
             print(f"Error getting time summary: {e}")
             return {
@@ -347,8 +340,302 @@ class TimeTracker:
                 "active_entry": None
             }
         finally:
+            if owns_connection:
+                db.close()
+
+    @staticmethod
+    def get_daily_totals(user_id: int, days: int = 7, db=None) -> List[Dict]:
+        """
+        Плотный ряд по дням за последние days дней (включая сегодня), дни без записей - нули.
+        Считаются только закрытые записи; весь ряд читается одним запросом к дневному агрегату.
+        db - уже полученное соединение (вызывающий закрывает его сам).
+        """
+        today = datetime.date.today()
+        first_day = today - datetime.timedelta(days=days - 1)
+        end_date = (today + datetime.timedelta(days=1)).isoformat()
+
+        owns_connection = db is None
+        db = db or get_db()
+
+        try:
+            totals = {}
+            for row in TimeRollup.aggregate(db, first_day.isoformat(), end_date, user_id, end_inclusive=False):
+                totals[row["day"]] = totals.get(row["day"], 0) + row["seconds"]
+            return TimeTracker.daily_series(days, totals)
+        except Exception as e:
+            print(f"Error getting daily totals: {e}")
+            return TimeTracker.daily_series(days)
+        finally:
+            if owns_connection:
+                db.close()
+
+    @staticmethod
+    def daily_series(days: int, totals: Optional[Dict[str, int]] = None) -> List[Dict]:
+        """Ряд за последние days дней из {YYYY-MM-DD: секунды}; без totals - нулевой ряд."""
+        totals = totals or {}
+        first_day = datetime.date.today() - datetime.timedelta(days=days - 1)
+
+        series = []
+        for offset in range(days):
+            day = (first_day + datetime.timedelta(days=offset)).isoformat()
+            seconds = totals.get(day, 0)
+            series.append({"date": day, "duration_seconds": seconds, "duration_hours": round(seconds / 3600, 2)})
+        return series
+
+    @staticmethod
+    def _period_range(period: str, today: datetime.date) -> Tuple[str, str]:
+        if period == "today":
+            start_date = today.isoformat()
+            end_date = (today + datetime.timedelta(days=1)).isoformat()
+        elif period == "yesterday":
+            start_date = (today - datetime.timedelta(days=1)).isoformat()
+            end_date = today.isoformat()
+        elif period == "this_week":
+            start_date = (today - datetime.timedelta(days=today.weekday())).isoformat()
+            end_date = (today + datetime.timedelta(days=1)).isoformat()
+        elif period == "last_week":
+            start_date = (today - datetime.timedelta(days=today.weekday() + 7)).isoformat()
+            end_date = (today - datetime.timedelta(days=today.weekday())).isoformat()
+        elif period == "this_month":
+            start_date = today.replace(day=1).isoformat()
+            next_month = today.month + 1 if today.month < 12 else 1
+            next_month_year = today.year if today.month < 12 else today.year + 1
+            end_date = today.replace(year=next_month_year, month=next_month, day=1).isoformat()
+        elif period == "last_month":
+            this_month_start = today.replace(day=1)
+            last_month = this_month_start.month - 1 if this_month_start.month > 1 else 12
+            last_month_year = this_month_start.year if this_month_start.month > 1 else this_month_start.year - 1
+            start_date = this_month_start.replace(year=last_month_year, month=last_month).isoformat()
+            end_date = this_month_start.isoformat()
+        else:
+            start_date = today.isoformat()
+            end_date = (today + datetime.timedelta(days=1)).isoformat()
+
+        return start_date, end_date
+
+    @staticmethod
+    def _load_time_summary(db, user_id: int, start_date: str, end_date: str) -> Dict:
+        """То, что кэшируется: итоги закрытых записей и снимок активной записи."""
+        # Периоды выровнены по дням, поэтому все читается из дневного агрегата
+        rollup_rows = TimeRollup.aggregate(db, start_date, end_date, user_id, end_inclusive=False)
+
+        by_task = {}
+        for row in rollup_rows:
+            if row["title"] is None:
+                continue
+            task = by_task.setdefault(row["task_id"], {"id": row["task_id"], "title": row["title"],
+                                                       "task_duration": 0})
+            task["task_duration"] += row["seconds"]
+
+        active_entries = db.execute_query(
+            """
+            SELECT te.id, te.task_id, te.start_time, te.comment, t.title 
+            FROM time_entries te
+            JOIN tasks t ON te.task_id = t.id
+            WHERE te.user_id = ? AND te.end_time IS NULL
+            """,
+            (user_id,)
+        )
+
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "total_duration": sum(row["seconds"] for row in rollup_rows),
+            "by_task": list(by_task.values()),
+            "active_entry": dict(active_entries[0]) if active_entries else None
+        }
+
+    @staticmethod
+    def _compose_time_summary(period: str, cached: Dict) -> Dict:
+        """Итоговая сводка: закрытые итоги из кэша плюс текущая длительность активной записи."""
+        start_date, end_date = cached["start_date"], cached["end_date"]
+        total_duration = cached["total_duration"]
+        tasks = {task["id"]: dict(task) for task in cached["by_task"]}
+
+        active_entry = None
+        active = cached["active_entry"]
+        if active:
+            start_time = datetime.datetime.fromisoformat(active["start_time"])
+            duration_seconds = int((datetime.datetime.now() - start_time).total_seconds())
+            active_entry = {
+                "id": active["id"],
+                "task_id": active["task_id"],
+                "task_title": active["title"],
+                "start_time": active["start_time"],
+                "duration_seconds": duration_seconds,
+                "duration_formatted": TimeTracker.format_duration(duration_seconds),
+                "comment": active["comment"]
+            }
+
+            if start_date <= active["start_time"] < end_date:
+                total_duration += duration_seconds
+                task = tasks.setdefault(active["task_id"], {"id": active["task_id"], "title": active["title"],
+                                                            "task_duration": 0})
+                task["task_duration"] += duration_seconds
+
+        by_task = []
+        for task_dict in sorted(tasks.values(), key=lambda task: -task["task_duration"]):
+            task_dict["duration_formatted"] = TimeTracker.format_duration(task_dict["task_duration"])
+            task_dict["percentage"] = round(
+                (task_dict["task_duration"] / total_duration * 100) if total_duration > 0 else 0, 1)
+            by_task.append(task_dict)
+
+        return {
+            "period": period,
+            "start_date": start_date,
+            "end_date": end_date,
+            "total_duration": total_duration,
+            "total_duration_formatted": TimeTracker.format_duration(total_duration),
+            "by_task": by_task,
+            "active_entry": active_entry
+        }
+
+    @staticmethod
+    def _invalidate_time_summary(*user_ids: int):
+        user_ids = set(user_ids)
+        TimeTracker._summary_cache.invalidate(lambda key: key[1] in user_ids)
+
+    @staticmethod
+    def _entries_changed(*user_ids: int):
+        """После коммита изменений записей: сброс кэша сводок и событие для открытых страниц юзеров."""
+        TimeTracker._invalidate_time_summary(*user_ids)
+        get_event_bus().publish(TIME_ENTRY_CHANGED, user_ids)
+
+    @staticmethod
+    def import_entries(entries: Iterable[Dict], default_user_id: Optional[int] = None,
+                       chunk_size: int = 500) -> Tuple[bool, str, Dict]:
+        """
+        Массовый импорт завершенных записей времени (миграция старых таймшитов).
+        Записи читаются потоково, владение тасками проверяется одним запросом на пачку,
+        а пачка вставляется через executemany одной транзакцией.
+        Возвращаем кортеж (success, message, stats).
+        """
+        db = get_db()
+
+        stats = {
+            "imported": 0,
+            "skipped": 0,
+            "errors": [],
+            "elapsed_seconds": 0.0,
+            "rows_per_second": 0.0
+        }
+        started = time.perf_counter()
+        row_number = 0
+
+        try:
+            rows = iter(entries)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                prepared = []
+                for raw in chunk:
+                    row_number += 1
+                    entry, error = TimeTracker._prepare_import_row(raw, default_user_id)
+                    if error:
+                        TimeTracker._record_import_error(stats, row_number, error)
+                    else:
+                        prepared.append((row_number, entry))
+
+                owners = TimeTracker._get_task_owners(db, {entry[1] for _, entry in prepared})
+
+                params = []
+                for number, entry in prepared:
+                    user_id, task_id = entry[0], entry[1]
+                    if user_id not in owners.get(task_id, ()):
+                        TimeTracker._record_import_error(stats, number, "Task not found or not assigned to user")
+                        continue
+                    params.append(entry)
+
+                if params:
+                    with db.transaction():
+                        db.execute_many(
+                            """
+                            INSERT INTO time_entries (user_id, task_id, start_time, end_time, start_ts, end_ts,
+                                                      duration_seconds, comment, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            """,
+                            params
+                        )
+                        TimeRollup.record_many(db, ((entry[0], entry[1], entry[2], entry[6]) for entry in params))
+                    TimeTracker._entries_changed(*{entry[0] for entry in params})
+                    stats["imported"] += len(params)
+
+            message = f"Imported {stats['imported']} time entries, skipped {stats['skipped']}"
+            return True, message, stats
+        except Exception as e:
+            return False, f"Time entry import failed: {str(e)}", stats
+        finally:
+            elapsed = time.perf_counter() - started
+            stats["elapsed_seconds"] = round(elapsed, 3)
+            if elapsed > 0:
+                stats["rows_per_second"] = round(stats["imported"] / elapsed, 1)
             db.close()
 
+    @staticmethod
+    def import_entries_from_file(path: str, default_user_id: Optional[int] = None,
+                                 chunk_size: int = 500) -> Tuple[bool, str, Dict]:
+        """
+        Импорт из CSV или JSONL без загрузки всего файла в память.
+        Колонки: user_id, task_id, start_time, end_time, duration_seconds, comment.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in (".csv", ".jsonl", ".ndjson"):
+            return False, f"Unsupported import format: {extension}", {}
+
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = csv.DictReader(f) if extension == ".csv" else TimeTracker._iter_jsonl(f)
+            return TimeTracker.import_entries(rows, default_user_id, chunk_size)
+
+    @staticmethod
+    def _iter_jsonl(f) -> Iterator[Dict]:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    @staticmethod
+    def _prepare_import_row(raw: Dict, default_user_id: Optional[int]) -> Tuple[Optional[tuple], Optional[str]]:
+        try:
+            user_id = int(raw.get("user_id") or default_user_id)
+            task_id = int(raw["task_id"])
+            start_time = datetime.datetime.fromisoformat(raw["start_time"])
+            end_time = datetime.datetime.fromisoformat(raw["end_time"])
+
+            # Сравнение aware и naive времени и нечисловой duration_seconds - тоже ошибки строки, а не импорта
+            if end_time < start_time:
+                return None, "End time is before start time"
+
+            duration_seconds = raw.get("duration_seconds")
+            duration_seconds = int(duration_seconds) if duration_seconds not in (None, "") \
+                else int((end_time - start_time).total_seconds())
+        except (KeyError, TypeError, ValueError) as e:
+            return None, f"Invalid row: {e}"
+
+        comment = raw.get("comment") or None
+        return (user_id, task_id, start_time.isoformat(), end_time.isoformat(),
+                to_epoch(start_time), to_epoch(end_time),
+                duration_seconds, comment, start_time.isoformat()), None
+
+    @staticmethod
+    def _get_task_owners(db, task_ids) -> Dict[int, set]:
+        if not task_ids:
+            return {}
+
+        placeholders = ", ".join("?" for _ in task_ids)
+        rows = db.execute_query(
+            f"SELECT id, created_by, assigned_to FROM tasks WHERE id IN ({placeholders})",
+            tuple(task_ids)
+        )
+        return {row["id"]: {row["created_by"], row["assigned_to"]} for row in rows}
+
+    @staticmethod
+    def _record_import_error(stats: Dict, row_number: int, error: str, max_errors: int = 100):
+        stats["skipped"] += 1
+        if len(stats["errors"]) < max_errors:
+            stats["errors"].append(f"Row {row_number}: {error}")
+
     @staticmethod
     def format_duration(seconds: int) -> str:
         if seconds < 60:
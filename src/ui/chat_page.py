@@ -3,67 +3,19 @@ import streamlit as st
 import datetime
 from typing import Dict, List, Optional
 from streamlit_searchbox import st_searchbox
-import time
 
+from src.auth import UserDirectory
 from src.chat import ChatManager
 
-class UserManager:
-
-    @staticmethod
-    def get_all_users(exclude_user_id: int = None) -> List[Dict]:
-        from ..database import get_db
-
-        db = get_db()
-
-        query = """
-        SELECT id, username, first_name, last_name, email, created_at
-        FROM users
-        """
-        params = []
-
-        if exclude_user_id:
-            query += " WHERE id != ?"
-            params.append(exclude_user_id)
+USER_SEARCH_LIMIT = 20
 
-        query += " ORDER BY first_name, last_name"
-
-        try:
-            users = db.execute_query(query, params)
-            return [dict(user) for user in users]
-        except Exception as e:
-            st.error(f"Ошибка при получении пользователей: {str(e)}")
-            return []
+class UserManager:
 
     @staticmethod
-    def search_users(query: str, exclude_user_id: int = None) -> List[Dict]:
-        from ..database import get_db
-
-        db = get_db()
-
-        if not query:
-            return UserManager.get_all_users(exclude_user_id)
-
-        search_query = """
-        SELECT id, username, first_name, last_name, email, created_at
-        FROM users
-        WHERE (
-            LOWER(first_name) LIKE LOWER(?) OR
-            LOWER(last_name) LIKE LOWER(?) OR
-            LOWER(username) LIKE LOWER(?) OR
-            LOWER(email) LIKE LOWER(?)
-        )
-        """
-        params = [f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"]
-
-        if exclude_user_id:
-            search_query += " AND id != ?"
-            params.append(exclude_user_id)
-
-        search_query += " ORDER BY first_name, last_name"
-
+    def search_users(query: str, exclude_user_id: int = None, limit: int = USER_SEARCH_LIMIT) -> List[Dict]:
+        # Поиск по индексу справочника в памяти; пустой запрос - первые limit юзеров по имени
         try:
-            users = db.execute_query(search_query, params)
-            return [dict(user) for user in users]
+            return UserDirectory.search(query, exclude_user_id=exclude_user_id, limit=limit)
         except Exception as e:
             st.error(f"Ошибка при поиске пользователей: {str(e)}")
             return []
@@ -85,6 +37,31 @@ class UserManager:
             return None
 
 
+def load_message_buffer(user_id: int, other_user_id: int) -> Dict:
+    """
+    Буфер открытого чата в session_state: первая страница читается один раз при открытии,
+    дальше каждый rerun дочитывает только сообщения с id больше последнего показанного.
+    """
+    buffer = st.session_state.get("chat_message_buffer")
+
+    if buffer is None or buffer["other_user_id"] != other_user_id:
+        messages, cursor = ChatManager.get_conversation_page(user_id, other_user_id)
+        buffer = {
+            "other_user_id": other_user_id,
+            "messages": messages,
+            "cursor": cursor,
+            "last_id": max((message["id"] for message in messages), default=0)
+        }
+        st.session_state.chat_message_buffer = buffer
+        return buffer
+
+    new_messages = ChatManager.get_messages_since(user_id, other_user_id, buffer["last_id"])
+    if new_messages:
+        buffer["messages"].extend(new_messages)
+        buffer["last_id"] = new_messages[-1]["id"]
+    return buffer
+
+
 def show_chat():
 
 
@@ -220,8 +197,16 @@ def show_chat():
 
         st.markdown("---")
 
-        messages = ChatManager.get_conversation(user_id, st.session_state.selected_chat_user)
-        for message in messages:
+        buffer = load_message_buffer(user_id, st.session_state.selected_chat_user)
+
+        if buffer["cursor"] and st.button("Load earlier messages", key="chat_load_earlier", use_container_width=True):
+            earlier, buffer["cursor"] = ChatManager.get_conversation_page(
+                user_id, buffer["other_user_id"], cursor=buffer["cursor"]
+            )
+            buffer["messages"] = earlier + buffer["messages"]
+            st.rerun()
+
+        for message in buffer["messages"]:
             role = "user" if message["is_sent_by_me"] else "assistant"
             with st.chat_message(role):
                 st.write(message["message"])
@@ -244,18 +229,12 @@ def show_chat():
             else:
                 st.error(f"Message sending error: {message_text}")
 
-        time.sleep(10) # Задержка по времени для общения в реальном времени - меньше не делать нагружает сервак\пк
-        st.rerun()
-
     else:
         st.markdown("<div class=\"user-search-container\">", unsafe_allow_html=True)
         st.subheader("🔍 Start a new chat")
 
         def search_users_for_chat(searchterm: str) -> List[str]:
-            if not searchterm:
-                users = UserManager.get_all_users(exclude_user_id=user_id)
-            else:
-                users = UserManager.search_users(searchterm, exclude_user_id=user_id)
+            users = UserManager.search_users(searchterm, exclude_user_id=user_id)
             return [f"{user["first_name"]} {user["last_name"]} (@{user["username"]}) - {user["id"]}" for user in users]
 
         selected_user_str = st_searchbox(
@@ -4,9 +4,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 import datetime
 
-from src.time_tracking import TimeTracker
-from src.task_management import TaskManager
-from src.notifications import NotificationManager
+from src.dashboard import DashboardService
 
 def show_dashboard():
 
@@ -182,7 +180,8 @@ def show_dashboard():
 
     col1, col2, col3, col4 = st.columns(4)
 
-    active_entry = TimeTracker.get_active_time_entry(user_id)
+    snapshot = DashboardService.load(user_id)
+    active_entry = snapshot["active_entry"]
 
     with col1:
         status_class = "status-running" if active_entry else "status-stopped"
@@ -209,7 +208,7 @@ def show_dashboard():
         </div>
         """, unsafe_allow_html=True)
 
-    task_stats = TaskManager.get_task_statistics(user_id)
+    task_stats = snapshot["task_stats"]
     open_tasks = (task_stats["status_counts"]["not_started"] +
                   task_stats["status_counts"]["in_progress"] +
                   task_stats["status_counts"]["paused"])
@@ -227,7 +226,7 @@ def show_dashboard():
         </div>
         """, unsafe_allow_html=True)
 
-    time_summary = TimeTracker.get_time_summary(user_id, "today")
+    time_summary = snapshot["time_summary"]
 
     with col3:
         st.markdown(f"""
@@ -241,7 +240,7 @@ def show_dashboard():
         </div>
         """, unsafe_allow_html=True)
 
-    notification_count = NotificationManager.get_unread_count(user_id)
+    notification_count = snapshot["unread_notifications"]
 
     with col4:
         next_deadline_text = "No upcoming deadlines"
@@ -267,21 +266,11 @@ def show_dashboard():
     </section>
     """, unsafe_allow_html=True)
 
-    dates = []
-    hours = []
-
-    today = datetime.date.today()
-    for i in range(6, -1, -1):
-        date = today - datetime.timedelta(days=i)
-        dates.append(date.strftime("%a"))
-        if i == 0:
-            hours.append(time_summary["total_duration"] / 3600)
-        else:
-            hours.append(max(0, 8 - i + (i % 3)))
+    daily_totals = snapshot["daily_totals"]
 
     df = pd.DataFrame({
-        "Day": dates,
-        "Hours": hours
+        "Day": [datetime.date.fromisoformat(day["date"]).strftime("%a") for day in daily_totals],
+        "Hours": [day["duration_seconds"] / 3600 for day in daily_totals]
     })
 
     fig = px.bar(
@@ -397,7 +386,7 @@ def show_dashboard():
         </section>
         """, unsafe_allow_html=True)
 
-        recent_entries = TimeTracker.get_time_entries(user_id, limit=5)
+        recent_entries = snapshot["recent_entries"]
 
         if recent_entries:
             for i, entry in enumerate(recent_entries):
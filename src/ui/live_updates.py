@@ -0,0 +1,48 @@
+import streamlit as st
+
+from src.events import (CHAT_MESSAGE, NOTIFICATION_CREATED, NOTIFICATION_UPDATED, TASK_CREATED, TIME_ENTRY_CHANGED,
+                        get_event_bus)
+
+# Как часто фрагмент сверяет версию юзера в шине; это проверка в памяти, без запросов к БД
+LIVE_UPDATES_INTERVAL = 2
+
+# События, по которым перезапускается открытая страница; уведомления - для счетчика в шапке на любой странице
+HEADER_EVENT_TOPICS = (NOTIFICATION_CREATED, NOTIFICATION_UPDATED)
+PAGE_EVENT_TOPICS = {
+    "Dashboard": (TASK_CREATED, TIME_ENTRY_CHANGED),
+    "Time Tracking": (TIME_ENTRY_CHANGED,),
+    "Tasks": (TASK_CREATED,),
+    "Chat": (CHAT_MESSAGE,),
+}
+
+
+def page_events_version(user_id, page):
+    """
+    Версия последнего события тем страницы - для signature в load_pages: перезапуск по событию
+    показывает свежую первую страницу, а не подгруженные до него.
+    """
+    return get_event_bus().version(user_id, PAGE_EVENT_TOPICS.get(page, ()))
+
+
+def rerun_on_events(user_id, topics, since, key="live_updates"):
+    """
+    Перезапускает страницу, когда для юзера опубликовано событие одной из topics.
+    since - версия шины, взятая до чтения данных страницы: события, пришедшие во время прогона, не теряются.
+    """
+    bus = get_event_bus()
+    topics = set(topics)
+    st.session_state[key] = since
+
+    @st.fragment(run_every=LIVE_UPDATES_INTERVAL)
+    def watch_events():
+        seen = st.session_state.get(key, 0)
+        version, events = bus.events_since(user_id, seen)
+        if version == seen:
+            return
+
+        st.session_state[key] = version
+        # История короче пропущенного - часть событий вытеснена, перезапускаемся на всякий случай
+        if len(events) < version - seen or any(event["topic"] in topics for event in events):
+            st.rerun(scope="app")
+
+    watch_events()
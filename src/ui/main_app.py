@@ -11,6 +11,8 @@ from src.ui.chat_page import show_chat
 from src.ui.reports_page import show_reports
 from src.ui.settings_page import show_settings
 from src.notifications import NotificationManager
+from src.events import get_event_bus
+from src.ui.live_updates import HEADER_EVENT_TOPICS, PAGE_EVENT_TOPICS, rerun_on_events
 
 def show_main_app():
     """
@@ -393,6 +395,9 @@ def show_main_app():
         user_info = st.session_state.user_info
         user_name = f"{user_info['first_name']} {user_info['last_name']}" if user_info else "User"
         
+        # Версия шины событий до чтения данных страницы
+        events_version = get_event_bus().version(user_info['id']) if user_info else 0
+
         # Кол-во оповещений
         notification_count = NotificationManager.get_unread_count(user_info['id']) if user_info else 0
         
@@ -498,6 +503,9 @@ def show_main_app():
             unsafe_allow_html=True
         )
     
+    if user_info:
+        topics = PAGE_EVENT_TOPICS.get(st.session_state.current_page, ()) + HEADER_EVENT_TOPICS
+        rerun_on_events(user_info['id'], topics, events_version)
 
     if st.session_state.current_page == "Dashboard":
         show_dashboard()
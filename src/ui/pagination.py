@@ -0,0 +1,40 @@
+import streamlit as st
+
+
+def load_pages(key, fetch_page, signature=None):
+    """
+    Подгрузка "Load more" поверх keyset-курсоров менеджеров.
+    fetch_page(cursor) -> (items, next_cursor). Подгруженные страницы и курсор следующей хранятся
+    в session_state: обычный rerun не делает запросов, "Load more" читает ровно одну следующую страницу.
+    Смена signature (фильтры, версия событий страницы в шине) и reset_pages после своих изменений
+    сбрасывают подгрузку к свежей первой странице.
+    Возвращает (список страниц, курсор следующей страницы).
+    """
+    state = st.session_state.get(key)
+    if state is None or state["signature"] != signature:
+        page, cursor = fetch_page(None)
+        state = {"signature": signature, "pages": [page], "cursor": cursor, "load_more": False}
+        st.session_state[key] = state
+
+    if state["load_more"]:
+        state["load_more"] = False
+        if state["cursor"]:
+            page, state["cursor"] = fetch_page(state["cursor"])
+            state["pages"].append(page)
+
+    return state["pages"], state["cursor"]
+
+
+def reset_pages(key):
+    """Сброс подгруженных страниц - после изменения данных, которые они показывают."""
+    st.session_state.pop(key, None)
+
+
+def load_more_button(key, label="Load more"):
+    state = st.session_state.get(key)
+    if not state or not state["cursor"]:
+        return
+
+    if st.button(label, key=f"{key}_load_more", use_container_width=True):
+        state["load_more"] = True
+        st.rerun()
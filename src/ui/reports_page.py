@@ -5,11 +5,34 @@ import plotly.graph_objects as go
 import datetime
 import os
 
-from src.reporting import ReportingManager
+from src.reporting import ExportJobManager, ReportingManager
+from src.reporting.export_jobs import ACTIVE_STATUSES
 from src.time_tracking import TimeTracker
 from src.task_management import TaskManager
 from src.database.schema import get_db
 
+# Форматы выгрузки: подпись в интерфейсе -> формат ExportJobManager
+EXPORT_FORMAT_KEYS = {
+    "Excel": "xlsx",
+    "CSV": "csv",
+    "CSV (gzip)": "csv.gz",
+    "Parquet": "parquet",
+    "PDF": "pdf"
+}
+TABLE_EXPORT_FORMATS = ("CSV", "CSV (gzip)", "Parquet")
+
+EXPORT_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+    "pdf": "application/pdf"
+}
+
+# Как часто страница опрашивает незавершенные выгрузки, секунды
+EXPORT_POLL_INTERVAL = 2
+
+
 def show_reports():
 
     user_info = st.session_state.user_info
@@ -464,50 +487,112 @@ def show_reports():
 
         export_include_details = st.checkbox("Include detailed entries in export", value=True, key="export_include_details")
 
+        # Формат выбирается до нажатия кнопки - radio внутри ветки кнопки терялся на следующем прогоне
+        export_format = st.radio(
+            "Select Export Format:",
+            tuple(EXPORT_FORMAT_KEYS),
+            key="export_format_radio",
+            horizontal=True
+        )
+
+        export_contents = "Time report"
+        if export_format in TABLE_EXPORT_FORMATS:
+            export_contents = st.radio(
+                "Export Contents:",
+                ("Time report", "Raw time entries"),
+                key="export_contents_radio",
+                horizontal=True,
+                help="Time report is written as one file per section; raw time entries as a single table."
+            )
+
         if st.button("Generate and Export Report", use_container_width=True, key="generate_export_button"):
-            report_data = ReportingManager.generate_time_report(
-                user_id=export_user_id,
+            # Выгрузка идет в фоновом пуле, страница только ставит задачу и опрашивает ее статус
+            success, message, job_id = ExportJobManager.submit(
+                user_id=current_user_id,
+                export_format=EXPORT_FORMAT_KEYS[export_format],
                 start_date=export_start_date_iso,
                 end_date=export_end_date_iso,
+                export_user_id=export_user_id,
+                contents="entries" if export_contents == "Raw time entries" else "report",
                 include_details=export_include_details
             )
-
-            if "error" in report_data:
-                st.error(report_data["error"])
+            if success:
+                st.success(f"{message}. The file will appear below when it is ready.")
             else:
-                export_format = st.radio("Select Export Format:", ("Excel", "PDF"), key="export_format_radio")
-
-                export_dir = os.path.join(os.getcwd(), "exports")
-                os.makedirs(export_dir, exist_ok=True)
-
-                if export_format == "Excel":
-                    filename = f"time_report_{export_user_id if export_user_id else 'all_users'}_{export_start_date.strftime("%Y%m%d")}_{export_end_date.strftime("%Y%m%d")}.xlsx"
-                    filepath = os.path.join(export_dir, filename)
-                    success = ReportingManager.export_report_to_csv(report_data, filepath)
-                    if success:
-                        st.success(f"Report exported to {filepath}")
-                        with open(filepath, "rb") as f:
-                            st.download_button(
-                                label="Download Excel Report",
-                                data=f,
-                                file_name=filename,
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                    else:
-                        st.error("Failed to export report to Excel")
-                elif export_format == "PDF":
-                    filename = f"time_report_{export_user_id if export_user_id else 'all_users'}_{export_start_date.strftime("%Y%m%d")}_{export_end_date.strftime("%Y%m%d")}.pdf"
-                    filepath = os.path.join(export_dir, filename)
-                    success = ReportingManager.export_report_to_pdf(report_data, filepath)
-                    if success:
-                        st.success(f"Report exported to {filepath}")
-                        with open(filepath, "rb") as f:
-                            st.download_button(
-                                label="Download PDF Report",
-                                data=f,
-                                file_name=filename,
-                                mime="application/pdf"
-                            )
-                    else:
-                        st.error("Failed to export report to PDF")
+                st.error(message)
+
+        show_export_jobs(current_user_id)
+
+
+def show_export_jobs(user_id):
+    st.markdown("#### Export Jobs")
+
+    jobs = ExportJobManager.get_user_jobs(user_id)
+    if not jobs:
+        st.info("No exports yet.")
+        return
+
+    active_ids = [job["id"] for job in jobs if job["status"] in ACTIVE_STATUSES]
+    if active_ids:
+        show_active_export_jobs(user_id, active_ids)
+
+    finished = [job for job in jobs if job["status"] not in ACTIVE_STATUSES]
+    for job in finished:
+        st.markdown(f"**{export_job_label(job)}** - {job['status']}")
+        if job["status"] == "failed":
+            st.caption(f"Error: {job['error']}")
+
+    # download_button отдает файл целиком на каждом rerun, поэтому кнопки рисуем только для выбранной выгрузки
+    completed = {job["id"]: job for job in finished if job["result_paths"]}
+    if not completed:
+        return
+    selected_id = st.selectbox(
+        "Download Export:",
+        options=list(completed),
+        index=None,
+        format_func=lambda job_id: f"#{job_id} {export_job_label(completed[job_id])}",
+        placeholder="Select an export to download",
+        key="download_export_select"
+    )
+    if selected_id is not None:
+        show_export_downloads(completed[selected_id])
+
+
+def show_export_downloads(job):
+    for section, filepath in job["result_paths"].items():
+        if not os.path.exists(filepath):
+            st.caption(f"{os.path.basename(filepath)} has been removed")
+            continue
+        with open(filepath, "rb") as f:
+            st.download_button(
+                label=f"Download {section.replace('_', ' ')}",
+                data=f,
+                file_name=os.path.basename(filepath),
+                mime=EXPORT_MIME[job["export_format"]],
+                key=f"download_export_{job['id']}_{section}"
+            )
+
+
+@st.fragment(run_every=EXPORT_POLL_INTERVAL)
+def show_active_export_jobs(user_id, active_ids):
+    """Опрашивает только незавершенные задачи; когда какая-то завершилась, перезапускает страницу ради кнопок скачивания."""
+    jobs = [job for job in ExportJobManager.get_user_jobs(user_id) if job["id"] in active_ids]
+    if any(job["status"] not in ACTIVE_STATUSES for job in jobs):
+        st.rerun(scope="app")
+
+    for job in jobs:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            rows = f"{job['rows_written']} / {job['total_rows']} rows" if job["total_rows"] else job["status"]
+            st.progress(job["progress"], text=f"{export_job_label(job)} - {rows}")
+        with col2:
+            if st.button("Cancel", key=f"cancel_export_{job['id']}"):
+                success, message = ExportJobManager.cancel(job["id"], user_id)
+                if not success:
+                    st.warning(message)
+                st.rerun(scope="app")
+
 
+def export_job_label(job):
+    contents = "Time entries" if job["contents"] == "entries" else "Time report"
+    return f"{contents} {job['start_date'][:10]} - {job['end_date'][:10]} ({job['export_format']})"
@@ -2,6 +2,8 @@ import streamlit as st
 import datetime
 import time
 from src.task_management import TaskManager
+from src.ui.live_updates import page_events_version
+from src.ui.pagination import load_more_button, load_pages, reset_pages
 
 def show_tasks():
     # Получаем инфо о юзере
@@ -192,6 +194,7 @@ def show_tasks():
                 )
 
                 if success:
+                    reset_pages("task_pages")
                     st.success("Task created successfully!")
                     # Перезагрузить страницу для сброса полей ввода
                     st.rerun()
@@ -224,14 +227,19 @@ def show_tasks():
     }
 
     # Получение тасков  на основе фильтров
-    tasks = TaskManager.get_tasks(
+    filters = (status_map[status_filter], priority_map[priority_filter], role_map[role_filter], search or None)
+    fetch_tasks = lambda cursor: TaskManager.get_tasks_page(
         user_id=user_id,
-        status=status_map[status_filter],
-        priority=priority_map[priority_filter],
-        role=role_map[role_filter],
-        search=search if search else None,
-        limit=50
+        status=filters[0],
+        priority=filters[1],
+        role=filters[2],
+        search=filters[3],
+        limit=50,
+        cursor=cursor
     )
+    signature = (user_id, page_events_version(user_id, "Tasks")) + filters
+    task_pages, _ = load_pages("task_pages", fetch_tasks, signature=signature)
+    tasks = [task for page in task_pages for task in page]
 
     if tasks:
         for task in tasks:
@@ -288,6 +296,7 @@ def show_tasks():
                             updates={'status': 'completed'}
                         )
                         if success:
+                            reset_pages("task_pages")
                             st.success("Task marked as completed!")
                             time.sleep(1)
                             st.rerun()
@@ -304,6 +313,7 @@ def show_tasks():
                             updates={'status': new_status}
                         )
                         if success:
+                            reset_pages("task_pages")
                             st.success(f"Task {new_status.replace('_', ' ')}!")
                             time.sleep(1)
                             st.rerun()
@@ -326,10 +336,13 @@ def show_tasks():
                             updates={'status': 'cancelled'}
                         )
                         if success:
+                            reset_pages("task_pages")
                             st.success("Task cancelled!")
                             time.sleep(1)
                             st.rerun()
                         else:
                             st.error(message)
+
+        load_more_button("task_pages", "Load more tasks")
     else:
         st.info("No tasks found matching your filters.")
@@ -1,11 +1,17 @@
 
 import streamlit as st
+import streamlit.components.v1 as components
 import datetime
 import time
 from streamlit_autorefresh import st_autorefresh
 
 from src.time_tracking import TimeTracker
 from src.task_management import TaskManager
+from src.ui.live_updates import page_events_version
+from src.ui.pagination import load_more_button, load_pages, reset_pages
+
+# Таймер тикает в браузере; с сервером сверяемся только при смене состояния и раз в 5 минут
+TIMER_SYNC_INTERVAL_MS = 5 * 60 * 1000
 
 def show_time_tracking():
 
@@ -15,10 +21,6 @@ def show_time_tracking():
     # Инициализация  таймера
     if 'timer_active' not in st.session_state:
         st.session_state.timer_active = False
-    if 'timer_start_time' not in st.session_state:
-        st.session_state.timer_start_time = None
-    if 'timer_base_seconds' not in st.session_state:
-        st.session_state.timer_base_seconds = 0
     if 'page_visible' not in st.session_state:
         st.session_state.page_visible = True
 
@@ -188,31 +190,9 @@ def show_time_tracking():
 
     active_entry = TimeTracker.get_active_time_entry(user_id)
 
-    refresh_interval = None
-    if active_entry and st.session_state.timer_active:
-        # Обновляем каждую секунду только если таймер активен
-        refresh_interval = 1000  # 1 секунда в миллисекундах
-
-    # Автообновление с помощью streamlit-autorefresh
-    if refresh_interval:
-        # Проверяем видимость страницы через JavaScript
-        page_visible_js = st.markdown("""
-        <script>
-        const pageVisible = window.getPageVisibility ? window.getPageVisibility() : true;
-        if (!pageVisible) {
-            // Если страница не видима, не обновляем
-            window.skipRefresh = true;
-        } else {
-            window.skipRefresh = false;
-        }
-        </script>
-        """, unsafe_allow_html=True)
-
-        # Используем autorefresh только если страница видима
-        count = st_autorefresh(interval=refresh_interval, limit=None, key="timer_refresh") # НЕ ИСПОЛЬЗОВАЛОСЬ
-
-        # Показываем информацию об обновлениях
-        #st.markdown(f'<div class="refresh-info">Обновлений: {count}</div>', unsafe_allow_html=True)# НЕ ИСПОЛЬЗОВАЛОСЬ
+    if active_entry:
+        # Редкая сверка с сервером (например, запись остановили в другой вкладке)
+        st_autorefresh(interval=TIMER_SYNC_INTERVAL_MS, limit=None, key="timer_sync")
 
     with st.container():
         st.markdown('<div class="timer-container">', unsafe_allow_html=True)
@@ -220,38 +200,19 @@ def show_time_tracking():
         if active_entry:
             st.markdown(f'<div class="timer-task">Currently tracking: {active_entry["task_title"]}</div>', unsafe_allow_html=True)
 
-            # Инициализируем таймер если он еще не активен
-            if not st.session_state.timer_active:
-                st.session_state.timer_active = True
-                st.session_state.timer_start_time = time.time()
-                st.session_state.timer_base_seconds = active_entry['duration_seconds']
-
-            # Вычисляем текущее время
-            if st.session_state.timer_start_time:
-                current_elapsed = int(time.time() - st.session_state.timer_start_time)
-                total_seconds = st.session_state.timer_base_seconds + current_elapsed
-            else:
-                total_seconds = st.session_state.timer_base_seconds
+            st.session_state.timer_active = True
 
-            # Отображаем таймер с анимацией
-            timer_class = "timer-display running"
-            st.markdown(
-                f'<div class="{timer_class}">{format_time(total_seconds)}</div>',
-                unsafe_allow_html=True
-            )
+            # Отображаем таймер, который тикает на стороне браузера от длительности на момент рендера
+            render_live_timer(active_entry['duration_seconds'])
 
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("⏸️ Pause", use_container_width=True):
-                    # Обновляем базовое время и останавливаем таймер
-                    if st.session_state.timer_start_time:
-                        current_elapsed = int(time.time() - st.session_state.timer_start_time)
-                        st.session_state.timer_base_seconds += current_elapsed
-                        st.session_state.timer_start_time = None
-                        st.session_state.timer_active = False
+                    st.session_state.timer_active = False
 
                     success, message, time_entry_data = TimeTracker.pause_time_entry(user_id)
                     if success:
+                        reset_pages("time_entry_pages")
                         st.success(f"Time tracking paused. Duration: {time_entry_data['duration_formatted']}")
                         time.sleep(1)
                         st.rerun()
@@ -262,14 +223,13 @@ def show_time_tracking():
                 if st.button("⏹️ Stop", use_container_width=True):
                     # Останавливаем таймер
                     st.session_state.timer_active = False
-                    st.session_state.timer_start_time = None
-                    st.session_state.timer_base_seconds = 0
 
                     comment = st.text_area("Add a comment (optional):", value=active_entry.get('comment', ''))
 
                     if st.button("Confirm Stop", use_container_width=True):
                         success, message, time_entry_data = TimeTracker.stop_time_entry(user_id, comment)
                         if success:
+                            reset_pages("time_entry_pages")
                             st.success(f"Time tracking stopped. Duration: {time_entry_data['duration_formatted']}")
                             time.sleep(1)
                             st.rerun()
@@ -279,8 +239,6 @@ def show_time_tracking():
         else:
             # Сбрасываем состояние таймера
             st.session_state.timer_active = False
-            st.session_state.timer_start_time = None
-            st.session_state.timer_base_seconds = 0
 
             st.markdown('<div class="timer-task">Start tracking a new task</div>', unsafe_allow_html=True)
             st.markdown('<div class="timer-display">00:00:00</div>', unsafe_allow_html=True)
@@ -305,9 +263,8 @@ def show_time_tracking():
                         if success:
                             # Инициализируем таймер
                             st.session_state.timer_active = True
-                            st.session_state.timer_start_time = time.time()
-                            st.session_state.timer_base_seconds = 0
 
+                            reset_pages("time_entry_pages")
                             st.success("Time tracking started!")
                             time.sleep(1)
                             st.rerun()
@@ -322,7 +279,10 @@ def show_time_tracking():
 
     st.markdown("### Recent Time Entries")
 
-    recent_entries = TimeTracker.get_time_entries(user_id, limit=10)
+    fetch_entries = lambda cursor: TimeTracker.get_time_entries_page(user_id, limit=10, cursor=cursor)
+    signature = (user_id, page_events_version(user_id, "Time Tracking"))
+    entry_pages, _ = load_pages("time_entry_pages", fetch_entries, signature=signature)
+    recent_entries = [entry for page in entry_pages for entry in page]
 
     if recent_entries:
         for entry in recent_entries:
@@ -346,6 +306,8 @@ def show_time_tracking():
                 {f'<div class="entry-comment">{entry["comment"]}</div>' if entry.get('comment') else ''}
             </div>
             """, unsafe_allow_html=True)
+
+        load_more_button("time_entry_pages", "Load older entries")
     else:
         st.info("No recent time entries found. Start tracking your time!")
 
@@ -404,6 +366,34 @@ def show_time_tracking():
     else:
         st.info(f"No time entries found for {period_options[period_key].lower()}.")
 
+def render_live_timer(elapsed_seconds):
+    """
+    Таймер в iframe: считает от elapsed_seconds по часам браузера, без перезапусков скрипта.
+    Отсчет идет от момента рендера, поэтому расхождение часов клиента и сервера не важно.
+    """
+    components.html(f"""
+    <div id="timer" style="font-size: 3rem; font-weight: 700; text-align: center; color: #4CAF50;
+         font-family: 'Courier New', monospace; text-shadow: 0 0 10px rgba(76, 175, 80, 0.3);">
+        {format_time(elapsed_seconds)}
+    </div>
+    <script>
+    const baseSeconds = {int(elapsed_seconds)};
+    const renderedAt = Date.now();
+    const timer = document.getElementById("timer");
+    const pad = (value) => String(value).padStart(2, "0");
+
+    function tick() {{
+        const total = baseSeconds + Math.floor((Date.now() - renderedAt) / 1000);
+        const hours = Math.floor(total / 3600);
+        const minutes = Math.floor((total % 3600) / 60);
+        timer.textContent = `${{pad(hours)}}:${{pad(minutes)}}:${{pad(total % 60)}}`;
+    }}
+
+    tick();
+    setInterval(tick, 1000);
+    </script>
+    """, height=90)
+
 def format_time(seconds):
     hours, remainder = divmod(seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
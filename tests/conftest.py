@@ -2,6 +2,9 @@ import pytest
 import os
 import tempfile
 import sqlite3
+import datetime
+from contextlib import nullcontext
+from types import SimpleNamespace
 from unittest.mock import Mock, patch
 
 import sys
@@ -22,9 +25,53 @@ def temp_db():
     
     yield db
     
-    db.close()
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    db.dispose()
+    for suffix in ("", "-wal", "-shm", ".migrate.lock"):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+
+
+SEED_START = datetime.datetime(2025, 1, 1, 9, 0, 0)
+
+
+@pytest.fixture
+def seeded_db(temp_db, monkeypatch):
+    """Фабрика: подменяет синглтон базы на temp_db, создает пользователя, задачу и записи времени.
+
+    Записи по умолчанию идут раз в час с SEED_START и длятся 30 минут; start, duration и comment
+    принимают номер записи. Без task_title задача и записи не создаются.
+    """
+    import src.database.schema as schema
+    monkeypatch.setattr(schema, "_db_instance", temp_db)
+
+    def seed(entries=0, task_title="Seeded task", first_name=None, last_name=None,
+             start=lambda i: SEED_START + datetime.timedelta(hours=i),
+             duration=lambda i: datetime.timedelta(minutes=30),
+             comment=lambda i: None):
+        user_id = temp_db.execute_insert(
+            "INSERT INTO users (username, email, password_hash, role, first_name, last_name, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ("seeded", "seeded@example.com", "hash", "employee", first_name, last_name, "2025-01-01T00:00:00")
+        )
+        task_id = None
+        if task_title is not None:
+            task_id = temp_db.execute_insert(
+                "INSERT INTO tasks (title, status, priority, created_by, created_at) VALUES (?, ?, ?, ?, ?)",
+                (task_title, "in_progress", "medium", user_id, "2025-01-01T00:00:00")
+            )
+            TimeTracker.import_entries(
+                {
+                    "user_id": user_id,
+                    "task_id": task_id,
+                    "start_time": start(i).isoformat(),
+                    "end_time": (start(i) + duration(i)).isoformat(),
+                    "comment": comment(i)
+                }
+                for i in range(entries)
+            )
+        return SimpleNamespace(db=temp_db, user_id=user_id, task_id=task_id)
+
+    return seed
 
 
 @pytest.fixture
@@ -34,6 +81,7 @@ def mock_db():
     mock_db.execute_insert.return_value = 1
     mock_db.execute_update.return_value = 1
     mock_db.close.return_value = None
+    mock_db.transaction.return_value = nullcontext()
     return mock_db
 
 
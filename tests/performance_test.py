@@ -6,41 +6,795 @@ import tempfile
 import os
 import statistics
 import datetime
+import itertools
+import random
+import tracemalloc
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Tuple
 import sys
 
+import pytest
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
 
-from src.database.schema import Database
+from src.database.schema import Database, STORAGE_PROFILES
 from src.auth.auth_manager import AuthManager
+from src.auth.user_directory import UserDirectory
 from src.task_management.task_manager import TaskManager
 from src.time_tracking.time_tracker import TimeTracker
+from src.reporting.reporting_manager import DETAILED_ENTRY_COLUMNS, ReportingManager
+from src.database.rollup import TimeRollup
+from src.database.timestamps import to_epoch
+from src.dashboard import DashboardService
+from src.notifications.deadline_job import SELECT_DEADLINE_BATCH
+
+
+# Горячие запросы time_entries и индекс, который они обязаны использовать
+TIME_ENTRY_QUERY_PLANS = [
+    (
+        "active_entry",
+        """
+        SELECT te.id, te.task_id, te.start_time, te.comment, t.title
+        FROM time_entries te
+        JOIN tasks t ON te.task_id = t.id
+        WHERE te.user_id = ? AND te.end_time IS NULL
+        """,
+        (1,),
+        "idx_time_entries_active"
+    ),
+    (
+        "summary_total",
+        """
+        SELECT SUM(duration_seconds) as total_duration
+        FROM time_entries
+        WHERE user_id = ? AND start_time >= ? AND start_time < ?
+        AND end_time IS NOT NULL
+        """,
+        (1, "2025-01-01", "2025-01-02"),
+        "idx_time_entries_user_start"
+    ),
+    (
+        "summary_by_task",
+        """
+        SELECT t.id, t.title, SUM(te.duration_seconds) as task_duration
+        FROM time_entries te
+        JOIN tasks t ON te.task_id = t.id
+        WHERE te.user_id = ? AND te.start_time >= ? AND te.start_time < ?
+        AND te.end_time IS NOT NULL
+        GROUP BY t.id
+        """,
+        (1, "2025-01-01", "2025-01-02"),
+        "idx_time_entries_user_start"
+    ),
+    (
+        "recent_entries",
+        """
+        SELECT te.id, te.task_id, te.start_time, te.end_time, te.duration_seconds, te.comment,
+               t.title as task_title
+        FROM time_entries te
+        JOIN tasks t ON te.task_id = t.id
+        WHERE te.user_id = ?
+        ORDER BY te.start_time DESC LIMIT ?
+        """,
+        (1, 10),
+        "idx_time_entries_user_start"
+    ),
+    (
+        "rollup_user_range",
+        """
+        SELECT te.task_id, te.day, SUM(te.seconds) as seconds, SUM(te.entries) as entries
+        FROM time_rollup_daily te
+        WHERE te.day >= ? AND te.day < ? AND te.user_id = ?
+        GROUP BY te.task_id, te.day
+        """,
+        ("2025-01-01", "2026-01-01", 1),
+        "PRIMARY KEY"
+    ),
+    (
+        "rollup_all_users_range",
+        """
+        SELECT te.task_id, te.day, SUM(te.seconds) as seconds, SUM(te.entries) as entries
+        FROM time_rollup_daily te
+        WHERE te.day >= ? AND te.day < ?
+        GROUP BY te.task_id, te.day
+        """,
+        ("2025-01-01", "2026-01-01"),
+        "idx_time_rollup_daily_day"
+    ),
+    (
+        "notifications_page",
+        """
+        SELECT * FROM notifications
+        WHERE user_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?
+        """,
+        (1, "2025-01-01T00:00:00", 100, 21),
+        "idx_notifications_user_created"
+    ),
+    (
+        "chat_messages_since",
+        """
+        SELECT cm.* FROM chat_messages cm
+        WHERE ((cm.sender_id = ? AND cm.receiver_id = ?) OR (cm.sender_id = ? AND cm.receiver_id = ?))
+        AND cm.id > ?
+        ORDER BY cm.id LIMIT ?
+        """,
+        (1, 2, 2, 1, 100, 200),
+        "idx_chat_messages_sender_receiver (sender_id=? AND receiver_id=? AND rowid>?)"
+    ),
+    (
+        "chat_conversations_list",
+        """
+        SELECT user_a as other_user_id, last_message_id, last_sent_at, unread_for_b as unread_count
+        FROM conversations WHERE user_b = ?
+        """,
+        (1,),
+        "idx_conversations_user_b"
+    ),
+    (
+        "unread_notifications_count",
+        """
+        SELECT COUNT(*) as count FROM notifications
+        WHERE user_id = ? AND read_at IS NULL
+        """,
+        (1,),
+        "COVERING INDEX idx_notifications_unread"
+    ),
+    (
+        "deadline_job_dedup",
+        SELECT_DEADLINE_BATCH,
+        {"now": "2025-01-01T00:00:00", "until": "2025-01-02T00:00:00", "since": "2024-12-31T00:00:00",
+         "after_id": 0, "batch_size": 500},
+        "idx_notifications_deadline"
+    ),
+    (
+        "export_jobs_active",
+        "SELECT COUNT(*) as count FROM export_jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+        (1,),
+        "idx_export_jobs_active"
+    ),
+]
+
+
+def check_query_plans(db: Database) -> List[str]:
+    issues = []
+
+    for name, query, params, expected_index in TIME_ENTRY_QUERY_PLANS:
+        plan = [row["detail"] for row in db.execute_query(f"EXPLAIN QUERY PLAN {query}", params)]
+
+        for detail in plan:
+            if detail.startswith("SCAN") and "USING" not in detail:
+                issues.append(f"{name}: full scan ({detail})")
+
+        if not any(expected_index in detail for detail in plan):
+            issues.append(f"{name}: expected {expected_index}, got {plan}")
+
+    return issues
+
+
+def test_time_entry_queries_use_indexes(temp_db):
+    issues = check_query_plans(temp_db)
+    assert not issues, "\n".join(issues)
+
+
+def test_import_skips_invalid_rows(seeded_db):
+    seeded = seeded_db()
+
+    def row(hour, **overrides):
+        return dict({
+            "user_id": seeded.user_id,
+            "task_id": seeded.task_id,
+            "start_time": f"2025-01-01T{hour:02d}:00:00",
+            "end_time": f"2025-01-01T{hour:02d}:30:00"
+        }, **overrides)
+
+    # Плохие строки во второй пачке не должны прерывать импорт после уже записанной первой
+    success, message, stats = TimeTracker.import_entries([
+        row(1), row(2),
+        row(3, duration_seconds="abc"),
+        row(4, end_time="2025-01-01T04:30:00+03:00"),
+        row(5, end_time="2025-01-01T04:00:00"),
+        row(6)
+    ], chunk_size=2)
+
+    assert success
+    assert stats["imported"] == 3
+    assert stats["skipped"] == 3
+    assert [error.split(":")[0] for error in stats["errors"]] == ["Row 3", "Row 4", "Row 5"]
+
+
+def test_migrate_dry_run_and_history(tmp_path):
+    from src.database.migrations import LATEST_VERSION, MIGRATIONS, MigrationRunner
+    db = Database(str(tmp_path / "dry_run.db"), auto_migrate=False)
+    runner = MigrationRunner(db)
+
+    planned = runner.migrate(target=5, dry_run=True)
+    assert [step["version"] for step in planned] == [1, 2, 3, 4, 5]
+    assert all(step["statements"] and step["duration_ms"] is None for step in planned)
+    assert runner.current_version() == 0 and runner.history() == []
+
+    applied = runner.migrate(target=5)
+    assert [step["version"] for step in applied] == [1, 2, 3, 4, 5]
+    assert runner.current_version() == 5
+    assert runner.migrate(target=5) == []
+
+    runner.migrate()
+    history = runner.history()
+    assert [(row["version"], row["name"]) for row in history] == \
+        [(migration.version, migration.name) for migration in MIGRATIONS]
+    assert all(row["applied_at"] and row["duration_ms"] is not None for row in history)
+    assert runner.current_version() == LATEST_VERSION and runner.is_current()
+    db.dispose()
+
+
+def test_concurrent_migrations_on_one_file(tmp_path):
+    import subprocess
+    from src.database.migrations import LATEST_VERSION, MigrationRunner
+    db_path = str(tmp_path / "concurrent.db")
+    go_path = str(tmp_path / "go")
+
+    # Процессы стартуют одновременно на пустой базе, как несколько воркеров сервера
+    script = (
+        "import os, sys, time\n"
+        f"sys.path.insert(0, {os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))!r})\n"
+        "from src.database.schema import Database\n"
+        f"while not os.path.exists({go_path!r}):\n"
+        "    time.sleep(0.001)\n"
+        f"Database({db_path!r}).dispose()\n"
+    )
+    processes = [
+        subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    time.sleep(1)
+    open(go_path, "w").close()
+    results = [process.communicate(timeout=120) for process in processes]
+
+    for process, (stdout, stderr) in zip(processes, results):
+        assert process.returncode == 0, stderr
+    db = Database(db_path, auto_migrate=False)
+    runner = MigrationRunner(db)
+    assert runner.current_version() == LATEST_VERSION
+    assert [row["version"] for row in runner.history()] == list(range(1, LATEST_VERSION + 1))
+    db.dispose()
+
+
+def test_epoch_backfill_matches_new_entries(monkeypatch, tmp_path):
+    import src.database.schema as schema
+    db = Database(str(tmp_path / "backfill.db"), auto_migrate=False)
+    monkeypatch.setattr(schema, "_db_instance", db)
+    db.migrate(target=2)
+
+    user_id = db.execute_insert(
+        "INSERT INTO users (username, email, password_hash, role, created_at) VALUES (?, ?, ?, ?, ?)",
+        ("backfill", "backfill@example.com", "hash", "employee", "2025-01-01T00:00:00")
+    )
+    task_id = db.execute_insert(
+        "INSERT INTO tasks (title, status, priority, created_by, created_at) VALUES (?, ?, ?, ?, ?)",
+        ("Backfill task", "in_progress", "medium", user_id, "2025-01-01T00:00:00")
+    )
+    # Наивное время, смещение часового пояса и дробные секунды до 1970 года
+    periods = [
+        ("2025-03-01T09:15:30", "2025-03-01T10:00:00"),
+        ("2025-03-01T09:15:30+03:00", "2025-03-01T10:00:00+03:00"),
+        ("1969-12-31T23:59:58.500000", "1970-01-01T00:00:01.250000"),
+    ]
+    for start_time, end_time in periods:
+        db.execute_insert(
+            "INSERT INTO time_entries (user_id, task_id, start_time, end_time, duration_seconds, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, task_id, start_time, end_time, 0, start_time)
+        )
+
+    db.migrate()
+    TimeTracker.import_entries(
+        {"user_id": user_id, "task_id": task_id, "start_time": start_time, "end_time": end_time}
+        for start_time, end_time in periods
+    )
+
+    rows = db.execute_query("SELECT start_time, end_time, start_ts, end_ts FROM time_entries ORDER BY id")
+    backfilled, inserted = rows[:len(periods)], rows[len(periods):]
+    assert [tuple(row) for row in backfilled] == [tuple(row) for row in inserted]
+    db.dispose()
+
+
+def test_time_entry_pages_walk_all_entries(seeded_db):
+    # Пары записей с одинаковым start_time проверяют, что id разрешает ничьи без пропусков и дублей
+    user_id = seeded_db(45, start=lambda i: datetime.datetime(2025, 1, 1, 9) + datetime.timedelta(hours=i // 2)).user_id
+
+    walked, cursor = [], None
+    while True:
+        page, cursor = TimeTracker.get_time_entries_page(user_id, limit=10, cursor=cursor)
+        walked.extend(entry["id"] for entry in page)
+        if cursor is None:
+            break
+
+    expected = [entry["id"] for entry in TimeTracker.get_time_entries(user_id, limit=100)]
+    assert walked == expected
+    assert len(set(walked)) == 45
+
+
+def test_task_search_pages_walk_all_matches(seeded_db, monkeypatch):
+    import src.task_management.task_manager as task_manager
+    monkeypatch.setattr(task_manager, "TASK_SEARCH_RANK_CANDIDATES", 12)
+    seeded = seeded_db()
+    words = ["alpha", "beta", "gamma"]
+    for i in range(60):
+        # Повторы слова в заголовке дают одинаковый ранг - ничьи разрешает id
+        title = " ".join([words[i % 3]] * (1 + i % 2) + [words[(i + 1) % 3]])
+        TaskManager.create_task(title, f"description {i}", "in_progress", "low", seeded.user_id)
+    # Остальные таски - чтобы слова встречались меньше чем в половине и bm25 различал совпадения
+    for i in range(80):
+        TaskManager.create_task(f"other task {i}", None, "in_progress", "low", seeded.user_id)
+
+    def walk(search):
+        walked, cursor = [], None
+        while True:
+            page, cursor = TaskManager.get_tasks_page(seeded.user_id, search=search, limit=7, cursor=cursor)
+            walked.extend(page)
+            if cursor is None:
+                return walked
+
+    # Одно слово - без ранжирования, новые сначала, все совпадения
+    single = walk("alp")
+    expected = [task for task in TaskManager.get_tasks(seeded.user_id) if "alpha" in task["title"]]
+    assert [task["id"] for task in single] == sorted((task["id"] for task in expected), reverse=True)
+
+    # Несколько слов - ранжируются только новейшие совпадения, ранг по возрастанию без пропусков и дублей
+    ranked = walk("alpha beta")
+    matching = sorted((task["id"] for task in expected if "beta" in task["title"]), reverse=True)
+    assert len(matching) == 20 and sorted(task["id"] for task in ranked) == sorted(matching[:12])
+    assert [(task["search_rank"], task["id"]) for task in ranked] == \
+        sorted((task["search_rank"], task["id"]) for task in ranked)
+    assert len({task["search_rank"] for task in ranked}) > 1
+
+
+def test_rollup_days_follow_wall_clock_with_offsets(seeded_db):
+    # 23:30 -05:00 - это 1 марта по настенным часам, хотя в UTC уже 2 марта (и наоборот для 01:00 +03:00)
+    starts = ["2025-03-01T23:30:00-05:00", "2025-03-02T01:00:00+03:00", "2025-03-02T09:00:00",
+              "2025-03-04T22:00:00-08:00"]
+    seeded = seeded_db(len(starts), start=lambda i: datetime.datetime.fromisoformat(starts[i]))
+    days = ["2025-03-01", "2025-03-02", "2025-03-04"]
+
+    rollup_rows = "SELECT user_id, task_id, day, seconds, entries FROM time_rollup_daily ORDER BY 1, 2, 3"
+    incremental = [tuple(row) for row in seeded.db.execute_query(rollup_rows)]
+    TimeRollup.rebuild(seeded.db)
+    assert [tuple(row) for row in seeded.db.execute_query(rollup_rows)] == incremental
+    assert [row[2] for row in incremental] == days
+
+    # Во втором диапазоне крайние дни неполные и читаются из time_entries
+    for start_date, end_date in (("2025-03-01T00:00:00", "2025-03-05T00:00:00"),
+                                 ("2025-03-01T12:00:00", "2025-03-04T23:00:00")):
+        detailed = ReportingManager.generate_time_report(seeded.user_id, start_date, end_date, True)
+        rolled = ReportingManager.generate_time_report(seeded.user_id, start_date, end_date, False)
+        assert [day["date"] for day in rolled["time_by_day"]] == days
+        assert detailed["time_by_day"] == rolled["time_by_day"]
+        assert detailed["summary"] == rolled["summary"]
+
+
+def test_dashboard_snapshot_uses_one_connection(temp_db, seeded_db):
+    user_id = seeded_db(task_title=None).user_id
+    deadline = (datetime.datetime.now() + datetime.timedelta(days=3)).isoformat()
+    for title, status, task_deadline in (("No deadline", "in_progress", None), ("Due soon", "completed", deadline)):
+        temp_db.execute_insert(
+            "INSERT INTO tasks (title, status, priority, created_by, deadline, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (title, status, "high", user_id, task_deadline, "2025-01-01T00:00:00")
+        )
+    temp_db.close()
+
+    stats_before = temp_db.pool_stats()
+    snapshot = DashboardService.load(user_id)
+    stats_after = temp_db.pool_stats()
+
+    assert (stats_after["hits"] + stats_after["misses"]) - (stats_before["hits"] + stats_before["misses"]) == 1
+    assert snapshot["task_stats"]["upcoming_deadlines"] == [{"title": "Due soon", "deadline": deadline}]
+    assert snapshot["task_stats"]["status_counts"]["completed"] == 1
+    assert snapshot["task_stats"]["completion_rate"] == 50
+    assert snapshot["task_stats"]["priority_counts"]["high"] == 2
+    assert len(snapshot["daily_totals"]) == 7
+
+
+def test_event_bus_publishes_to_recipients(temp_db, monkeypatch):
+    import src.database.schema as schema
+    from src.chat import ChatManager
+    from src.events import CHAT_MESSAGE, EventBus, NOTIFICATION_CREATED, TASK_CREATED, TIME_ENTRY_CHANGED
+    import src.events.event_bus as event_bus
+    monkeypatch.setattr(schema, "_db_instance", temp_db)
+    monkeypatch.setattr(event_bus, "_bus_instance", EventBus())
+    bus = event_bus.get_event_bus()
+
+    sender, receiver = (
+        temp_db.execute_insert(
+            "INSERT INTO users (username, email, password_hash, role, created_at) VALUES (?, ?, ?, ?, ?)",
+            (name, f"{name}@example.com", "hash", "employee", "2025-01-01T00:00:00")
+        )
+        for name in ("sender", "receiver")
+    )
+
+    ChatManager.send_message(sender, receiver, "hello")
+    task_id = TaskManager.create_task("Bus task", None, "not_started", "low", sender, assigned_to=receiver)[2]
+
+    version, events = bus.events_since(receiver, 0)
+    assert [event["topic"] for event in events] == [CHAT_MESSAGE, NOTIFICATION_CREATED, TASK_CREATED, NOTIFICATION_CREATED]
+    assert bus.events_since(receiver, version) == (version, [])
+    assert [event["topic"] for event in bus.events_since(sender, 0)[1]] == [CHAT_MESSAGE, TASK_CREATED]
+    assert bus.wait(receiver, version, timeout=0.01) == version
+
+    # Версия по темам - для signature подгруженных страниц: меняется только от событий этих тем
+    assert bus.version(receiver, (TASK_CREATED,)) == 3
+    assert bus.version(receiver, (TIME_ENTRY_CHANGED,)) == 0
+    TimeTracker.start_time_entry(receiver, task_id)
+    assert bus.version(receiver, (TASK_CREATED,)) == 3
+    assert bus.version(receiver, (TIME_ENTRY_CHANGED, TASK_CREATED)) == bus.version(receiver) == version + 1
+
+
+def test_table_export_matches_report(seeded_db, tmp_path):
+    import pyarrow.csv
+    import pyarrow.parquet
+    from src.reporting import TableExporter
+    user_id = seeded_db(
+        50, task_title='Export, "quoted" task',
+        duration=lambda i: datetime.timedelta(seconds=97 * i + 5),
+        comment=lambda i: None if i % 3 == 0 else f"entry {i}, line\nbreak"
+    ).user_id
+
+    start_date, end_date = "2025-01-01T00:00:00", "2025-01-31T23:59:59"
+    report = ReportingManager.generate_time_report(user_id, start_date, end_date, True)
+
+    paths, rows = TableExporter.export_report(user_id, start_date, end_date, str(tmp_path / "report"), "parquet")
+    assert rows == 50
+    assert pyarrow.parquet.read_table(paths["entries"]).to_pylist() == report["detailed_entries"]
+    assert pyarrow.parquet.read_table(paths["by_task"]).to_pylist() == report["time_by_task"]
+    assert pyarrow.parquet.read_table(paths["by_day"]).to_pylist() == report["time_by_day"]
+
+    raw_path = str(tmp_path / "entries.csv.gz")
+    assert TableExporter.export_time_entries(raw_path, "csv.gz", user_id, start_date, end_date) == 50
+    raw = pyarrow.csv.read_csv(raw_path).to_pydict()
+    assert sorted(raw["id"]) == sorted(entry["id"] for entry in report["detailed_entries"])
+    assert sum(raw["duration_seconds"]) == report["summary"]["total_duration"]
+
+
+def test_export_jobs_run_in_background(seeded_db, monkeypatch, tmp_path):
+    import src.reporting.export_jobs as export_jobs
+    from src.reporting import ExportJobManager
+    from src.reporting.export_jobs import MAX_ACTIVE_JOBS_PER_USER, MAX_CONCURRENT_EXPORTS
+    user_id = seeded_db(3000).user_id
+
+    # Выгрузки ждут release, пока тест не поставит нужные задачи и не отменит их в известном состоянии;
+    # оценка total_rows намеренно неверна - rows_written должен прийти от самой выгрузки
+    release = threading.Event()
+    export = ExportJobManager._export
+
+    def held_export(job, export_dir, on_progress):
+        release.wait(timeout=60)
+        return export(job, export_dir, on_progress)
+
+    monkeypatch.setattr(ExportJobManager, "_export", staticmethod(held_export))
+    monkeypatch.setattr(ExportJobManager, "_count_rows", staticmethod(lambda job: 1))
+
+    def wait_running(job_id):
+        deadline = time.monotonic() + 30
+        while ExportJobManager.get_job(job_id)["status"] != "running" and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def wait_finished(job_ids):
+        # Задача, отмененная в очереди, еще пройдет через пул - ждем, пока ее поток отпустит базу теста
+        deadline = time.monotonic() + 60
+        while any(job_id in export_jobs._cancel_events for job_id in job_ids) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return [ExportJobManager.get_job(job_id) for job_id in job_ids]
+
+    start_date, end_date = "2025-01-01T00:00:00", "2025-12-31T23:59:59"
+    export_dir = str(tmp_path)
+    submitted = [
+        ExportJobManager.submit(user_id, export_format, start_date, end_date, user_id, contents, export_dir=export_dir)
+        for export_format, contents in (("parquet", "entries"), ("csv.gz", "report"), ("xlsx", "report"), ("csv", "report"))
+    ]
+    job_ids = [job_id for success, message, job_id in submitted if success]
+    assert len(job_ids) == MAX_ACTIVE_JOBS_PER_USER == MAX_CONCURRENT_EXPORTS + 1
+
+    # Два потока пула заняты, третья задача ждет в очереди
+    for job_id in job_ids[:MAX_CONCURRENT_EXPORTS]:
+        wait_running(job_id)
+    assert ExportJobManager.cancel(job_ids[-1], user_id)[0] is True
+    release.set()
+    jobs = wait_finished(job_ids)
+
+    assert jobs[-1]["status"] == "cancelled" and jobs[-1]["started_at"] is None
+    for job in jobs[:-1]:
+        assert job["status"] == "completed"
+        assert job["rows_written"] == 3000 and job["total_rows"] == 1
+        assert all(os.path.exists(path) for path in job["result_paths"].values())
+    assert sorted(name.split("_")[0] for name in os.listdir(export_dir)) == \
+        sorted([f"job{job_ids[0]}"] + [f"job{job_ids[1]}"] * 4)
+
+    # Отмена выполняющейся задачи удаляет ее файлы
+    release.clear()
+    success, message, running_id = ExportJobManager.submit(
+        user_id, "xlsx", start_date, end_date, user_id, "report", export_dir=export_dir
+    )
+    wait_running(running_id)
+    assert ExportJobManager.cancel(running_id, user_id)[0] is True
+    release.set()
+    running_job, = wait_finished([running_id])
+    assert running_job["status"] == "cancelled" and running_job["started_at"] is not None
+    assert not any(name.startswith(f"job{running_id}_") for name in os.listdir(export_dir))
+    assert ExportJobManager.submit(user_id, "xlsx", start_date, end_date, user_id, "entries")[0] is False
+
+
+def test_export_job_keeps_its_connection(temp_db, seeded_db, monkeypatch, tmp_path):
+    import src.reporting.export_jobs as export_jobs
+    from src.reporting import ExportJobManager
+    monkeypatch.setattr(export_jobs, "PROGRESS_INTERVAL", 0)
+    user_id = seeded_db(2500).user_id
+    job_id = temp_db.execute_insert(
+        "INSERT INTO export_jobs (user_id, export_user_id, export_format, contents, start_date, end_date, created_at) "
+        "VALUES (?, ?, 'csv', 'entries', '2025-01-01T00:00:00', '2025-12-31T23:59:59', '2025-01-01T00:00:00')",
+        (user_id, user_id)
+    )
+    temp_db.close()
+
+    # Выполняющаяся задача держит одно соединение потока и возвращает его в пул один раз, в конце
+    # (считаем только закрытия из этого потока: отмененная задача прошлого теста может еще доделываться в пуле)
+    closes = []
+    close = temp_db.close
+    monkeypatch.setattr(temp_db, "close", lambda: closes.append(threading.current_thread()) or close())
+    ExportJobManager._run(job_id, str(tmp_path))
+    monkeypatch.setattr(temp_db, "close", close)
+
+    job = ExportJobManager.get_job(job_id)
+    assert job["status"] == "completed" and job["rows_written"] == 2500
+    assert closes.count(threading.current_thread()) == 1
+
+
+def test_export_job_recovery_keeps_live_owners(temp_db, seeded_db):
+    import subprocess
+    from src.reporting import ExportJobManager
+    from src.reporting.export_jobs import JOB_LEASE, _owner_host
+    user_id = seeded_db(task_title=None).user_id
+    dead_process = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead_process.wait()
+    now = datetime.datetime.now()
+    fresh = now.isoformat()
+    stale = (now - datetime.timedelta(seconds=JOB_LEASE + 60)).isoformat()
+
+    # (хост, pid, heartbeat) -> должна ли задача остаться незавершенной
+    owners = [
+        ((_owner_host, os.getppid(), fresh), True),
+        (("other-host", 4242, fresh), True),
+        ((_owner_host, dead_process.pid, fresh), False),
+        ((_owner_host, os.getpid(), fresh), False),
+        (("other-host", 4242, stale), False),
+        ((None, None, None), False),
+    ]
+    job_ids = [
+        temp_db.execute_insert(
+            """
+            INSERT INTO export_jobs (user_id, export_format, start_date, end_date, status, created_at,
+                                     owner_host, owner_pid, heartbeat_at)
+            VALUES (?, 'csv', '2025-01-01', '2025-01-31', 'running', ?, ?, ?, ?)
+            """,
+            (user_id, fresh, host, pid, heartbeat)
+        )
+        for (host, pid, heartbeat), alive in owners
+    ]
+
+    assert ExportJobManager.recover_interrupted() == sum(not alive for owner, alive in owners)
+    for job_id, (owner, alive) in zip(job_ids, owners):
+        assert ExportJobManager.get_job(job_id)["status"] == ("running" if alive else "failed"), owner
+
+
+def test_pdf_report_handles_unicode_and_page_breaks(seeded_db, monkeypatch, tmp_path):
+    from src.reporting.pdf_report import ENTRY_TABLE, ReportPDF
+    user_id = seeded_db(
+        200, task_title="Отчет по задаче с очень длинным названием, которое не помещается в колонку",
+        first_name="Иван", last_name="Петров",
+        duration=lambda i: datetime.timedelta(minutes=20),
+        comment=lambda i: None if i % 2 else f"Комментарий {i} – ünïcödé"
+    ).user_id
+
+    # Страницы, на которых нарисована шапка таблицы детальных записей
+    header_pages = []
+    table_header = ReportPDF.table_header
+
+    def record_header(pdf):
+        if pdf.table_columns is ENTRY_TABLE:
+            header_pages.append(pdf.page_no())
+        table_header(pdf)
+
+    monkeypatch.setattr(ReportPDF, "table_header", record_header)
+
+    start_date, end_date = "2025-01-01T00:00:00", "2025-01-31T23:59:59"
+    report = ReportingManager.generate_time_report(user_id, start_date, end_date, True)
+    path = str(tmp_path / "report.pdf")
+    assert ReportingManager.export_report_to_pdf(report, path)
+
+    with open(path, "rb") as f:
+        content = f.read()
+    pages = content.count(b"/Type /Page\n")
+    assert pages > 2
+    assert content.count(b"/FontFile2") <= 2
+    assert header_pages == list(range(header_pages[0], pages + 1))
+
+    streamed_path = str(tmp_path / "streamed.pdf")
+    assert ReportingManager.export_report_pdf_streaming(user_id, start_date, end_date, streamed_path) == 200
+    with open(streamed_path, "rb") as f:
+        assert f.read().count(b"/Type /Page\n") == pages
+
+
+def test_pdf_fonts_are_parsed_once_per_process(tmp_path):
+    from src.reporting.pdf_report import FONT_FAMILY, ReportPDF
+    first, second = ReportPDF("Первый"), ReportPDF("Второй")
+    if first.font_name != FONT_FAMILY:
+        pytest.skip("Unicode TTF font not found")
+
+    for fontkey, font in first.fonts.items():
+        # Метрики общие, объект fontTools и подмножество у каждого документа свои
+        assert second.fonts[fontkey].cw == font.cw
+        assert second.fonts[fontkey].cmap is font.cmap
+        assert second.fonts[fontkey].ttfont is not font.ttfont
+        assert second.fonts[fontkey].subset is not font.subset
+
+    second.add_page()
+    second.line_text("Ab")
+    used = {fontkey: len(font.subset) for fontkey, font in second.fonts.items()}
+    first.add_page()
+    first.line_text("Жёлудь и щука", style="B")
+    first.output(str(tmp_path / "first.pdf"))
+    assert {fontkey: len(font.subset) for fontkey, font in second.fonts.items()} == used
+
+    second.output(str(tmp_path / "second.pdf"))
+    with open(tmp_path / "second.pdf", "rb") as f:
+        assert f.read().count(b"/FontFile2") == 2
+
+
+@pytest.mark.parametrize("timestamp_mode", ["iso", "epoch"])
+def test_single_pass_report_matches_hand_computed_totals(monkeypatch, tmp_path, timestamp_mode):
+    import src.database.schema as schema
+    db = Database(str(tmp_path / "report.db"), timestamp_mode=timestamp_mode)
+    monkeypatch.setattr(schema, "_db_instance", db)
+
+    user_ids = [
+        db.execute_insert(
+            "INSERT INTO users (username, email, password_hash, role, created_at) VALUES (?, ?, ?, ?, ?)",
+            (f"single{i}", f"single{i}@example.com", "hash", "employee", "2025-01-01T00:00:00")
+        )
+        for i in range(2)
+    ]
+    task_ids = [
+        db.execute_insert(
+            "INSERT INTO tasks (title, status, priority, created_by, assigned_to, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (f"Task {i}", "in_progress", "medium", user_ids[0], user_ids[1], "2025-01-01T00:00:00")
+        )
+        for i in range(3)
+    ]
+
+    base_time = datetime.datetime(2025, 3, 1, 0, 0, 0)
+    entries = [
+        {
+            "user_id": user_ids[i % 2],
+            "task_id": task_ids[i % 3],
+            "start": base_time + datetime.timedelta(minutes=97 * i),
+            "seconds": 60 * (i % 50) + i,
+            "comment": None if i % 4 == 0 else f"entry {i}"
+        }
+        for i in range(400)
+    ]
+    TimeTracker.import_entries(
+        {
+            "user_id": entry["user_id"],
+            "task_id": entry["task_id"],
+            "start_time": entry["start"].isoformat(),
+            "end_time": (entry["start"] + datetime.timedelta(seconds=entry["seconds"])).isoformat(),
+            "comment": entry["comment"]
+        }
+        for entry in entries
+    )
+    # Незавершенная запись в отчет не попадает
+    db.execute_insert(
+        "INSERT INTO time_entries (user_id, task_id, start_time, start_ts, created_at) VALUES (?, ?, ?, ?, ?)",
+        (user_ids[0], task_ids[0], "2025-03-05T10:00:00", to_epoch("2025-03-05T10:00:00"), "2025-03-05T10:00:00")
+    )
+
+    def formatted(seconds):
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m {seconds % 60}s"
+
+    # Края диапазона - неполные дни; ожидаемые итоги считаются здесь же по списку записей, а не другим путем отчета
+    start_date, end_date = "2025-03-02T13:30:00", "2025-03-20T08:15:00"
+    range_start, range_end = datetime.datetime.fromisoformat(start_date), datetime.datetime.fromisoformat(end_date)
+    for user_id in user_ids + [None]:
+        selected = [
+            entry for entry in entries
+            if range_start <= entry["start"] <= range_end and user_id in (None, entry["user_id"])
+        ]
+        total = sum(entry["seconds"] for entry in selected)
+        task_seconds, task_entries, day_seconds = {}, {}, {}
+        for entry in selected:
+            task_seconds[entry["task_id"]] = task_seconds.get(entry["task_id"], 0) + entry["seconds"]
+            task_entries[entry["task_id"]] = task_entries.get(entry["task_id"], 0) + 1
+            day = entry["start"].date().isoformat()
+            day_seconds[day] = day_seconds.get(day, 0) + entry["seconds"]
+
+        report = ReportingManager.generate_time_report(user_id, start_date, end_date, True)
+
+        assert len(selected) > 0
+        assert report["summary"] == {
+            "total_entries": len(selected),
+            "total_duration": total,
+            "total_tasks": len(task_seconds),
+            "total_duration_formatted": formatted(total),
+            "total_hours": round(total / 3600, 2)
+        }
+        assert [task["duration_seconds"] for task in report["time_by_task"]] == \
+            sorted(task_seconds.values(), reverse=True)
+        assert {task["task_id"]: task for task in report["time_by_task"]} == {
+            task_id: {
+                "task_id": task_id,
+                "task_title": f"Task {task_ids.index(task_id)}",
+                "duration_seconds": seconds,
+                "duration_formatted": formatted(seconds),
+                "duration_hours": round(seconds / 3600, 2),
+                "entry_count": task_entries[task_id],
+                "percentage": round(seconds / total * 100, 1)
+            }
+            for task_id, seconds in task_seconds.items()
+        }
+        assert report["time_by_day"] == [
+            {"date": day, "duration_seconds": seconds, "duration_hours": round(seconds / 3600, 2)}
+            for day, seconds in sorted(day_seconds.items())
+        ]
+        assert [
+            (entry["start_time"], entry["end_time"], entry["duration_seconds"], entry["duration_formatted"],
+             entry["comment"], entry["task_id"], entry["task_title"])
+            for entry in report["detailed_entries"]
+        ] == [
+            (entry["start"].isoformat(), (entry["start"] + datetime.timedelta(seconds=entry["seconds"])).isoformat(),
+             entry["seconds"], formatted(entry["seconds"]), entry["comment"], entry["task_id"],
+             f"Task {task_ids.index(entry['task_id'])}")
+            for entry in sorted(selected, key=lambda entry: entry["start"], reverse=True)
+        ]
+
+    # Названия задач приходят тем же курсором, отдельных запросов на задачу нет
+    from src.reporting.report_engine import ReportEngine
+    queries = []
+    monkeypatch.setattr(db, "execute_query", lambda *args, **kwargs: queries.append(args))
+    totals, details = ReportEngine.scan(db, None, start_date, end_date)
+    assert queries == [] and len(totals.tasks) == len(task_ids) and details
+    monkeypatch.undo()
+
+    db.dispose()
 
 
 class PerformanceTestSuite:
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, storage_profile: str = "performance"):
         if db_path is None:
             self.db_fd, self.db_path = tempfile.mkstemp(suffix=".db")
             os.close(self.db_fd)
         else:
             self.db_path = db_path
         
-        self.db = Database(self.db_path)
+        self.db = Database(self.db_path, storage_profile=storage_profile)
         self.results = {}
         
         import src.database
+        import src.database.schema
         self.original_get_db = src.database.get_db
         src.database.get_db = lambda: self.db
+        # Менеджеры импортируют get_db напрямую, поэтому подменяем и сам синглтон
+        self.original_db_instance = src.database.schema._db_instance
+        src.database.schema._db_instance = self.db
     
     def cleanup(self):
         import src.database
+        import src.database.schema
         src.database.get_db = self.original_get_db
+        src.database.schema._db_instance = self.original_db_instance
         
-        self.db.close()
-        if os.path.exists(self.db_path):
-            os.unlink(self.db_path)
+        self.db.dispose()
+        for suffix in ("", "-wal", "-shm", ".migrate.lock"):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
     
     def measure_execution_time(self, func, *args, **kwargs) -> Tuple[float, any]:
         start_time = time.time()
@@ -107,13 +861,16 @@ class PerformanceTestSuite:
         
         results = {
             "thread_times": [],
+            "write_times": [],
             "total_operations": num_threads * operations_per_thread,
             "errors": []
         }
         
-        def worker_thread(thread_id: int) -> Tuple[int, float, List[str]]:
+        def worker_thread(thread_id: int) -> Tuple[int, float, List[str], List[float]]:
             thread_start = time.time()
             thread_errors = []
+            write_times = []
+            previous_user_id = None
             
             for i in range(operations_per_thread):
                 try:
@@ -130,13 +887,18 @@ class PerformanceTestSuite:
                         thread_errors.append(f"Thread {thread_id}, Op {i}: {message}")
                         continue
                     
+                    # Назначение на другого юзера - запись таска и уведомления (multi-statement write)
+                    write_start = time.time()
                     success, message, task_id = TaskManager.create_task(
                         title=f"Thread {thread_id} Task {i}",
                         description="Concurrent test task",
                         status="not_started",
                         priority="medium",
-                        created_by=user_id
+                        created_by=user_id,
+                        assigned_to=previous_user_id
                     )
+                    write_times.append(time.time() - write_start)
+                    previous_user_id = user_id
                     
                     if not success:
                         thread_errors.append(f"Thread {thread_id}, Task {i}: {message}")
@@ -145,7 +907,7 @@ class PerformanceTestSuite:
                     thread_errors.append(f"Thread {thread_id}, Op {i}: {str(e)}")
             
             thread_end = time.time()
-            return thread_id, thread_end - thread_start, thread_errors
+            return thread_id, thread_end - thread_start, thread_errors, write_times
         
         start_time = time.time()
         
@@ -153,9 +915,10 @@ class PerformanceTestSuite:
             futures = [executor.submit(worker_thread, i) for i in range(num_threads)]
             
             for future in as_completed(futures):
-                thread_id, thread_time, thread_errors = future.result()
+                thread_id, thread_time, thread_errors, write_times = future.result()
                 results["thread_times"].append(thread_time)
                 results["errors"].extend(thread_errors)
+                results["write_times"].extend(write_times)
         
         end_time = time.time()
         
@@ -164,6 +927,14 @@ class PerformanceTestSuite:
         results["operations_per_second"] = results["total_operations"] / results["total_time"]
         results["error_rate"] = len(results["errors"]) / results["total_operations"] * 100
         
+        write_times = sorted(results.pop("write_times"))
+        results["write_latency"] = {
+            "count": len(write_times),
+            "avg_time": statistics.mean(write_times) if write_times else 0,
+            "median_time": statistics.median(write_times) if write_times else 0,
+            "p95_time": write_times[int(len(write_times) * 0.95) - 1] if write_times else 0
+        }
+        
         return results
     
     def test_memory_usage(self, num_operations: int = 1000) -> Dict:
@@ -287,6 +1058,472 @@ class PerformanceTestSuite:
             }
         }
     
+    def test_bulk_import_performance(self, num_entries: int = 10000) -> Dict:
+        print(f"Testing bulk time entry import with {num_entries} entries...")
+        
+        success, message, user_id = AuthManager.register_user(
+            username="importuser",
+            email="import@example.com",
+            password="TestPassword123!",
+            first_name="Import",
+            last_name="User",
+            role="employee"
+        )
+        success, message, task_id = TaskManager.create_task(
+            title="Import Task",
+            description="Bulk import test task",
+            status="in_progress",
+            priority="medium",
+            created_by=user_id
+        )
+        
+        base_time = datetime.datetime(2024, 1, 1, 9, 0, 0)
+        
+        def generate_entries():
+            for i in range(num_entries):
+                start = base_time + datetime.timedelta(hours=i)
+                yield {
+                    "user_id": user_id,
+                    "task_id": task_id,
+                    "start_time": start.isoformat(),
+                    "end_time": (start + datetime.timedelta(minutes=45)).isoformat(),
+                    "comment": f"Imported entry {i}"
+                }
+        
+        success, message, stats = TimeTracker.import_entries(generate_entries())
+        
+        return {
+            "success": success,
+            "imported": stats["imported"],
+            "skipped": stats["skipped"],
+            "elapsed_seconds": stats["elapsed_seconds"],
+            "rows_per_second": stats["rows_per_second"]
+        }
+    
+    def test_report_rollup_performance(self) -> Dict:
+        print("Testing year-long report on the daily rollup...")
+        
+        # Данные - записи из test_bulk_import_performance (10000 часов, больше года)
+        user_rows = self.db.execute_query("SELECT id FROM users WHERE username = 'importuser'")
+        if not user_rows:
+            return {"error": "Bulk import data not found"}
+        user_id = user_rows[0]["id"]
+        
+        start_date, end_date = "2024-01-01T00:00:00", "2025-01-01T00:00:00"
+        
+        report_time, report = self.measure_execution_time(
+            ReportingManager.generate_time_report, user_id, start_date, end_date, False
+        )
+        
+        raw_query = """
+        SELECT COUNT(*) as total_entries, SUM(duration_seconds) as total_duration
+        FROM time_entries
+        WHERE user_id = ? AND start_time >= ? AND start_time <= ? AND end_time IS NOT NULL
+        """
+        raw_time, raw_rows = self.measure_execution_time(
+            self.db.execute_query, raw_query, (user_id, start_date, end_date)
+        )
+        raw = dict(raw_rows[0])
+        
+        rollup_rows = "SELECT user_id, task_id, day, seconds, entries FROM time_rollup_daily ORDER BY 1, 2, 3"
+        incremental = [tuple(row) for row in self.db.execute_query(rollup_rows)]
+        TimeRollup.rebuild(self.db)
+        rebuilt = [tuple(row) for row in self.db.execute_query(rollup_rows)]
+        
+        issues = []
+        if report["summary"]["total_entries"] != raw["total_entries"]:
+            issues.append(f"Entry count mismatch: {report['summary']['total_entries']} != {raw['total_entries']}")
+        if report["summary"]["total_duration"] != raw["total_duration"]:
+            issues.append(f"Duration mismatch: {report['summary']['total_duration']} != {raw['total_duration']}")
+        if incremental != rebuilt:
+            issues.append("Incremental rollup differs from rebuilt rollup")
+        
+        return {
+            "report_time": report_time,
+            "raw_sum_time": raw_time,
+            "days": len(report["time_by_day"]),
+            "entries": raw["total_entries"],
+            "issues": issues,
+            "tests_passed": len(issues) == 0
+        }
+    
+    def test_export_memory(self, sizes: Tuple[int, ...] = (10000, 50000)) -> Dict:
+        print(f"Testing Excel export peak memory for {', '.join(map(str, sizes))} detailed entries...")
+        
+        success, message, user_id = AuthManager.register_user(
+            username="exportuser",
+            email="export@example.com",
+            password="TestPassword123!",
+            first_name="Export",
+            last_name="User",
+            role="employee"
+        )
+        success, message, task_id = TaskManager.create_task(
+            title="Export Task",
+            description="Export memory test task",
+            status="in_progress",
+            priority="medium",
+            created_by=user_id
+        )
+        
+        # Записи по одной в час: в окно из первых size часов попадает ровно size записей
+        base_time = datetime.datetime(2020, 1, 1, 0, 0, 0)
+        TimeTracker.import_entries(
+            {
+                "user_id": user_id,
+                "task_id": task_id,
+                "start_time": (base_time + datetime.timedelta(hours=i)).isoformat(),
+                "end_time": (base_time + datetime.timedelta(hours=i, minutes=45)).isoformat(),
+                "comment": f"Export entry {i} with a comment of typical length"
+            }
+            for i in range(max(sizes))
+        )
+        
+        def export_in_memory(start_date, end_date, path):
+            report = ReportingManager.generate_time_report(user_id, start_date, end_date, True)
+            return ReportingManager.export_report_to_csv(report, path)
+        
+        def export_streaming(start_date, end_date, path):
+            return ReportingManager.export_report_streaming(user_id, start_date, end_date, path, True) >= 0
+        
+        def measure_peak(export, start_date, end_date):
+            fd, path = tempfile.mkstemp(suffix=".xlsx")
+            os.close(fd)
+            try:
+                tracemalloc.start()
+                started = time.time()
+                success = export(start_date, end_date, path)
+                elapsed = time.time() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                return {
+                    "success": success,
+                    "time": elapsed,
+                    "peak_memory_mb": peak / 1024 / 1024,
+                    "file_size_mb": os.path.getsize(path) / 1024 / 1024
+                }
+            finally:
+                os.unlink(path)
+        
+        results = {}
+        for size in sizes:
+            start_date = base_time.isoformat()
+            end_date = (base_time + datetime.timedelta(hours=size - 1)).isoformat()
+            results[size] = {
+                "in_memory": measure_peak(export_in_memory, start_date, end_date),
+                "streaming": measure_peak(export_streaming, start_date, end_date)
+            }
+        
+        # Пик потоковой выгрузки не должен расти вместе с числом строк (допуск - на буферы openpyxl и sqlite)
+        smallest, largest = results[min(sizes)]["streaming"], results[max(sizes)]["streaming"]
+        flat = largest["peak_memory_mb"] < smallest["peak_memory_mb"] * 1.5 + 1
+        
+        return {
+            "sizes": results,
+            "tests_passed": flat and all(run["success"] for size in results.values() for run in size.values())
+        }
+    
+    def test_pdf_export_performance(self, num_entries: int = 10000) -> Dict:
+        print(f"Testing PDF export throughput for {num_entries} detailed entries...")
+        
+        user_rows = self.db.execute_query("SELECT id FROM users WHERE username = 'exportuser'")
+        if not user_rows:
+            return {"error": "Export memory test data not found"}
+        user_id = user_rows[0]["id"]
+        
+        # Те же записи, что в test_export_memory: одна в час
+        base_time = datetime.datetime(2020, 1, 1, 0, 0, 0)
+        start_date = base_time.isoformat()
+        end_date = (base_time + datetime.timedelta(hours=num_entries - 1)).isoformat()
+        
+        report = ReportingManager.generate_time_report(user_id, start_date, end_date, include_details=False)
+        
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        try:
+            started = time.time()
+            rows = ReportingManager.export_report_pdf_streaming(user_id, start_date, end_date, path, True)
+            elapsed = time.time() - started
+            
+            with open(path, "rb") as f:
+                content = f.read()
+            pages = content.count(b"/Type /Page\n")
+            # Шрифт встраивается один раз на начертание, а не на страницу
+            embedded_fonts = content.count(b"/FontFile2")
+        finally:
+            os.unlink(path)
+        
+        return {
+            "entries": report["summary"]["total_entries"],
+            "time": elapsed,
+            "pages": pages,
+            "pages_per_second": pages / elapsed if elapsed > 0 else 0,
+            "file_size_mb": len(content) / 1024 / 1024,
+            "embedded_fonts": embedded_fonts,
+            "tests_passed": rows == report["summary"]["total_entries"] == num_entries and 0 < embedded_fonts <= 2
+        }
+    
+    def test_single_pass_report_performance(self, num_entries: int = 1000000, num_tasks: int = 20) -> Dict:
+        print(f"Testing single-pass detailed report on {num_entries} entries...")
+        
+        success, message, user_id = AuthManager.register_user(
+            username="singlepassuser",
+            email="singlepass@example.com",
+            password="TestPassword123!",
+            first_name="Single",
+            last_name="Pass",
+            role="employee"
+        )
+        task_ids = [
+            TaskManager.create_task(
+                title=f"Single Pass Task {i}",
+                description="Single-pass report test task",
+                status="in_progress",
+                priority="medium",
+                created_by=user_id
+            )[2]
+            for i in range(num_tasks)
+        ]
+        
+        # Запись каждые 5 минут: ~288 записей в день, ~9.5 лет на миллион
+        base_time = datetime.datetime(2010, 1, 1, 0, 0, 0)
+        success, message, stats = TimeTracker.import_entries(
+            (
+                {
+                    "user_id": user_id,
+                    "task_id": task_ids[i % num_tasks],
+                    "start_time": (base_time + datetime.timedelta(minutes=5 * i)).isoformat(),
+                    "end_time": (base_time + datetime.timedelta(minutes=5 * i, seconds=60 + i % 240)).isoformat(),
+                    "comment": None if i % 5 == 0 else f"Single pass entry {i}"
+                }
+                for i in range(num_entries)
+            ),
+            chunk_size=5000
+        )
+        
+        start_date = base_time.isoformat()
+        end_date = (base_time + datetime.timedelta(minutes=5 * num_entries)).isoformat()
+        
+        # Прежний порядок работы: итоги из дневного агрегата + отдельный запрос детальных записей
+        def rollup_and_details():
+            report = ReportingManager.generate_time_report(user_id, start_date, end_date, include_details=False)
+            report["detailed_entries"] = [
+                dict(zip(DETAILED_ENTRY_COLUMNS, entry))
+                for entry in ReportingManager.iter_detailed_entries(self.db, user_id, start_date, end_date)
+            ]
+            return report
+        
+        baseline_time, baseline = self.measure_execution_time(rollup_and_details)
+        single_pass_time, report = self.measure_execution_time(
+            ReportingManager.generate_time_report, user_id, start_date, end_date, True
+        )
+        matches = report == baseline
+        
+        return {
+            "entries": report["summary"]["total_entries"],
+            "import_time": stats["elapsed_seconds"],
+            "baseline_time": baseline_time,
+            "single_pass_time": single_pass_time,
+            "speedup": baseline_time / single_pass_time if single_pass_time > 0 else 0,
+            "entries_per_second": num_entries / single_pass_time if single_pass_time > 0 else 0,
+            "outputs_match": matches,
+            "tests_passed": matches and report["summary"]["total_entries"] == num_entries
+        }
+    
+    def test_time_summary_cache(self, num_calls: int = 500) -> Dict:
+        print(f"Testing cached time summary with {num_calls} calls...")
+        
+        user_rows = self.db.execute_query("SELECT id FROM users WHERE username = 'importuser'")
+        if not user_rows:
+            return {"error": "Bulk import data not found"}
+        user_id = user_rows[0]["id"]
+        
+        TimeTracker._invalidate_time_summary(user_id)
+        cold_time, cold = self.measure_execution_time(TimeTracker.get_time_summary, user_id, "this_month")
+        
+        times = []
+        for _ in range(num_calls):
+            execution_time, summary = self.measure_execution_time(TimeTracker.get_time_summary, user_id, "this_month")
+            times.append(execution_time)
+        
+        return {
+            "cold_time": cold_time,
+            "cached_avg_time": statistics.mean(times),
+            "cache_stats": TimeTracker._summary_cache.stats(),
+            "tests_passed": summary["total_duration"] == cold["total_duration"]
+        }
+    
+    def test_dashboard_load(self, num_loads: int = 100) -> Dict:
+        print(f"Testing dashboard snapshot loading with {num_loads} loads...")
+        
+        user_rows = self.db.execute_query("SELECT id FROM users WHERE username = 'importuser'")
+        if not user_rows:
+            return {"error": "Bulk import data not found"}
+        user_id = user_rows[0]["id"]
+        self.db.close()
+        
+        stats_before = self.db.pool_stats()
+        times = []
+        for _ in range(num_loads):
+            execution_time, snapshot = self.measure_execution_time(DashboardService.load, user_id)
+            times.append(execution_time)
+        stats_after = self.db.pool_stats()
+        
+        checkouts = (stats_after["hits"] + stats_after["misses"]) - (stats_before["hits"] + stats_before["misses"])
+        
+        return {
+            "avg_time": statistics.mean(times),
+            "checkouts_per_load": checkouts / num_loads,
+            "recent_entries": len(snapshot["recent_entries"])
+        }
+    
+    def test_task_search_performance(self, num_tasks: int = 1000000, chunk_size: int = 50000) -> Dict:
+        print(f"Testing task search on {num_tasks} tasks (FTS5 vs LIKE)...")
+        
+        success, message, user_id = AuthManager.register_user(
+            username="searchuser",
+            email="search@example.com",
+            password="TestPassword123!",
+            first_name="Search",
+            last_name="User",
+            role="employee"
+        )
+        
+        # Словарь с распределением частот как у естественного текста (Zipf): есть и частые, и редкие слова
+        rng = random.Random(42)
+        syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "be", "do", "fa", "gu", "ho", "ji", "pe", "zu"]
+        vocabulary = sorted({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(20000)})
+        rng.shuffle(vocabulary)
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        created_at = datetime.datetime(2024, 1, 1).isoformat()
+        
+        def generate_tasks(count):
+            for _ in range(count):
+                title = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=4))
+                description = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=25))
+                yield (title, description, "in_progress", "medium", user_id, created_at)
+        
+        insert_start = time.time()
+        rows = generate_tasks(num_tasks)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            with self.db.transaction():
+                self.db.execute_many(
+                    "INSERT INTO tasks (title, description, status, priority, created_by, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    chunk
+                )
+        insert_time = time.time() - insert_start
+        
+        like_query = """
+        SELECT t.id FROM tasks t
+        WHERE (t.created_by = ? OR t.assigned_to = ?) AND (t.title LIKE ? OR t.description LIKE ?)
+        ORDER BY t.created_at DESC, t.id DESC LIMIT 50
+        """
+        
+        # Одно слово FTS ищет без ранжирования и, как LIKE, останавливается на LIMIT 50; несколько слов
+        # ранжируются среди TASK_SEARCH_RANK_CANDIDATES новейших совпадений - LIKE тут читает почти всю таблицу
+        terms = {
+            "frequent_prefix": vocabulary[0][:3],
+            "common": vocabulary[50],
+            "medium": vocabulary[500],
+            "rare": vocabulary[5000],
+            "two_words": f"{vocabulary[50]} {vocabulary[300]}"
+        }
+        
+        results = {}
+        for name, term in terms.items():
+            like_time, like_rows = self.measure_execution_time(
+                self.db.execute_query, like_query, (user_id, user_id, f"%{term}%", f"%{term}%")
+            )
+            fts_time, fts_rows = self.measure_execution_time(
+                TaskManager.get_tasks, user_id, None, None, "all", term, 50
+            )
+            results[name] = {
+                "term": term,
+                "like_time": like_time,
+                "fts_time": fts_time,
+                "like_results": len(like_rows),
+                "fts_results": len(fts_rows),
+                "speedup": like_time / fts_time if fts_time > 0 else 0
+            }
+        
+        return {
+            "num_tasks": num_tasks,
+            "insert_time": insert_time,
+            "searches": results
+        }
+    
+    def test_user_search_performance(self, num_users: int = 100000) -> Dict:
+        print(f"Testing chat user search on {num_users} users (prefix index vs LOWER() LIKE)...")
+        
+        rng = random.Random(7)
+        first_names = ["Anna", "Boris", "Chloé", "Dmitri", "Elena", "Fedor", "Grace", "Hugo", "Irina", "José"]
+        last_names = ["Smith", "Ivanov", "Müller", "García", "Petrov", "Brown", "Sokolova", "Dubois", "Novak", "Kim"]
+        created_at = datetime.datetime.now().isoformat()
+        
+        with self.db.transaction():
+            self.db.execute_many(
+                "INSERT INTO users (username, email, password_hash, first_name, last_name, role, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (f"member{i}", f"member{i}@example.com", "hash",
+                     rng.choice(first_names), f"{rng.choice(last_names)}{i % 1000}", "employee", created_at)
+                    for i in range(num_users)
+                )
+            )
+        self.db.close()
+        
+        like_query = """
+        SELECT id, username, first_name, last_name, email, created_at
+        FROM users
+        WHERE (
+            LOWER(first_name) LIKE LOWER(?) OR
+            LOWER(last_name) LIKE LOWER(?) OR
+            LOWER(username) LIKE LOWER(?) OR
+            LOWER(email) LIKE LOWER(?)
+        )
+        ORDER BY first_name, last_name
+        """
+        
+        UserDirectory.reset()
+        load_time, _ = self.measure_execution_time(UserDirectory.search, "", None, 20)
+        
+        results = {}
+        for term in ["", "a", "mul", "jose", "member4242", "grace kim12", "nobody"]:
+            like_time, like_rows = self.measure_execution_time(self.db.execute_query, like_query, (f"%{term}%",) * 4)
+            
+            timings = []
+            for _ in range(20):
+                search_time, rows = self.measure_execution_time(UserDirectory.search, term, None, 20)
+                timings.append(search_time)
+            
+            results[term or "<empty>"] = {
+                "like_time": like_time,
+                "like_results": len(like_rows),
+                "index_time_ms": statistics.median(timings) * 1000,
+                "index_results": len(rows)
+            }
+        
+        return {
+            "num_users": num_users,
+            "index_load_time": load_time,
+            "searches": results,
+            "tests_passed": all(result["index_time_ms"] < 1 for result in results.values())
+        }
+    
+    def test_query_plans(self) -> Dict:
+        print("Testing query plans of hot time entry queries...")
+        
+        issues = check_query_plans(self.db)
+        
+        return {
+            "issues": issues,
+            "tests_passed": len(issues) == 0
+        }
+    
     def test_data_consistency(self) -> Dict:
         print("Testing data consistency and integrity...")
         
@@ -378,10 +1615,32 @@ class PerformanceTestSuite:
             
             all_results["time_tracking_performance"] = self.test_time_tracking_performance(50, 100)
             
+            all_results["bulk_import"] = self.test_bulk_import_performance(10000)
+            
+            all_results["report_rollup"] = self.test_report_rollup_performance()
+            
+            all_results["export_memory"] = self.test_export_memory()
+            
+            all_results["pdf_export"] = self.test_pdf_export_performance()
+            
+            all_results["time_summary_cache"] = self.test_time_summary_cache()
+            
+            all_results["dashboard_load"] = self.test_dashboard_load()
+            
+            all_results["task_search"] = self.test_task_search_performance()
+            
+            all_results["user_search"] = self.test_user_search_performance()
+            
             all_results["data_consistency"] = self.test_data_consistency()
             
+            all_results["single_pass_report"] = self.test_single_pass_report_performance()
+            
+            all_results["query_plans"] = self.test_query_plans()
+
+            all_results["connection_pool"] = self.db.pool_stats()
+            
             all_results["summary"] = {
-                "total_tests": 5,
+                "total_tests": 15,
                 "timestamp": datetime.datetime.now().isoformat(),
                 "database_path": self.db_path
             }
@@ -392,10 +1651,35 @@ class PerformanceTestSuite:
         return all_results
 
 
+def compare_storage_profiles(num_threads: int = 5, operations_per_thread: int = 20) -> Dict:
+    print("Comparing storage profiles on the concurrent operations scenario...")
+
+    comparison = {}
+
+    for profile in STORAGE_PROFILES:
+        suite = PerformanceTestSuite(storage_profile=profile)
+        try:
+            results = suite.test_concurrent_operations(num_threads, operations_per_thread)
+            comparison[profile] = {
+                "pragmas": suite.db.get_pragmas(),
+                "total_time": results["total_time"],
+                "operations_per_second": results["operations_per_second"],
+                "error_rate": results["error_rate"],
+                "write_latency": results["write_latency"],
+                "locked_errors": sum(1 for error in results["errors"] if "locked" in error)
+            }
+        finally:
+            suite.cleanup()
+
+    return comparison
+
+
 def main():
     print("Time Tracker Application - Performance Testing Suite")
     print("=" * 60)
     
+    profile_comparison = compare_storage_profiles()
+    
     test_suite = PerformanceTestSuite()
     
     try:
@@ -415,6 +1699,8 @@ def main():
             print(f"Concurrent Operations:")
             print(f"  Operations/second: {conc['operations_per_second']:.2f}")
             print(f"  Error rate: {conc['error_rate']:.2f}%")
+            print(f"  Task write latency: {conc['write_latency']['avg_time']:.4f}s avg, "
+                  f"{conc['write_latency']['p95_time']:.4f}s p95")
         
         if "memory_usage" in results:
             mem = results["memory_usage"]
@@ -430,6 +1716,77 @@ def main():
             print(f"  Stop tracking: {tt['stop_tracking_stats']['avg_time']:.4f}s avg")
             print(f"  Query entries: {tt['query_stats']['avg_time']:.4f}s avg")
         
+        if "bulk_import" in results:
+            bi = results["bulk_import"]
+            print(f"Bulk Import:")
+            print(f"  Imported: {bi['imported']} entries in {bi['elapsed_seconds']:.2f}s "
+                  f"({bi['rows_per_second']:.0f} rows/s)")
+        
+        if "report_rollup" in results:
+            rr = results["report_rollup"]
+            if "error" not in rr:
+                print(f"Report Rollup:")
+                print(f"  Year report: {rr['report_time']:.4f}s over {rr['days']} days "
+                      f"({rr['entries']} entries, raw SUM {rr['raw_sum_time']:.4f}s)")
+                print(f"  Tests passed: {rr['tests_passed']}")
+                for issue in rr["issues"]:
+                    print(f"    - {issue}")
+        
+        if "export_memory" in results:
+            em = results["export_memory"]
+            print(f"Excel Export Memory:")
+            for size, runs in em["sizes"].items():
+                print(f"  {size} entries: in-memory {runs['in_memory']['peak_memory_mb']:.1f} MB peak "
+                      f"({runs['in_memory']['time']:.2f}s), streaming {runs['streaming']['peak_memory_mb']:.1f} MB peak "
+                      f"({runs['streaming']['time']:.2f}s)")
+            print(f"  Tests passed: {em['tests_passed']}")
+        
+        if "pdf_export" in results:
+            pe = results["pdf_export"]
+            if "error" not in pe:
+                print(f"PDF Export:")
+                print(f"  {pe['entries']} entries: {pe['pages']} pages in {pe['time']:.2f}s "
+                      f"({pe['pages_per_second']:.0f} pages/s, {pe['file_size_mb']:.1f} MB, "
+                      f"{pe['embedded_fonts']} embedded fonts)")
+                print(f"  Tests passed: {pe['tests_passed']}")
+        
+        if "single_pass_report" in results:
+            sp = results["single_pass_report"]
+            print(f"Single-Pass Report:")
+            print(f"  {sp['entries']} entries: {sp['single_pass_time']:.2f}s single pass vs "
+                  f"{sp['baseline_time']:.2f}s rollup + details ({sp['speedup']:.1f}x, "
+                  f"{sp['entries_per_second']:.0f} entries/s)")
+            print(f"  Outputs match: {sp['outputs_match']}")
+            print(f"  Tests passed: {sp['tests_passed']}")
+        
+        if "time_summary_cache" in results:
+            sc = results["time_summary_cache"]
+            if "error" not in sc:
+                print(f"Time Summary Cache:")
+                print(f"  Cold: {sc['cold_time']:.4f}s, cached: {sc['cached_avg_time']:.6f}s avg, "
+                      f"hits: {sc['cache_stats']['hits']}")
+        
+        if "dashboard_load" in results:
+            dl = results["dashboard_load"]
+            if "error" not in dl:
+                print(f"Dashboard Load:")
+                print(f"  {dl['avg_time']:.4f}s avg, {dl['checkouts_per_load']:.1f} connection checkouts per load")
+        
+        if "task_search" in results:
+            ts = results["task_search"]
+            print(f"Task Search ({ts['num_tasks']} tasks, inserted in {ts['insert_time']:.1f}s):")
+            for term, search in ts["searches"].items():
+                print(f"  '{term}': LIKE {search['like_time']:.4f}s, FTS5 {search['fts_time']:.4f}s "
+                      f"({search['speedup']:.0f}x)")
+
+        if "user_search" in results:
+            us = results["user_search"]
+            print(f"User Search ({us['num_users']} users, index loaded in {us['index_load_time']:.2f}s):")
+            for term, search in us["searches"].items():
+                print(f"  '{term}': LIKE {search['like_time']:.4f}s, index {search['index_time_ms']:.3f}ms "
+                      f"({search['index_results']} results)")
+            print(f"  Tests passed: {us['tests_passed']}")
+
         if "data_consistency" in results:
             dc = results["data_consistency"]
             print(f"Data Consistency:")
@@ -439,6 +1796,25 @@ def main():
                 for issue in dc["issues"]:
                     print(f"    - {issue}")
         
+        if "query_plans" in results:
+            qp = results["query_plans"]
+            print(f"Query Plans:")
+            print(f"  Tests passed: {qp['tests_passed']}")
+            for issue in qp["issues"]:
+                print(f"    - {issue}")
+        
+        if "connection_pool" in results:
+            pool = results["connection_pool"]
+            print(f"Connection Pool:")
+            print(f"  Hits: {pool['hits']}, misses: {pool['misses']} ({pool['hit_rate']:.1f}% hit rate)")
+            print(f"  Open connections: {pool['open']} ({pool['idle']} idle)")
+        
+        print(f"Storage Profiles:")
+        for profile, stats in profile_comparison.items():
+            print(f"  {profile}: {stats['operations_per_second']:.2f} ops/s, "
+                  f"error rate {stats['error_rate']:.2f}%, locked errors {stats['locked_errors']}")
+        results["storage_profiles"] = profile_comparison
+        
         import json
         results_file = "performance_test_results.json"
         with open(results_file, "w") as f: